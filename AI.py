@@ -1,23 +1,34 @@
 import pyautogui
 import random
+from Metrics import traced
+from WindowLayout import WindowLayout
 
 class AI:
     '''
     The agent that interacts with the game
     '''
 
-    def __init__(self):
+    def __init__(self, region: tuple[int, int, int, int] | None = None, input_lock=None):
+        '''
+        Parameters:
+            region: The screen region (left, top, right, bottom) of the game window, if None then the reference window is used
+
+            input_lock: Lock shared between agents in other game windows so the clicks of one move are not split up
+        '''
+        # Every location below is relative to the top left of the reference game window and is moved and scaled to this window
+        self.layout = WindowLayout(region)
+        self.input_lock = input_lock
+
         # x, y locations of cards the player can play are at from left to right
-        self.card_locations = [[840, 1025], [955, 1025], [1070, 1025], [1185, 1025]]
+        self.card_locations = [self.layout.screen_point(x, 1025) for x in [150, 265, 380, 495]]
 
         # borders of the game board
-        self.board_left = 705
-        self.board_right = 1215
-        self.board_bottom = 875
-        self.board_middle = 530
-        self.board_top = 130
+        self.board_left, self.board_top = self.layout.screen_point(15, 130)
+        self.board_right, self.board_bottom = self.layout.screen_point(525, 875)
+        self.board_middle = self.layout.screen_point(0, 530)[1]
 
 
+    @traced("AI.make_move")
     def make_move(self, card : int, x : int, y : int):
         '''
         Method to make a move that the AI wants to make 
@@ -25,9 +36,9 @@ class AI:
         Parameters:
             card: Which card number in the current hand to play
 
-            x: X coordinate of where to play the card
+            x: X coordinate of where to play the card, in pixels from the left of the board in the reference window
 
-            y: Y coordinate of where to play the card
+            y: Y coordinate of where to play the card, in pixels from the top of the board in the reference window
         '''
 
         # AI has chosen to do nothing
@@ -36,9 +47,17 @@ class AI:
         
         # Make card point to correct index
         card -= 1
+        x, y = self.layout.window_point(x, y)
         # Perform the action
-        pyautogui.click(self.card_locations[card])
-        pyautogui.click(x + self.board_left, y + self.board_top)
+        if self.input_lock is None:
+            pyautogui.click(self.card_locations[card])
+            pyautogui.click(x + self.board_left, y + self.board_top)
+            return
+
+        # Another game window could be clicked between selecting the card and placing it
+        with self.input_lock:
+            pyautogui.click(self.card_locations[card])
+            pyautogui.click(x + self.board_left, y + self.board_top)
 
     def make_random_move(self):
         '''
@@ -46,7 +65,8 @@ class AI:
         '''
 
         card = random.randint(0, 4)
-        x = random.randint(0, self.board_right - self.board_left)
-        y = random.randint(0, self.board_bottom - self.board_top)
+        # Moves are given in the pixels of the reference window
+        x = random.randint(0, round((self.board_right - self.board_left) / self.layout.scale_x))
+        y = random.randint(0, round((self.board_bottom - self.board_top) / self.layout.scale_y))
 
         self.make_move(card, x, y)
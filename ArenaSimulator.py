@@ -0,0 +1,497 @@
+import gymnasium as gym
+import numpy as np
+from numpy.typing import NDArray
+from stable_baselines3.common.vec_env import VecEnv
+from ObservationLayout import ObservationLayout
+from Reward import RewardEngine
+from StatTables import (CARD_STAT_NAMES, TROOP_STAT_NAMES, HP, DIRECT_DAMAGE, SPLASH_DAMAGE, HIT_SPEED, SPEED, MELEE_RANGE, RANGE, TARGETS,
+                        FLYING, SPELL, SPELL_RADIUS, TROOP_COUNT, ELIXIR, SPEED_TILES, load_stat_table)
+from Placement import (ARENA_WIDTH, ARENA_HEIGHT, RIVER_Y, TOWER_X, TOWER_Y, BOARD_LEFT, BOARD_TOP, TILE_WIDTH, TILE_HEIGHT,
+                       PlacementGrid)
+
+# X position of each bridge across the river in tiles
+BRIDGES_X = np.array([3.5, 14.5])
+
+# Hp of each tower in the same order as the tower hp regions (right princess, left princess, king)
+TOWER_HP = np.array([1400, 1400, 2400], dtype=np.float32)
+TOWER_DAMAGE = np.array([50, 50, 50], dtype=np.float32)
+TOWER_HIT_SPEED = np.array([0.8, 0.8, 1.0], dtype=np.float32)
+TOWER_RANGE = np.array([7.5, 7.5, 7], dtype=np.float32)
+# Fraction of spell damage crown towers take
+TOWER_SPELL_DAMAGE = 0.3
+
+# Reach in tiles for each melee range category (none, short, medium, long)
+MELEE_REACH = np.array([0, 0.8, 1.2, 1.6], dtype=np.float32)
+# Radius of splash damage from troops in tiles
+SPLASH_RADIUS = 1.0
+
+class ArenaSimulator(VecEnv):
+    '''
+    Headless Clash Royale like arena that steps many games at once with the same observations and actions as ClashRoyaleEnv
+    '''
+
+    def __init__(self, num_envs: int, deck: list[str] | None = None, max_units: int = 64, step_time: float = 1.0, dt: float = 0.1,
+                 enemy_play_chance: float = 0.3, seed: int | None = None, tracked: bool = False):
+        '''
+        Parameters:
+            num_envs: Number of games stepped at once
+
+            deck: Names of the 8 cards in the deck in the order the actions pick them, if None then the first 8 cards with stats are used
+
+            max_units: Maximum troops alive in a game at once across both players
+
+            step_time: Seconds of game time each step covers
+
+            dt: Seconds of game time each simulation tick covers
+
+            enemy_play_chance: Chance the scripted enemy tries to play a card each step
+
+            seed: Seed of the random number generator
+
+            tracked: Observe the velocity and age of each troop like ClashRoyaleEnv does when its troops are tracked
+        '''
+        self.layout = ObservationLayout(tracked=tracked)
+        super().__init__(num_envs, self.layout.observation_space(), gym.spaces.MultiDiscrete([9, 20, 30]))
+
+        self.card_names, self.card_table = load_stat_table("stats/card_stats.json", CARD_STAT_NAMES)
+        self.troop_names, self.troop_table = load_stat_table("stats/troop_stats.json", TROOP_STAT_NAMES)
+
+        if deck is None:
+            deck = [card_name for card_name in self.card_names if card_name != "empty"][:8]
+        self.deck = deck
+        self.deck_cards = np.array([self.card_names.index(card_name) for card_name in deck])
+        # Troop spawned by each deck card, plural card names such as archers spawn the singular troop
+        self.deck_troops = np.array([self.troop_names.index(card_name if card_name in self.troop_names else card_name[:-1])
+                                     for card_name in deck])
+        self.deck_stats = self.card_table[self.deck_cards]
+        # Where the ally can place troops, the same grid ClashRoyaleEnv checks placements with
+        self.placement = PlacementGrid()
+
+        self.max_units = max_units
+        self.step_time = step_time
+        self.dt = dt
+        self.enemy_play_chance = enemy_play_chance
+        self.rng = np.random.default_rng(seed)
+
+        # Game length in seconds and when overtime ends
+        self.game_time = 180
+        self.overtime_end = 300
+
+        # Same rewards as ClashRoyaleEnv
+        self.reward_engine = RewardEngine(self.layout, num_envs)
+
+        n, u = num_envs, max_units
+        # Troop state for every unit slot
+        self.alive = np.zeros((n, u), dtype=bool)
+        self.side = np.zeros((n, u), dtype=np.int64)
+        self.troop = np.zeros((n, u), dtype=np.int64)
+        self.hp = np.zeros((n, u), dtype=np.float32)
+        self.x = np.zeros((n, u), dtype=np.float32)
+        self.y = np.zeros((n, u), dtype=np.float32)
+        self.cooldown = np.zeros((n, u), dtype=np.float32)
+        # Position at the start of the step and game time the troop was placed, used for the tracked velocity and age
+        self.start_x = np.zeros((n, u), dtype=np.float32)
+        self.start_y = np.zeros((n, u), dtype=np.float32)
+        self.spawn_time = np.zeros((n, u), dtype=np.float32)
+
+        # Tower, elixir and card state for each side
+        self.tower_hp = np.zeros((n, 2, 3), dtype=np.float32)
+        self.tower_cooldown = np.zeros((n, 2, 3), dtype=np.float32)
+        self.elixir = np.zeros((n, 2), dtype=np.float32)
+        self.hand = np.zeros((n, 2, 4), dtype=np.int64)
+        self.queue = np.zeros((n, 2, 4), dtype=np.int64)
+        self.time = np.zeros(n, dtype=np.float32)
+
+        self.actions = np.zeros((n, 3), dtype=np.int64)
+        self.observations = np.zeros((n, self.layout.size), dtype=np.float32)
+
+    def reset_games(self, env_ids: NDArray):
+        '''
+        Starts new games
+
+        Parameters:
+            env_ids: Indices of the games to reset
+        '''
+        self.alive[env_ids] = False
+        self.tower_hp[env_ids] = TOWER_HP
+        self.tower_cooldown[env_ids] = 0
+        self.elixir[env_ids] = 5
+        self.time[env_ids] = 0
+        self.reward_engine.reset(env_ids)
+
+        # Shuffle the deck of each player, the first 4 cards are the hand and the rest wait in the queue
+        for side in range(2):
+            order = self.rng.permuted(np.tile(np.arange(8), (len(env_ids), 1)), axis=1)
+            self.hand[env_ids, side] = order[:, :4]
+            self.queue[env_ids, side] = order[:, 4:]
+
+    def reset(self) -> NDArray:
+        self.reset_games(np.arange(self.num_envs))
+        return self.observe().copy()
+
+    def step_async(self, actions: NDArray):
+        self.actions[:] = np.asarray(actions).reshape(self.num_envs, 3)
+
+    def step_wait(self) -> tuple[NDArray, NDArray, NDArray, list[dict]]:
+        all_envs = np.arange(self.num_envs)
+
+        # Ally move from the actions
+        card_index, grid_x, grid_y = self.actions[:, 0], self.actions[:, 1], self.actions[:, 2]
+        deck_index = np.maximum(card_index - 1, 0)
+        in_hand = self.hand[:, 0] == deck_index[:, None]
+        slot = in_hand.argmax(axis=1)
+        cost = self.deck_stats[deck_index, ELIXIR]
+        playing = card_index > 0
+        tower_states = self.placement.tower_state(self.tower_hp[:, 0], self.tower_hp[:, 1])
+        placeable = self.placement.is_valid_batch(tower_states, self.deck_stats[deck_index, SPELL] > 0, grid_x, grid_y)
+        invalid = playing & (~in_hand.any(axis=1) | (cost > self.elixir[:, 0]) | ~placeable)
+
+        # Same mapping from the action grid to the screen as ClashRoyaleEnv
+        tile_x = grid_x * 25 / TILE_WIDTH
+        tile_y = grid_y * 25 / TILE_HEIGHT
+        self.play_cards(all_envs[playing & ~invalid], 0, slot[playing & ~invalid], tile_x[playing & ~invalid], tile_y[playing & ~invalid])
+
+        # Scripted enemy plays a random card from its hand somewhere on its side
+        trying = self.rng.random(self.num_envs) < self.enemy_play_chance
+        enemy_slot = self.rng.integers(0, 4, self.num_envs)
+        enemy_cost = self.deck_stats[self.hand[all_envs, 1, enemy_slot], ELIXIR]
+        enemy_playing = all_envs[trying & (enemy_cost <= self.elixir[:, 1])]
+        enemy_x = self.rng.uniform(1, ARENA_WIDTH - 1, len(enemy_playing))
+        enemy_y = self.rng.uniform(2, RIVER_Y - 2, len(enemy_playing))
+        self.play_cards(enemy_playing, 1, enemy_slot[enemy_playing], enemy_x, enemy_y)
+
+        self.start_x[:] = self.x
+        self.start_y[:] = self.y
+        for _ in range(int(round(self.step_time / self.dt))):
+            self.tick()
+
+        terminated, won = self.check_game_over()
+        observations = self.observe()
+        rewards = self.reward_engine.score(observations, invalid) + self.reward_engine.outcome_reward(terminated, won)
+
+        infos = [{} for _ in range(self.num_envs)]
+        finished = np.flatnonzero(terminated)
+        for env_id in finished:
+            infos[env_id]["terminal_observation"] = observations[env_id].copy()
+            infos[env_id]["TimeLimit.truncated"] = False
+        if len(finished):
+            self.reset_games(finished)
+            observations = self.observe()
+
+        return observations.copy(), rewards, terminated, infos
+
+    def play_cards(self, env_ids: NDArray, side: int, slots: NDArray, tile_x: NDArray, tile_y: NDArray):
+        '''
+        Plays a card from the hand of one side in several games
+
+        Parameters:
+            env_ids: Indices of the games
+
+            side: 0 for the ally and 1 for the enemy
+
+            slots: Hand slot of the card played in each game
+
+            tile_x: X position in tiles
+
+            tile_y: Y position in tiles
+        '''
+        deck_index = self.hand[env_ids, side, slots]
+        stats = self.deck_stats[deck_index]
+        is_spell = stats[:, SPELL] > 0
+
+        # Ally placements were already checked against the placement grid, the enemy can only place troops on its own half
+        own_half = np.ones(len(env_ids), dtype=bool) if side == 0 else (tile_y < RIVER_Y - 1)
+        placed = is_spell | own_half
+        env_ids, slots, deck_index, stats, is_spell = env_ids[placed], slots[placed], deck_index[placed], stats[placed], is_spell[placed]
+        tile_x, tile_y = tile_x[placed], tile_y[placed]
+
+        self.elixir[env_ids, side] -= stats[:, ELIXIR]
+
+        # Played card goes to the back of the queue and the front of the queue fills its slot
+        self.hand[env_ids, side, slots] = self.queue[env_ids, side, 0]
+        self.queue[env_ids, side, :-1] = self.queue[env_ids, side, 1:]
+        self.queue[env_ids, side, -1] = deck_index
+
+        self.cast_spells(env_ids[is_spell], side, stats[is_spell], tile_x[is_spell], tile_y[is_spell])
+        self.spawn(env_ids[~is_spell], side, self.deck_troops[deck_index[~is_spell]], stats[~is_spell, TROOP_COUNT].astype(np.int64),
+                   tile_x[~is_spell], tile_y[~is_spell])
+
+    def cast_spells(self, env_ids: NDArray, side: int, stats: NDArray, tile_x: NDArray, tile_y: NDArray):
+        '''
+        Deals spell damage to every enemy troop and tower inside the spell radius
+
+        Parameters:
+            env_ids: Indices of the games
+
+            side: Side casting the spell
+
+            stats: Card stats of each spell
+
+            tile_x: X position of each spell in tiles
+
+            tile_y: Y position of each spell in tiles
+        '''
+        if len(env_ids) == 0:
+            return
+
+        radius = stats[:, SPELL_RADIUS, None]
+        damage = stats[:, SPLASH_DAMAGE, None]
+
+        unit_distance = np.hypot(self.x[env_ids] - tile_x[:, None], self.y[env_ids] - tile_y[:, None])
+        hit = self.alive[env_ids] & (self.side[env_ids] != side) & (unit_distance <= radius)
+        np.subtract.at(self.hp, env_ids, np.where(hit, damage, 0))
+
+        tower_distance = np.hypot(TOWER_X[1 - side] - tile_x[:, None], TOWER_Y[1 - side] - tile_y[:, None])
+        np.subtract.at(self.tower_hp[:, 1 - side], env_ids, np.where(tower_distance <= radius, damage * TOWER_SPELL_DAMAGE, 0))
+
+        self.remove_dead()
+
+    def spawn(self, env_ids: NDArray, side: int, troops: NDArray, counts: NDArray, tile_x: NDArray, tile_y: NDArray):
+        '''
+        Places troops into free unit slots
+
+        Parameters:
+            env_ids: Indices of the games
+
+            side: Side the troops belong to
+
+            troops: Troop id of each placement
+
+            counts: Number of troops in each placement
+
+            tile_x: X position of each placement in tiles
+
+            tile_y: Y position of each placement in tiles
+        '''
+        # Small offsets so groups such as goblins do not stand on top of each other
+        offsets = np.array([[0, 0], [0.6, 0], [-0.6, 0], [0, 0.6], [0, -0.6]], dtype=np.float32)
+
+        for count in range(int(counts.max(initial=0))):
+            placing = counts > count
+            games = env_ids[placing]
+            free = ~self.alive[games]
+            has_space = free.any(axis=1)
+            games = games[has_space]
+            slots = free[has_space].argmax(axis=1)
+            troop = troops[placing][has_space]
+
+            self.alive[games, slots] = True
+            self.side[games, slots] = side
+            self.troop[games, slots] = troop
+            self.hp[games, slots] = self.troop_table[troop, HP]
+            self.x[games, slots] = np.clip(tile_x[placing][has_space] + offsets[count % len(offsets), 0], 0, ARENA_WIDTH)
+            self.y[games, slots] = np.clip(tile_y[placing][has_space] + offsets[count % len(offsets), 1], 0, ARENA_HEIGHT)
+            self.cooldown[games, slots] = 0
+            self.spawn_time[games, slots] = self.time[games]
+
+    def tick(self):
+        '''
+        Advances every game by one simulation tick, moving troops, attacking and regenerating elixir
+        '''
+        dt = self.dt
+        stats = self.troop_table[self.troop]
+        opponent = 1 - self.side
+
+        # Distance from every troop to every troop and to every opposing tower
+        unit_dx = self.x[:, None, :] - self.x[:, :, None]
+        unit_dy = self.y[:, None, :] - self.y[:, :, None]
+        unit_distance = np.hypot(unit_dx, unit_dy)
+        tower_x = TOWER_X[opponent]
+        tower_y = TOWER_Y[opponent]
+        tower_distance = np.hypot(tower_x - self.x[:, :, None], tower_y - self.y[:, :, None])
+
+        # Which targets each troop is allowed to attack
+        targets = stats[:, :, TARGETS]
+        hits_air = targets == 1
+        buildings_only = targets >= 2
+        can_target_unit = (self.alive[:, :, None] & self.alive[:, None, :] & (self.side[:, :, None] != self.side[:, None, :])
+                           & ~buildings_only[:, :, None] & (hits_air[:, :, None] | (stats[:, None, :, FLYING] == 0)))
+        tower_alive =self.tower_hp[np.arange(self.num_envs)[:, None], opponent] > 0
+        can_target_tower = self.alive[:, :, None] & tower_alive
+
+        distances = np.concatenate([np.where(can_target_unit, unit_distance, np.inf), np.where(can_target_tower, tower_distance, np.inf)], axis=2)
+        target = distances.argmin(axis=2)
+        target_distance = np.take_along_axis(distances, target[:, :, None], axis=2)[:, :, 0]
+        has_target = np.isfinite(target_distance)
+        targets_tower = target >= self.max_units
+
+        unit_target = np.minimum(target, self.max_units - 1)
+        tower_target = np.maximum(target - self.max_units, 0)
+        target_x = np.where(targets_tower, np.take_along_axis(tower_x, tower_target[:, :, None], axis=2)[:, :, 0],
+                            np.take_along_axis(self.x, unit_target, axis=1))
+        target_y = np.where(targets_tower, np.take_along_axis(tower_y, tower_target[:, :, None], axis=2)[:, :, 0],
+                            np.take_along_axis(self.y, unit_target, axis=1))
+
+        # Troops attack once their target is within their range or melee reach
+        reach = np.where(stats[:, :, RANGE] > 0, stats[:, :, RANGE], MELEE_REACH[stats[:, :, MELEE_RANGE].astype(np.int64)]) + 0.5
+        in_range = has_target & (target_distance <= reach)
+
+        # Ground troops on the other side of the river walk to the closest bridge first
+        flying = stats[:, :, FLYING] > 0
+        crossing = ~flying & ((self.y - RIVER_Y) * (target_y - RIVER_Y) < 0)
+        bridge_x = BRIDGES_X[np.abs(self.x[:, :, None] - BRIDGES_X).argmin(axis=2)]
+        on_bridge = np.abs(self.x - bridge_x) < 0.3
+        waypoint_x = np.where(crossing & ~on_bridge, bridge_x, target_x)
+        waypoint_y = np.where(crossing & ~on_bridge, RIVER_Y, target_y)
+
+        moving = self.alive & has_target & ~in_range
+        dx = waypoint_x - self.x
+        dy = waypoint_y - self.y
+        length = np.maximum(np.hypot(dx, dy), 1e-6)
+        step = np.minimum(SPEED_TILES[stats[:, :, SPEED].astype(np.int64)] * dt, length)
+        self.x += np.where(moving, dx / length * step, 0)
+        self.y += np.where(moving, dy / length * step, 0)
+
+        # Troops in range attack when their hit speed cooldown has finished
+        self.cooldown = np.maximum(self.cooldown - dt, 0)
+        attacking = self.alive & in_range & (self.cooldown <= 0) & (stats[:, :, HIT_SPEED] > 0)
+        self.cooldown = np.where(attacking, stats[:, :, HIT_SPEED], self.cooldown)
+
+        games = np.broadcast_to(np.arange(self.num_envs)[:, None], attacking.shape)
+        unit_hits = attacking & ~targets_tower
+        unit_damage = np.zeros_like(self.hp)
+        np.add.at(unit_damage, (games[unit_hits], unit_target[unit_hits]), stats[:, :, DIRECT_DAMAGE][unit_hits])
+
+        tower_hits = attacking & targets_tower
+        tower_damage = np.zeros_like(self.tower_hp)
+        np.add.at(tower_damage, (games[tower_hits], opponent[tower_hits], tower_target[tower_hits]),
+                  stats[:, :, DIRECT_DAMAGE][tower_hits] + stats[:, :, SPLASH_DAMAGE][tower_hits])
+
+        # Splash damage hits every enemy near the target
+        splash = attacking & (stats[:, :, SPLASH_DAMAGE] > 0)
+        if splash.any():
+            splash_distance = np.hypot(self.x[:, None, :] - target_x[:, :, None], self.y[:, None, :] - target_y[:, :, None])
+            splashed = splash[:, :, None] & (splash_distance <= SPLASH_RADIUS) & can_target_unit
+            unit_damage += np.einsum("nij,ni->nj", splashed.astype(np.float32), stats[:, :, SPLASH_DAMAGE])
+
+        # Every tower shoots the closest enemy troop in range
+        tower_side = np.array([0, 1])[None, :, None, None]
+        tower_unit_distance = np.hypot(self.x[:, None, None, :] - TOWER_X[None, :, :, None], self.y[:, None, None, :] - TOWER_Y[None, :, :, None])
+        can_shoot = (self.alive[:, None, None, :] & (self.side[:, None, None, :] != tower_side) & (self.tower_hp[:, :, :, None] > 0)
+                     & (tower_unit_distance <= TOWER_RANGE[None, None, :, None]))
+        tower_target_distance = np.where(can_shoot, tower_unit_distance, np.inf)
+        shot = tower_target_distance.argmin(axis=3)
+        self.tower_cooldown = np.maximum(self.tower_cooldown - dt, 0)
+        shooting = can_shoot.any(axis=3) & (self.tower_cooldown <= 0)
+        self.tower_cooldown = np.where(shooting, TOWER_HIT_SPEED, self.tower_cooldown)
+        tower_games = np.broadcast_to(np.arange(self.num_envs)[:, None, None], shooting.shape)
+        np.add.at(unit_damage, (tower_games[shooting], shot[shooting]), np.broadcast_to(TOWER_DAMAGE, shooting.shape)[shooting])
+
+        self.hp -= unit_damage
+        self.tower_hp = np.maximum(self.tower_hp - tower_damage, 0)
+        self.remove_dead()
+
+        # Elixir comes twice as fast in the last minute and in overtime
+        elixir_rate = np.where(self.time >= self.game_time - 60, 2 / 2.8, 1 / 2.8)
+        self.elixir = np.minimum(self.elixir + elixir_rate[:, None] * dt, 10)
+        self.time += dt
+
+    def remove_dead(self):
+        '''
+        Frees the slots of troops without hp left
+        '''
+        self.alive &= self.hp > 0
+
+    def check_game_over(self) -> tuple[NDArray, NDArray]:
+        '''
+        Checks which games have finished and who won them
+
+        Returns:
+            terminated: True for every game that finished
+
+            won: True for every game the ally won
+        '''
+        ally_crowns = (self.tower_hp[:, 1] <= 0).sum(axis=1) + 2 * (self.tower_hp[:, 1, 2] <= 0)
+        enemy_crowns = (self.tower_hp[:, 0] <= 0).sum(axis=1) + 2 * (self.tower_hp[:, 0, 2] <= 0)
+        ally_crowns = np.minimum(ally_crowns, 3)
+        enemy_crowns = np.minimum(enemy_crowns, 3)
+
+        king_destroyed = (self.tower_hp[:, :, 2] <= 0).any(axis=1)
+        regular_end = (self.time >= self.game_time) & (ally_crowns != enemy_crowns)
+        overtime_end = self.time >= self.overtime_end
+        terminated = king_destroyed | regular_end | overtime_end
+
+        # Draws are decided by the lowest tower hp and count as a loss if still even
+        lowest_ally = np.where(self.tower_hp[:, 0] > 0, self.tower_hp[:, 0], np.inf).min(axis=1)
+        lowest_enemy = np.where(self.tower_hp[:, 1] > 0, self.tower_hp[:, 1], np.inf).min(axis=1)
+        won = (ally_crowns > enemy_crowns) | ((ally_crowns == enemy_crowns) & (lowest_ally > lowest_enemy))
+
+        return terminated, won
+
+    def observe(self) -> NDArray:
+        '''
+        Writes the observation of every game into the observation buffer
+
+        Returns:
+            observations: Array of shape (num_envs, observation size)
+        '''
+        parts = self.layout.split(self.observations)
+
+        parts["hand"][:] = self.card_table[self.deck_cards[self.hand[:, 0]]]
+        parts["elixir"][:, 0] = np.floor(self.elixir[:, 0])
+
+        for side, name in [(0, "ally_troops"), (1, "enemy_troops")]:
+            # Keep the first troops of the side in slot order, the rest of the rows stay zero
+            visible = self.alive & (self.side == side)
+            order = np.argsort(~visible, axis=1, kind="stable")[:, :self.layout.max_troops]
+            shown = np.take_along_axis(visible, order, axis=1)
+            troops = parts[name]
+            troops[:, :, :11] = self.troop_table[np.take_along_axis(self.troop, order, axis=1)]
+            troops[:, :, 11] = BOARD_LEFT + np.take_along_axis(self.x, order, axis=1) * TILE_WIDTH
+            troops[:, :, 12] = BOARD_TOP + np.take_along_axis(self.y, order, axis=1) * TILE_HEIGHT
+            if self.layout.tracked:
+                # Velocity in pixels per second over the last step, the same units the tracker measures
+                troops[:, :, 13] = np.take_along_axis(self.x - self.start_x, order, axis=1) * TILE_WIDTH / self.step_time
+                troops[:, :, 14] = np.take_along_axis(self.y - self.start_y, order, axis=1) * TILE_HEIGHT / self.step_time
+                troops[:, :, 15] = np.take_along_axis(self.time[:, None] - self.spawn_time, order, axis=1)
+            troops[~shown] = 0
+
+        parts["ally_towers"][:] = self.tower_hp[:, 0]
+        parts["enemy_towers"][:] = self.tower_hp[:, 1]
+        parts["time"][:, 0] = np.where(self.time < self.game_time, self.game_time - self.time, self.overtime_end - self.time)
+
+        return self.observations
+
+    def action_masks(self) -> NDArray:
+        '''
+        Masks the cards the ally can not play and where it can not place them in each game, the same masks as ClashRoyaleEnv.action_masks
+
+        Returns:
+            action_masks: Boolean array of shape (num_envs, 9 + 20 + 30) for the card index, x and y of each game
+        '''
+        nvec = self.action_space.nvec
+        action_masks = np.ones((self.num_envs, nvec.sum()), dtype=bool)
+
+        # Card index 0 is doing nothing, the rest pick a deck card that has to be in hand with enough elixir
+        in_hand = (self.hand[:, 0, :, np.newaxis] == np.arange(len(self.deck))).any(axis=1)
+        affordable = self.deck_stats[:, ELIXIR] <= self.elixir[:, 0, np.newaxis]
+        playable = in_hand & affordable
+        action_masks[:, 1:nvec[0]] = playable
+
+        # Coordinates are only limited when troops are the only cards that can be played
+        is_spell = self.deck_stats[:, SPELL] > 0
+        troops_only = (playable & ~is_spell).any(axis=1) & ~(playable & is_spell).any(axis=1)
+        tower_states = self.placement.tower_state(self.tower_hp[:, 0], self.tower_hp[:, 1])
+        action_masks[troops_only, nvec[0]:nvec[0] + nvec[1]] = self.placement.troop_x_masks[tower_states[troops_only]]
+        action_masks[troops_only, nvec[0] + nvec[1]:] = self.placement.troop_y_masks[tower_states[troops_only]]
+
+        return action_masks
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name: str, indices=None) -> list:
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> list:
+        # Action masks are computed for every game at once so each game gets its own row
+        if method_name == "action_masks":
+            action_masks = self.action_masks()
+            return [action_masks[env_id] for env_id in self._get_indices(indices)]
+        return [getattr(self, method_name)(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> list[bool]:
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,138 @@
+import os
+import argparse
+import hashlib
+import threading
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+# Bundle holding the grayscale images of every asset directory so startup reads one file instead of every png
+BUNDLE_PATH = "assets.npz"
+ASSET_DIRECTORIES = ["card_images", "screen_identifiers"]
+
+# Several threads can load assets at once during warm up so only one rewrites the bundle at a time
+bundle_lock = threading.Lock()
+
+def directory_signature(directory: str) -> str:
+    '''
+    Hashes the name, size and modification time of every png in a directory so changed images are noticed without reading them
+
+    Parameters:
+        directory: Directory of png images
+
+    Returns:
+        signature: Hex digest of the directory listing
+    '''
+    signature = hashlib.sha1()
+    for image_name in sorted(os.listdir(directory)):
+        if not image_name.endswith(".png"):
+            continue
+        image_stat = os.stat(os.path.join(directory, image_name))
+        signature.update("{}:{}:{};".format(image_name, image_stat.st_size, image_stat.st_mtime_ns).encode())
+
+    return signature.hexdigest()
+
+def read_image_directory(directory: str) -> dict[str, NDArray]:
+    '''
+    Reads every png in a directory as a grayscale image
+
+    Parameters:
+        directory: Directory of png images
+
+    Returns:
+        images: Dictionary where key is the image name without its extension and value is the grayscale image
+    '''
+    images = {}
+    for image_name in sorted(os.listdir(directory)):
+        if not image_name.endswith(".png"):
+            continue
+        image = cv2.imread(os.path.join(directory, image_name))
+        images[image_name.split(".")[0]] = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    return images
+
+def pack_directories(directories: list[str], bundle_path: str = BUNDLE_PATH):
+    '''
+    Packs asset directories into the bundle, keeping the directories already in it
+
+    Parameters:
+        directories: Directories to read again from their png images
+
+        bundle_path: Path of the bundle
+    '''
+    entries = {}
+    if os.path.exists(bundle_path):
+        with np.load(bundle_path) as bundle:
+            entries = {key: bundle[key] for key in bundle.files if key.split("/")[0] not in directories}
+
+    for directory in directories:
+        images = read_image_directory(directory)
+        entries["{}/signature".format(directory)] = np.array(directory_signature(directory))
+        entries["{}/names".format(directory)] = np.array(list(images.keys()))
+        for index, image in enumerate(images.values()):
+            entries["{}/{}".format(directory, index)] = image
+
+    # Written to a temporary file first so other processes never read a half written bundle
+    temporary_path = "{}.{}.tmp.npz".format(os.path.splitext(bundle_path)[0], os.getpid())
+    np.savez(temporary_path, **entries)
+    os.replace(temporary_path, bundle_path)
+
+def read_bundle(directory: str, signature: str, bundle_path: str = BUNDLE_PATH) -> dict[str, NDArray] | None:
+    '''
+    Reads the images of an asset directory from the bundle
+
+    Parameters:
+        directory: Directory of png images
+
+        signature: Current signature of the directory
+
+        bundle_path: Path of the bundle
+
+    Returns:
+        images: Dictionary where key is the image name and value is the grayscale image, None if the bundle is missing or out of date
+    '''
+    if not os.path.exists(bundle_path):
+        return None
+
+    # Only the arrays of this directory are read from the bundle
+    with np.load(bundle_path) as bundle:
+        signature_key = "{}/signature".format(directory)
+        if signature_key not in bundle.files or str(bundle[signature_key]) != signature:
+            return None
+        names = [str(name) for name in bundle["{}/names".format(directory)]]
+
+        return {name: bundle["{}/{}".format(directory, index)] for index, name in enumerate(names)}
+
+def load_image_directory(directory: str, bundle_path: str = BUNDLE_PATH) -> dict[str, NDArray]:
+    '''
+    Loads the grayscale images of an asset directory from the bundle, packing the directory again if its images have changed
+
+    Parameters:
+        directory: Directory of png images
+
+        bundle_path: Path of the bundle
+
+    Returns:
+        images: Dictionary where key is the image name without its extension and value is the grayscale image
+    '''
+    signature = directory_signature(directory)
+
+    with bundle_lock:
+        images = read_bundle(directory, signature, bundle_path)
+        if images is None:
+            try:
+                pack_directories([directory], bundle_path)
+            except OSError:
+                # The bundle can not be written, such as on a read only install, so the images are read directly
+                return read_image_directory(directory)
+            images = read_bundle(directory, signature, bundle_path)
+
+    return images
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the asset images into a single bundle")
+    parser.add_argument("--output", default=BUNDLE_PATH, help="path of the bundle")
+    args = parser.parse_args()
+
+    pack_directories(ASSET_DIRECTORIES, args.output)
+    print("Packed {} into {}".format(", ".join(ASSET_DIRECTORIES), args.output))
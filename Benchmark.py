@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+from Frame import Frame
+from Capture import ArraySource
+from Recorder import Recording
+from DetectorBackend import DetectorBackend, Detections, box_iou, create_detector
+
+class PerceptionBenchmark:
+    '''
+    Times each Screen reader and the full observation over a fixed corpus of saved frames
+    '''
+
+    def __init__(self, images: list[NDArray], region: tuple[int, int, int, int], deck: list[str], warmup: int = 3):
+        '''
+        Parameters:
+            images: The frames exactly as the camera returned them
+
+            region: The screen region (left, top, right, bottom) the frames cover
+
+            deck: Names of the cards in the players deck
+
+            warmup: Number of frames run through every stage before timing so lazy setup is not measured
+        '''
+        # Imported here so the comparison mode works without the perception dependencies
+        from Screen import Screen
+        from Cards import Cards
+        from AI import AI
+        from ClashRoyaleEnv import ClashRoyaleEnv
+
+        self.images = images
+        self.region = region
+        self.warmup = warmup
+
+        # The capture thread only gets a single frame as every stage is given its frames directly
+        self.screen = Screen(region, source=ArraySource(images[:1], loop=False))
+        self.cards = Cards()
+        self.env = ClashRoyaleEnv(AI(region), self.cards, self.screen, deck=deck)
+
+        deck_info = self.env.deck_info
+        self.stages = {
+            "get_cards_in_hand": lambda frame: self.screen.get_cards_in_hand(deck_info, frame),
+            "detect_troops": lambda frame: self.screen.detect_troops(frame),
+            "get_tower_hp": lambda frame: self.screen.get_tower_hp(frame),
+            "get_elixir_count": lambda frame: self.screen.get_elixir_count(frame),
+            "game_over_check": lambda frame: self.screen.game_over_check(frame),
+            "get_observation": lambda frame: self.env.get_observation(frame),
+        }
+
+    def frames(self) -> list[Frame]:
+        '''
+        Creates new frames for the corpus so colour conversions cached on a frame are timed in every stage
+
+        Returns:
+            frames: A frame for every image in the corpus
+        '''
+        return [Frame(image, self.region, frame_id) for frame_id, image in enumerate(self.images)]
+
+    def reset_caches(self):
+        '''
+        Forgets every result remembered by Screen so a pass over the corpus does not reuse what an earlier pass read from the same frames
+        '''
+        self.screen.perception_cache.invalidate()
+        self.screen.region_tracker.reset()
+        if self.screen.tracker is not None:
+            self.screen.tracker.reset()
+
+    def run_stage(self, stage: str) -> dict[str, float]:
+        '''
+        Times a single stage over the whole corpus
+
+        Parameters:
+            stage: Name of the stage
+
+        Returns:
+            results: Latency percentiles in milliseconds, throughput in frames per second and peak memory in megabytes
+        '''
+        reader = self.stages[stage]
+
+        self.reset_caches()
+        for frame in self.frames()[:self.warmup]:
+            reader(frame)
+
+        # Frames keep their ids between passes so results cached by the warmup or an earlier stage would be returned straight away
+        self.reset_caches()
+        latencies = []
+        for frame in self.frames():
+            start = time.perf_counter()
+            reader(frame)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+
+        # Memory is measured in a separate pass as tracing slows every allocation down
+        self.reset_caches()
+        tracemalloc.start()
+        for frame in self.frames():
+            reader(frame)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "throughput_fps": float(1000 * len(latencies) / latencies.sum()),
+            "peak_memory_mb": peak_memory / 1024 / 1024,
+        }
+
+    def run(self, stages: list[str] | None = None) -> dict:
+        '''
+        Times every stage
+
+        Parameters:
+            stages: Names of the stages to run, if None then every stage is run
+
+        Returns:
+            results: Dictionary with the results of every stage and a description of the corpus
+        '''
+        if stages is None:
+            stages = list(self.stages.keys())
+
+        results = {"frames": len(self.images), "created": time.time(), "stages": {}}
+        for stage in stages:
+            results["stages"][stage] = self.run_stage(stage)
+            print("{:<20} p50 {p50_ms:8.2f}ms  p95 {p95_ms:8.2f}ms  p99 {p99_ms:8.2f}ms  {throughput_fps:8.1f} fps  {peak_memory_mb:7.1f}MB"
+                  .format(stage, **results["stages"][stage]))
+
+        return results
+
+def load_corpus(directory: str, max_frames: int | None = None) -> tuple[list[NDArray], tuple[int, int, int, int] | None]:
+    '''
+    Loads saved frames from a recorded session or a folder of screenshots
+
+    Parameters:
+        directory: Folder of the recorded session or screenshots
+
+        max_frames: Maximum number of frames loaded, if None then every frame is loaded
+
+    Returns:
+        images: The frames
+
+        region: The screen region of the frames if it was recorded, otherwise None
+    '''
+    if os.path.exists("{}/metadata.json".format(directory)):
+        recording = Recording(directory)
+        count = len(recording) if max_frames is None else min(len(recording), max_frames)
+        return [recording.frame(position) for position in range(count)], recording.region
+
+    names = sorted(name for name in os.listdir(directory) if name.endswith(".png"))[:max_frames]
+    return [cv2.imread("{}/{}".format(directory, name)) for name in names], None
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    '''
+    Compares benchmark results against a baseline
+
+    Parameters:
+        results: The new results
+
+        baseline: Results to compare against
+
+        tolerance: Fraction a latency can grow by before it counts as a regression
+
+    Returns:
+        regressions: Description of every stage and measurement that got worse than the tolerance allows
+    '''
+    # Detector comparisons store their results under detectors instead of stages
+    section = "stages" if "stages" in results else "detectors"
+
+    regressions = []
+    for stage, stage_results in results[section].items():
+        if stage not in baseline.get(section, {}):
+            continue
+        for measurement in ["p50_ms", "p95_ms", "p99_ms"]:
+            old = baseline[section][stage][measurement]
+            new = stage_results[measurement]
+            if new > old * (1 + tolerance):
+                regressions.append("{} {} went from {:.2f}ms to {:.2f}ms".format(stage, measurement, old, new))
+
+    return regressions
+
+def count_matches(detections: Detections, reference: Detections, iou_threshold: float) -> int:
+    '''
+    Counts the detections that match a reference detection of the same class, each reference detection can only be matched once
+
+    Parameters:
+        detections: Detections being checked
+
+        reference: Detections treated as correct
+
+        iou_threshold: Minimum overlap for two boxes to match
+
+    Returns:
+        matches: Number of matched detections
+    '''
+    if len(detections) == 0 or len(reference) == 0:
+        return 0
+
+    iou = box_iou(detections.boxes, reference.boxes)
+    iou[detections.classes[:, None] != reference.classes[None, :]] = 0
+
+    # Most confident detections pick their best reference box first
+    matched = np.zeros(len(reference), dtype=bool)
+    matches = 0
+    for detection in np.argsort(-detections.confidences):
+        candidates = np.where(matched, 0, iou[detection])
+        best = int(candidates.argmax())
+        if candidates[best] >= iou_threshold:
+            matched[best] = True
+            matches += 1
+
+    return matches
+
+def compare_detectors(images: list[NDArray], detectors: dict[str, DetectorBackend], reference: str,
+                      crop: tuple[int, int, int, int] | None = None, iou_threshold: float = 0.5, warmup: int = 3) -> dict:
+    '''
+    Measures the latency of each detector backend and how closely its detections agree with a reference backend
+
+    Parameters:
+        images: The frames exactly as the camera returned them
+
+        detectors: Dictionary where key is the detector name and value is the detector
+
+        reference: Name of the detector whose detections are treated as correct
+
+        crop: Region (left, top, right, bottom) of each image given to the detectors, if None then the whole image is used
+
+        iou_threshold: Minimum overlap for two boxes to match
+
+        warmup: Number of images run through every detector before timing
+
+    Returns:
+        results: Latency percentiles and precision and recall against the reference for every detector
+    '''
+    rgb_images = [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image in images]
+    if crop is not None:
+        rgb_images = [image[crop[1]:crop[3], crop[0]:crop[2]] for image in rgb_images]
+
+    detections = {}
+    results = {"frames": len(images), "created": time.time(), "reference": reference, "detectors": {}}
+    for name, detector in detectors.items():
+        for image in rgb_images[:warmup]:
+            detector.detect(image)
+
+        latencies = []
+        detections[name] = []
+        for image in rgb_images:
+            start = time.perf_counter()
+            detections[name].append(detector.detect(image))
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+
+        results["detectors"][name] = {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "throughput_fps": float(1000 * len(latencies) / latencies.sum()),
+        }
+
+    for name, detector_results in results["detectors"].items():
+        found = sum(len(image_detections) for image_detections in detections[name])
+        expected = sum(len(image_detections) for image_detections in detections[reference])
+        matches = sum(count_matches(image_detections, reference_detections, iou_threshold)
+                      for image_detections, reference_detections in zip(detections[name], detections[reference]))
+        detector_results["precision"] = matches / found if found else 1.0
+        detector_results["recall"] = matches / expected if expected else 1.0
+
+        print("{:<20} p50 {p50_ms:8.2f}ms  p95 {p95_ms:8.2f}ms  {throughput_fps:8.1f} fps  precision {precision:5.3f}  recall {recall:5.3f}"
+              .format(name, **detector_results))
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the perception stages over saved frames")
+    parser.add_argument("corpus", help="folder of a recorded session or of screenshots")
+    parser.add_argument("--deck", help="comma separated names of the cards in the deck, required unless comparing detectors")
+    parser.add_argument("--region", help="left,top,right,bottom of the frames when the corpus does not record it")
+    parser.add_argument("--stages", help="comma separated stages to run, defaults to every stage")
+    parser.add_argument("--max-frames", type=int, help="maximum number of frames to load")
+    parser.add_argument("--output", default="benchmark_results.json", help="file the results are saved to")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="fraction a latency can grow by before it is a regression")
+    parser.add_argument("--detectors", help="compare detector backends instead, comma separated backend or backend:model_path, the first is the reference")
+    parser.add_argument("--full-frame", action="store_true", help="give the detectors the whole frame instead of the board")
+    args = parser.parse_args()
+
+    images, region = load_corpus(args.corpus, args.max_frames)
+    if args.region is not None:
+        region = tuple(int(value) for value in args.region.split(","))
+    if region is None:
+        region = (0, 0, images[0].shape[1], images[0].shape[0])
+
+    if args.detectors is not None:
+        detectors = {}
+        for detector in args.detectors.split(","):
+            backend, _, model_path = detector.partition(":")
+            detectors[detector] = create_detector(backend, model_path or None)
+        # Board of the game window in the coordinates of the frames
+        crop = None if args.full_frame else (15, 130, 525, 875)
+        results = compare_detectors(images, detectors, list(detectors.keys())[0], crop)
+    elif args.deck is None:
+        parser.error("--deck is required unless comparing detectors")
+    else:
+        benchmark = PerceptionBenchmark(images, region, args.deck.split(","))
+        results = benchmark.run(args.stages.split(",") if args.stages else None)
+
+    with open(args.output, "w") as results_file:
+        results_file.write(json.dumps(results, indent=4))
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print("Regression: {}".format(regression))
+        if regressions:
+            sys.exit(1)
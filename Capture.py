@@ -0,0 +1,500 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+from Frame import Frame
+from Metrics import tracer
+
+class CaptureSource:
+    '''
+    Base class for anything that can produce frames of the game screen
+    '''
+
+    def grab(self) -> NDArray | None:
+        '''
+        Grabs the next frame
+
+        Returns:
+            image: The frame or None if no new frame is available yet
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        '''
+        Releases anything held by the source
+        '''
+        pass
+
+class DxcamSource(CaptureSource):
+    '''
+    Captures frames of a region of the screen using dxcam, only available on Windows
+    '''
+
+    def __init__(self, region: tuple[int, int, int, int]):
+        # dxcam is only imported when the live game is captured so other sources work on any platform
+        import dxcam
+
+        self.region = region
+        self.camera = dxcam.create()
+
+    def grab(self) -> NDArray | None:
+        return self.camera.grab(region=self.region)
+
+    def close(self):
+        self.camera.release()
+
+class ImageFolderSource(CaptureSource):
+    '''
+    Plays back saved screenshots from a folder in name order so perception can run without the game
+    '''
+
+    def __init__(self, directory: str, loop: bool = True):
+        '''
+        Parameters:
+            directory: Folder containing the screenshots saved exactly as the camera returned them
+
+            loop: Start again from the first screenshot once the last one has been played
+        '''
+        self.paths = ["{}/{}".format(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".png")]
+        self.loop = loop
+        self.position = 0
+
+    def grab(self) -> NDArray | None:
+        if self.position >= len(self.paths):
+            if not self.loop or not self.paths:
+                return None
+            self.position = 0
+
+        image = cv2.imread(self.paths[self.position])
+        self.position += 1
+
+        return image
+
+class ArraySource(CaptureSource):
+    '''
+    Plays back frames that are already loaded in memory
+    '''
+
+    def __init__(self, images: list[NDArray], loop: bool = True):
+        '''
+        Parameters:
+            images: The frames exactly as the camera returned them
+
+            loop: Start again from the first frame once the last one has been played
+        '''
+        self.images = images
+        self.loop = loop
+        self.position = 0
+
+    def grab(self) -> NDArray | None:
+        if self.position >= len(self.images):
+            if not self.loop or not self.images:
+                return None
+            self.position = 0
+
+        image = self.images[self.position]
+        self.position += 1
+
+        return image
+
+class FrameBuffer:
+    '''
+    Fixed size ring buffer of timestamped frames that is allocated once and then written over
+    '''
+
+    def __init__(self, capacity: int, region: tuple[int, int, int, int]):
+        '''
+        Parameters:
+            capacity: Number of frames kept
+
+            region: The screen region (left, top, right, bottom) the frames cover
+        '''
+        self.capacity = capacity
+        self.region = region
+
+        # Storage is allocated when the first frame arrives as its size decides the shape
+        self.images: NDArray | None = None
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.frame_ids = np.full(capacity, -1, dtype=np.int64)
+
+        # Id the next frame written will have
+        self.next_id = 0
+
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+
+    def push(self, image: NDArray, timestamp: float) -> bool:
+        '''
+        Writes a frame over the oldest frame in the buffer
+
+        Parameters:
+            image: The captured frame
+
+            timestamp: Time the frame was captured
+
+        Returns: True if the frame was stored and False if its size does not match the buffer
+        '''
+        with self.lock:
+            if self.images is None:
+                self.images = np.empty((self.capacity,) + image.shape, dtype=image.dtype)
+            elif self.images.shape[1:] != image.shape:
+                return False
+
+            slot = self.next_id % self.capacity
+            self.images[slot] = image
+            self.timestamps[slot] = timestamp
+            self.frame_ids[slot] = self.next_id
+            self.next_id += 1
+            self.new_frame.notify_all()
+
+        return True
+
+    def read_slot(self, slot: int) -> Frame:
+        '''
+        Copies a frame out of the buffer so it stays valid after the slot is written over, the lock must be held
+
+        Parameters:
+            slot: Index of the slot in the buffer
+
+        Returns:
+            frame: Copy of the frame in the slot
+        '''
+        return Frame(self.images[slot].copy(), self.region, int(self.frame_ids[slot]), float(self.timestamps[slot]))
+
+    def latest(self) -> Frame | None:
+        '''
+        Gets the newest frame without waiting
+
+        Returns:
+            frame: The newest frame or None if nothing has been captured yet
+        '''
+        with self.lock:
+            if self.next_id == 0:
+                return None
+            return self.read_slot((self.next_id - 1) % self.capacity)
+
+    def find_after(self, after: float) -> int | None:
+        '''
+        Finds the slot of the oldest frame in the buffer captured after a given time, the lock must be held
+
+        Parameters:
+            after: Time the frame must be captured after
+
+        Returns:
+            slot: Index of the slot or None if no frame in the buffer is new enough
+        '''
+        newer = (self.frame_ids >= 0) & (self.timestamps > after)
+        if not newer.any():
+            return None
+        candidates = np.flatnonzero(newer)
+
+        return int(candidates[np.argmin(self.frame_ids[candidates])])
+
+    def first_after(self, after: float) -> Frame | None:
+        '''
+        Gets the oldest frame still in the buffer that was captured after a given time without waiting
+
+        Parameters:
+            after: Time the frame must be captured after
+
+        Returns:
+            frame: The frame or None if no frame in the buffer is new enough
+        '''
+        with self.lock:
+            slot = self.find_after(after)
+            return None if slot is None else self.read_slot(slot)
+
+    def wait_for_frame(self, after: float, timeout: float) -> Frame | None:
+        '''
+        Waits without spinning until a frame captured after a given time is available
+
+        Parameters:
+            after: Time the frame must be captured after
+
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            frame: The first frame captured after the time or None if the timeout passed
+        '''
+        deadline = time.time() + timeout
+        with self.lock:
+            slot = self.find_after(after)
+            while slot is None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.new_frame.wait(remaining)
+                slot = self.find_after(after)
+
+            return self.read_slot(slot)
+
+class CaptureThread:
+    '''
+    Producer thread that keeps grabbing frames from a capture source into a ring buffer so readers never wait on the camera
+    '''
+
+    def __init__(self, source: CaptureSource, region: tuple[int, int, int, int], capacity: int = 8, max_fps: float = 60):
+        '''
+        Parameters:
+            source: Where the frames come from
+
+            region: The screen region (left, top, right, bottom) the frames cover
+
+            capacity: Number of frames kept in the ring buffer
+
+            max_fps: Highest rate frames are grabbed at, also used to wait between empty grabs
+        '''
+        self.source = source
+        self.buffer = FrameBuffer(capacity, region)
+        self.frame_time = 1 / max_fps
+
+        # Counters describing how well capture keeps up
+        self.captured_frames = 0
+        self.empty_grabs = 0
+        self.dropped_frames = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.frames_read = 0
+        self.last_read_id = -1
+
+        # Optional recorder that every captured frame is also handed to
+        self.recorder = None
+
+        self.running = False
+        self.thread: threading.Thread | None = None
+
+    def start(self):
+        '''
+        Starts the producer thread
+        '''
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="CaptureThread", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        '''
+        Stops the producer thread and releases the source
+        '''
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.source.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def run(self):
+        '''
+        Grabs frames until stopped, sleeping instead of spinning when the source has nothing new
+        '''
+        while self.running:
+            start = time.time()
+            image = self.source.grab()
+
+            if image is None or image.size == 0:
+                self.empty_grabs += 1
+            elif self.buffer.push(image, start):
+                self.captured_frames += 1
+                if self.recorder is not None:
+                    self.recorder.record_frame(image, start, self.buffer.next_id - 1)
+
+            elapsed = time.time() - start
+            if elapsed < self.frame_time:
+                time.sleep(self.frame_time - elapsed)
+
+    def record_read(self, frame: Frame | None) -> Frame | None:
+        '''
+        Updates the latency and dropped frame counters for a frame handed to a reader
+
+        Parameters:
+            frame: The frame being handed out
+
+        Returns:
+            frame: The same frame
+        '''
+        if frame is None:
+            return None
+
+        latency = time.time() - frame.timestamp
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.frames_read += 1
+
+        # Frames captured between two reads were never seen by any reader
+        if self.last_read_id >= 0 and frame.frame_id > self.last_read_id:
+            self.dropped_frames += frame.frame_id - self.last_read_id - 1
+            tracer.count("unread_frames", frame.frame_id - self.last_read_id - 1)
+        self.last_read_id = max(self.last_read_id, frame.frame_id)
+
+        return frame
+
+    def latest(self) -> Frame | None:
+        '''
+        Gets the newest frame without waiting
+
+        Returns:
+            frame: The newest frame or None if nothing has been captured yet
+        '''
+        return self.record_read(self.buffer.latest())
+
+    def first_after(self, after: float) -> Frame | None:
+        '''
+        Gets the first frame captured after a given time without waiting
+
+        Parameters:
+            after: Time the frame must be captured after
+
+        Returns:
+            frame: The frame or None if no frame is new enough
+        '''
+        return self.record_read(self.buffer.first_after(after))
+
+    def wait_for_frame(self, after: float = 0, timeout: float = 1) -> Frame | None:
+        '''
+        Waits until a frame captured after a given time is available
+
+        Parameters:
+            after: Time the frame must be captured after
+
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            frame: The frame or None if the timeout passed
+        '''
+        return self.record_read(self.buffer.wait_for_frame(after, timeout))
+
+    def stats(self) -> dict[str, float]:
+        '''
+        Gets the capture counters
+
+        Returns:
+            stats: Dictionary of frames captured, empty grabs, frames dropped and the average and worst age of frames when read
+        '''
+        return {
+            "captured_frames": self.captured_frames,
+            "empty_grabs": self.empty_grabs,
+            "dropped_frames": self.dropped_frames,
+            "mean_latency": self.total_latency / self.frames_read if self.frames_read else 0.0,
+            "max_latency": self.max_latency,
+        }
+
+class PullCapture:
+    '''
+    Hands out the frames of a source one at a time as readers ask for them, so replaying a recording gives readers every frame in order
+    no matter how fast they run
+    '''
+
+    def __init__(self, source: CaptureSource, region: tuple[int, int, int, int], poll_interval: float = 0.005):
+        '''
+        Parameters:
+            source: Where the frames come from
+
+            region: The screen region (left, top, right, bottom) the frames cover
+
+            poll_interval: Seconds to wait between grabs while a source such as a realtime replay has no frame due yet
+        '''
+        self.source = source
+        self.region = region
+        self.poll_interval = poll_interval
+        self.next_id = 0
+
+        # Counters with the same names as the capture thread, no frame is ever dropped
+        self.captured_frames = 0
+        self.empty_grabs = 0
+
+        # Optional recorder that every frame handed out is also given to
+        self.recorder = None
+
+        # Frame grabbed while waiting that the next call to latest hands out, readers wait for a frame and then take the latest
+        self.pending: Frame | None = None
+
+    def start(self):
+        '''
+        Nothing runs in the background so there is nothing to start
+        '''
+        pass
+
+    def stop(self):
+        '''
+        Releases the source and finishes the recorder
+        '''
+        self.source.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def latest(self) -> Frame | None:
+        '''
+        Gets the next frame of the source
+
+        Returns:
+            frame: The next frame or None if the source has no frame
+        '''
+        if self.pending is not None:
+            frame, self.pending = self.pending, None
+            return frame
+
+        image = self.source.grab()
+        if image is None or image.size == 0:
+            self.empty_grabs += 1
+            return None
+
+        # Frames are stamped when they are handed out so waits measured from the time of a move still finish
+        frame = Frame(image, self.region, self.next_id, time.time())
+        self.next_id += 1
+        self.captured_frames += 1
+        if self.recorder is not None:
+            self.recorder.record_frame(image, frame.timestamp, frame.frame_id)
+
+        return frame
+
+    def first_after(self, after: float) -> Frame | None:
+        '''
+        Gets the next frame, which is always newer than any time already passed
+
+        Parameters:
+            after: Time the frame must be captured after
+
+        Returns:
+            frame: The next frame or None if the source has no frame
+        '''
+        return self.latest()
+
+    def wait_for_frame(self, after: float = 0, timeout: float = 1) -> Frame | None:
+        '''
+        Waits until the source has a frame, the frame is also handed out by the next call to latest
+
+        Parameters:
+            after: Time the frame must be captured after, every new frame is
+
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            frame: The next frame or None if the timeout passed
+        '''
+        deadline = time.time() + timeout
+        while True:
+            self.pending = self.latest()
+            if self.pending is not None or time.time() >= deadline:
+                return self.pending
+            time.sleep(self.poll_interval)
+
+    def stats(self) -> dict[str, float]:
+        '''
+        Gets the capture counters
+
+        Returns:
+            stats: Dictionary of frames handed out and empty grabs, frames are never dropped or old when read
+        '''
+        return {
+            "captured_frames": self.captured_frames,
+            "empty_grabs": self.empty_grabs,
+            "dropped_frames": 0,
+            "mean_latency": 0.0,
+            "max_latency": 0.0,
+        }
@@ -1,7 +1,11 @@
-import os
-import cv2
 from cv2.typing import MatLike
-import json
+import numpy as np
+from numpy.typing import NDArray
+from TemplateBank import TemplateBank
+from AssetBundle import load_image_directory
+from Startup import LazyResource
+from StatTables import CARD_STAT_NAMES, TROOP_STAT_NAMES, SPEED, load_stat_table
+
 class Cards:
     '''
     Class that takes care of all information regarding the cards
@@ -10,10 +14,17 @@ class Cards:
     def __init__(self):
         # card_info stores the images and name pairs for each card
         self.card_info = self.load_card_info()
+        # Card images resized once for every screen they are matched on, resized on a background thread while everything else starts
+        self.template_bank_resource = LazyResource("template_bank", lambda: TemplateBank(self.card_info))
+        self.template_bank_resource.warm_up()
+
+        # card and troop stats hold data for each card or troop based on in game stats, one row for each id
+        self.card_names, self.card_stats = load_stat_table("stats/card_stats.json", CARD_STAT_NAMES)
+        self.troop_names, self.troop_stats = load_stat_table("stats/troop_stats.json", TROOP_STAT_NAMES)
 
-        # card and troop stats hold data for each card or troop based on in game stats
-        self.card_stats = json.load(open("stats/card_stats.json", "r"))
-        self.troop_stats = json.load(open("stats/troop_stats.json", "r"))
+        # Integer id of each card and troop name
+        self.card_ids = {card_name: card_id for card_id, card_name in enumerate(self.card_names)}
+        self.troop_ids = {troop_name: troop_id for troop_id, troop_name in enumerate(self.troop_names)}
 
     def load_card_info(self) -> dict[str, MatLike]:
         '''
@@ -23,16 +34,17 @@ class Cards:
             card_info: Dictionary where key is the card name and value is the grayscale image of the card
         '''
 
-        card_info = {}
-        for card_name in os.listdir("./card_images"):
-            card_img = cv2.imread("card_images/{}".format(card_name))
-            gray_card_image = cv2.cvtColor(card_img, cv2.COLOR_BGR2GRAY)
-            card_name = card_name.split(".")[0]
-            card_info[card_name] = gray_card_image
+        # Read from the packed asset bundle instead of every png
+        return load_image_directory("card_images")
 
-        return card_info
+    @property
+    def template_bank(self) -> TemplateBank:
+        '''
+        Template bank containing every card, waiting for it to finish being resized if needed
+        '''
+        return self.template_bank_resource.get()
     
-    def get_card_stats(self, card_name: str) -> list[float]:
+    def get_card_stats(self, card_name: str) -> NDArray:
         '''
         Gets the cards stats from the card_stats.json such as hp and elixir
 
@@ -40,16 +52,12 @@ class Cards:
             card_name: String of the card name to get the stats of
 
         Returns:
-            card_stats: A list of float values for each stat of the card
+            card_stats: Read only view of the float values for each stat of the card
         
         '''
-        stats = self.card_stats[card_name]
-
-        return [float(stats["hp"]), float(stats["direct_damage"]), float(stats["splash_damage"]), float(stats["hit_speed"]), 
-                float(stats["speed"]), float(stats["melee_range"]), float(stats["range"]), float(stats["targets"]), float(stats["flying"]), 
-                float(stats["spell"]), float(stats["spell_radius"]), float(stats["troop_count"]), float(stats["elixir"])]
+        return self.card_stats[self.card_ids[card_name]]
     
-    def get_troop_stats(self, troop_name: str) -> list[float] | None:
+    def get_troop_stats(self, troop_name: str) -> NDArray | None:
         '''
         Gets the troop stats from the troop_stats.json such as hp and direct damage
 
@@ -57,17 +65,48 @@ class Cards:
             troop_name: String of the troop name to get the stats of
 
         Returns:
-            troop_stats: A list of float values for each stat of the troop
+            troop_stats: Read only view of the float values for each stat of the troop, None if the troop has no stats
         
         '''
-        if troop_name in self.troop_stats:
-            stats = self.troop_stats[troop_name]
-        else:
+        troop_id = self.troop_ids.get(troop_name)
+        if troop_id is None:
             return None
 
-        return [float(stats["hp"]), float(stats["direct_damage"]), float(stats["splash_damage"]), float(stats["hit_speed"]), 
-                float(stats["speed"]), float(stats["melee_range"]), float(stats["range"]), float(stats["targets"]), float(stats["flying"]), 
-                float(stats["spell"]), float(stats["spell_radius"])]
+        return self.troop_stats[troop_id]
+
+    def get_card_stats_batch(self, card_ids: NDArray, out: NDArray | None = None) -> NDArray:
+        '''
+        Gets the stats of several cards at once
+
+        Parameters:
+            card_ids: Ids of the cards
+
+            out: Array of shape (cards, stats) to write the stats into, if None then a new array is created
+
+        Returns:
+            card_stats: The stats of each card in the same order as the ids
+        '''
+        return np.take(self.card_stats, card_ids, axis=0, out=out)
 
-            
-        
\ No newline at end of file
+    def get_troop_stats_batch(self, troop_ids: NDArray, out: NDArray | None = None) -> NDArray:
+        '''
+        Gets the stats of several troops at once
+
+        Parameters:
+            troop_ids: Ids of the troops
+
+            out: Array of shape (troops, stats) to write the stats into, if None then a new array is created
+
+        Returns:
+            troop_stats: The stats of each troop in the same order as the ids
+        '''
+        return np.take(self.troop_stats, troop_ids, axis=0, out=out)
+
+    def get_troop_speeds(self) -> dict[str, float]:
+        '''
+        Gets the speed stat of every troop, used by the troop tracker
+
+        Returns:
+            troop_speeds: Dictionary where key is the troop name and value is its speed stat
+        '''
+        return {troop_name: float(self.troop_stats[troop_id, SPEED]) for troop_name, troop_id in self.troop_ids.items()}
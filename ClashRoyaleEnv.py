@@ -1,15 +1,42 @@
 import gymnasium as gym
 import numpy as np
 import time
+from Frame import Frame
 from Screen import Screen
 from AI import AI
 from Cards import Cards
+from StepScheduler import StepScheduler, HandShown
+from Metrics import traced, tracer
+from ObservationLayout import ObservationLayout
+from Reward import RewardEngine
+from Startup import startup_report
+from DeckCache import DeckCache
+from Placement import PlacementGrid
+from StatTables import SPELL
+from TrajectoryStore import TrajectoryWriter
 
 class ClashRoyaleEnv(gym.Env):
     '''
     Class that models the Clash Royale game environment
     '''
-    def __init__(self, ai: AI, cards: Cards, screen: Screen):
+    def __init__(self, ai: AI, cards: Cards, screen: Screen, scheduler: StepScheduler | None = None, deck: list[str] | None = None,
+                 deck_cache: DeckCache | None = None, trajectory_writer: TrajectoryWriter | None = None):
+        '''
+        Parameters:
+            ai: The agent that clicks in the game
+
+            cards: Information about every card
+
+            screen: Reads the game screen
+
+            scheduler: Decides how long each step waits, if None then the default scheduler is used
+
+            deck: Names of the cards in the players deck in order, if None then the deck is detected from the collection screen
+
+            deck_cache: Decks found in earlier runs, if given the deck is only detected when it is not already known
+
+            trajectory_writer: Stores every transition for offline training if given
+        '''
         super(ClashRoyaleEnv, self).__init__()
 
         # Allow environment to interact with other classes
@@ -17,18 +44,27 @@ class ClashRoyaleEnv(gym.Env):
         self.screen = screen
         self.cards = cards
 
+        # Decides how long each step waits for the game to react
+        if scheduler is None:
+            scheduler = StepScheduler(screen)
+        self.scheduler = scheduler
+        # Region of the board in screen coordinates
+        self.board_region = (self.ai.board_left, self.ai.board_top, self.ai.board_right, self.ai.board_bottom)
+
         # Maximum amount of troops and towers allowed for each player
         max_troops = 20
         max_towers = 3
 
-        # Get the current menu screen which can be used to get the current players deck
-        menu_screen = self.screen.get_menu_screen()
-        self.deck_info = self.screen.get_deck_info(menu_screen, self.cards.card_info)
+        if deck is None:
+            # Get the current menu screen which can be used to get the current players deck
+            menu_screen = self.screen.get_menu_screen()
+            self.deck_info = self.screen.get_deck_info(menu_screen, self.cards.template_bank, deck_cache)
+        else:
+            # Deck is already known, such as when replaying a recorded session
+            self.deck_info = self.cards.template_bank.subset(deck)
 
         # Get the card order for the AI to pick a specific card from index 0-8
-        self.card_order = []
-        for card_name in self.deck_info.keys():
-            self.card_order.append(card_name)
+        self.card_order = self.deck_info.card_names
 
         # A game lasts 180 seconds if it does not go to overtime
         self.game_time = 180
@@ -45,103 +81,115 @@ class ClashRoyaleEnv(gym.Env):
         # Check that the previous move was actually valid
         self.invalid_move = False
         
-        # Observation space
-        self.observation_space = gym.spaces.Box(
-            low=0, high=6000, shape=(
-                (4 * 13) +              # 4 cards in hand, each with 13 stats
-                1 +                     # elixir
-                (max_troops * 13) +     # max ally troops, each with 13 stats
-                (max_troops * 13) +     # max enemy troops, each with 13 stats
-                max_towers +            # max number of ally towers
-                max_towers +            # max number of enemy towers
-                1                       # time remaining
-            ,), dtype=np.float32
-        )
+        # Observation space, the layout is shared with the simulator so both produce the same observations
+        # Tracked troops also have their velocity and age observed
+        self.layout = ObservationLayout(max_troops, max_towers, tracked=self.screen.tracker is not None)
+        self.observation_space = self.layout.observation_space()
+        # Buffer every observation is assembled in and a view of each part of it
+        self.observation = np.zeros(self.layout.size, dtype=np.float32)
+        self.observation_parts = self.layout.split(self.observation)
+        # Side and troop id of each troop detector class, built from the first detection results
+        self.class_table: np.ndarray | None = None
 
         # Action space is the choice of 5 options (nothing, card1, card2, card3, card4) with the x and y coordinates
         self.action_space = gym.spaces.MultiDiscrete([9, 20, 30])
 
         # Reward based on change in tower hp over time
-        self.previous_min_ally_tower_hp = []
-        self.previous_min_enemy_tower_hp = []
-        self.previous_ally_towers_destroyed = []
-        self.previous_enemy_towers_destroyed = []
+        self.reward_engine = RewardEngine(self.layout)
+
+        # Every transition is stored with the observation it started from
+        self.trajectory_writer = trajectory_writer
+        self.last_observation: np.ndarray | None = None
+
+        # Hand and elixir from the latest observation, used to mask cards that can not be played
+        self.cards_in_hand: list[str] = []
+        self.elixir = 0
+        # Elixir cost of each card index, index 0 is doing nothing
+        self.card_costs = np.array([0] + [self.cards.get_card_stats(card_name)[-1] for card_name in self.card_order], dtype=np.float32)
+        # Whether each card index is a spell, which can be cast anywhere on the board
+        self.card_is_spell = np.array([False] + [self.cards.get_card_stats(card_name)[SPELL] > 0 for card_name in self.card_order])
+
+        # Where troops can be placed for each combination of destroyed towers, the tower state comes from the latest observation
+        self.placement = PlacementGrid(self.action_space.nvec[1], self.action_space.nvec[2])
+        self.tower_state = 0
+
+    def build_class_table(self, class_names: dict[int, str]) -> np.ndarray:
+        '''
+        Maps every class of the troop detector to the side and troop id it detects
+
+        Parameters:
+            class_names: Dictionary where key is the class id and value is the class name such as ally_knight
+
+        Returns:
+            class_table: Array of shape (classes, 2) with the side (0 ally, 1 enemy) and troop id of each class, -1 if the class is not a known troop
+        '''
+        class_table = np.full((max(class_names, default=-1) + 1, 2), -1, dtype=np.int64)
+        for class_id, class_name in class_names.items():
+            troop_type, _, troop_name = str(class_name).partition("_")
+            troop_id = self.cards.troop_ids.get(troop_name)
+            if troop_type in ("ally", "enemy") and troop_id is not None:
+                class_table[class_id] = (0 if troop_type == "ally" else 1, troop_id)
+
+        return class_table
 
-    def get_observation(self) -> tuple[list[float], int]:
+    @traced("ClashRoyaleEnv.get_observation")
+    def get_observation(self, frame: Frame | None = None) -> tuple[np.ndarray, int]:
         '''
         Gets the observations from the screen
 
+        Parameters:
+            frame: The frame every reader uses, if None then a single new frame is captured for all of them
+
         Returns:
-            observation: a list of game data flattened into a single array
+            observation: a copy of the game data flattened into a single array
             reward: An integer value determining the reward of the current state
         '''  
-        cards_in_hand = self.screen.get_cards_in_hand(self.deck_info)
-
-        # Get the card stats of the players starting hand
-        cards_in_hand_stats = []
-        for card in cards_in_hand:
-            cards_in_hand_stats.append(self.cards.get_card_stats(card))
-
-        found_troops = self.screen.detect_troops()
-        ally_troop_stats = []
-        enemy_troop_stats = []
-
-        for result in found_troops:
-            # Extract x,y coordinates and troop name from results
-            for i in range(0, len(result.boxes.cls)):
-                x = round(result.boxes.xywh[i][0].item()) + round(result.boxes.xywh[i][2].item() / 2)
-                y = round(result.boxes.xywh[i][1].item()) + round(result.boxes.xywh[i][3].item() / 2)
-                troop_name = str(result.names[result.boxes.cls[i].item()])
-                troop_type = troop_name.split("_")[0]
-
-                if troop_type == "ally":
-                    # Remove ally_ prefix
-                    troop_name = troop_name[5:]
-
-                    # Create troop_stats array and append to ally_troop_stats
-                    troop_stats = self.cards.get_troop_stats(troop_name)
-                    if troop_stats is None:
-                        continue
-                    else:
-                        troop_stats.append(x)
-                        troop_stats.append(y)
-                        ally_troop_stats.append(troop_stats)
-
-
-                elif troop_type == "enemy":
-                    # Remove enemy_ prefix
-                    troop_name = troop_name[6:]
-
-                    # Create troop_stats array and append to enemy_troop_stats
-                    troop_stats = self.cards.get_troop_stats(troop_name)
-                    if troop_stats is None:
-                        continue
-                    else:
-                        troop_stats.append(x)
-                        troop_stats.append(y)
-                        enemy_troop_stats.append(troop_stats)
-
-        # Pad results with 0's or remove data if too large
-        if len(ally_troop_stats) > 20:
-            ally_troop_stats = ally_troop_stats[0:20]
-        elif len(ally_troop_stats) < 20:
-            padded_amount = 20 - len(ally_troop_stats)
-            for i in range(padded_amount):
-                ally_troop_stats.append([0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0])
-
-        # Pad results with 0's or remove data if too large
-        if len(enemy_troop_stats) > 20:
-            enemy_troop_stats = enemy_troop_stats[0:20]
-        elif len(enemy_troop_stats) < 20:
-            padded_amount = 20 - len(enemy_troop_stats)
-            for i in range(padded_amount):
-                enemy_troop_stats.append([0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0])
+        # Every part of the observation comes from the same frame
+        if frame is None:
+            frame = self.screen.capture_frame()
+
+        # Each part is written straight into the reused observation buffer
+        parts = self.observation_parts
+
+        # Get the card stats of the players hand
+        cards_in_hand = self.screen.get_cards_in_hand(self.deck_info, frame)
+        self.cards_in_hand = cards_in_hand
+        card_ids = np.array([self.cards.card_ids[card] for card in cards_in_hand])
+        self.cards.get_card_stats_batch(card_ids, out=parts["hand"])
+
+        detections = self.screen.detect_troops(frame)
+        if self.class_table is None:
+            self.class_table = self.build_class_table(detections.names)
+
+        # Side and troop id of every detection, detections of unknown troops are dropped below
+        sides, troop_ids = self.class_table[detections.classes].T
+        boxes = detections.boxes
+        x = np.round(boxes[:, 0]) + np.round(boxes[:, 2] / 2)
+        y = np.round(boxes[:, 1]) + np.round(boxes[:, 3] / 2)
+
+        # Fill the first rows with the troops of each side and zero the rest
+        for side, troop_part in [(0, "ally_troops"), (1, "enemy_troops")]:
+            troop_stats = parts[troop_part]
+            found = np.flatnonzero((sides == side) & (troop_ids >= 0))[:self.layout.max_troops]
+            troop_count = len(found)
+            self.cards.get_troop_stats_batch(troop_ids[found], out=troop_stats[:troop_count, :11])
+            troop_stats[:troop_count, 11] = x[found]
+            troop_stats[:troop_count, 12] = y[found]
+            if self.layout.tracked:
+                troop_stats[:troop_count, 13:15] = detections.velocities[found]
+                troop_stats[:troop_count, 15] = detections.ages[found]
+            troop_stats[troop_count:] = 0
 
         # Get the tower hp for both players
-        ally_tower_hp, enemy_tower_hp = self.screen.get_tower_hp()
+        ally_tower_hp, enemy_tower_hp = self.screen.get_tower_hp(frame)
+        parts["ally_towers"][:] = ally_tower_hp
+        parts["enemy_towers"][:] = enemy_tower_hp
+        self.tower_state = self.placement.tower_state(ally_tower_hp, enemy_tower_hp)
 
         # Get the players elixir count
-        elixir = self.screen.get_elixir_count()
+        elixir = self.screen.get_elixir_count(frame)
+        parts["elixir"][0] = elixir
+        self.elixir = elixir
 
         # Get the time remaining in game
         if self.overtime == False:
@@ -151,31 +199,54 @@ class ClashRoyaleEnv(gym.Env):
                 self.overtime = True
         else:
             time_remaining = self.overtime_end_time - time.time()
+        parts["time"][0] = time_remaining
 
-        # Send collected data to calculate reward for current state
-        reward = self.calculate_reward(elixir, ally_tower_hp, enemy_tower_hp, ally_troop_stats, enemy_troop_stats)
+        # Calculate reward for current state from the assembled observation
+        reward = self.calculate_reward()
 
-        # Convert all components into 1D numpy arrays
-        cards_in_hand_stats = np.array(cards_in_hand_stats)
-        elixir = [elixir]
-        ally_troop_stats = np.array(ally_troop_stats)
-        enemy_troop_stats = np.array(enemy_troop_stats)
-        time_remaining = [time_remaining]
+        # The buffer is reused next step so whoever keeps the observation gets their own copy
+        return self.observation.copy(), reward
 
-        # Combine all 1D arrays into a single 1D array
-        observation = np.concatenate([
-            cards_in_hand_stats.flatten(),  # 4 cards in hand, each with 13 stats
-            elixir,                         # elixir
-            ally_troop_stats.flatten(),     # max ally troops, each with 13 stats
-            enemy_troop_stats.flatten(),    # max enemy troops, each with 13 stats
-            ally_tower_hp,                  # max number of ally towers
-            enemy_tower_hp,                 # max number of enemy towers
-            time_remaining                  # time remaining
-        ], dtype=np.float32)
 
-        return observation, reward
+    def card_mask(self) -> np.ndarray:
+        '''
+        Finds which card indices can be played with the hand and elixir of the latest observation
+
+        Returns:
+            card_mask: Boolean array with one value for each card index, doing nothing is always allowed
+        '''
+        card_mask = np.zeros(self.action_space.nvec[0], dtype=bool)
+        card_mask[0] = True
+        for card_index, card_name in enumerate(self.card_order, start=1):
+            card_mask[card_index] = card_name in self.cards_in_hand and self.card_costs[card_index] <= self.elixir
+
+        return card_mask
+
+    def action_masks(self) -> np.ndarray:
+        '''
+        Masks the actions that would be rejected as invalid moves, used by MaskablePPO from sb3_contrib
+
+        Returns:
+            action_masks: Boolean array with one value for every option of each action dimension in order (card index, x, y)
+        '''
+        card_mask = self.card_mask()
+        card_mask[0] = False
+        # Each dimension is masked on its own so a coordinate is allowed if any playable card can be placed there
+        coordinate_mask = self.placement.coordinate_masks(self.tower_state, bool(np.any(card_mask & ~self.card_is_spell)),
+                                                          bool(np.any(card_mask & self.card_is_spell)))
+        card_mask[0] = True
+
+        return np.concatenate([card_mask, coordinate_mask])
 
+    def close(self):
+        '''
+        Stops capturing frames and finishes writing the recorded session and stored trajectories
+        '''
+        self.screen.close()
+        if self.trajectory_writer is not None:
+            self.trajectory_writer.close()
 
+    @traced("ClashRoyaleEnv.reset")
     def reset(self, seed=None):
         """
         Resets the game state when a game finishes to start another battle against the AI
@@ -200,22 +271,29 @@ class ClashRoyaleEnv(gym.Env):
         self.overtime_end_time = self.end_time + self.overtime_time
         self.overtime = False
 
-        # Reset arrays used for calculating reward
-        self.previous_ally_towers_destroyed = []
-        self.previous_enemy_towers_destroyed = []
-        self.previous_min_ally_tower_hp = []
-        self.previous_min_enemy_tower_hp = []
+        # Reset the history used for calculating reward
+        self.reward_engine.reset()
+        # Troops and readings from the last game are forgotten
+        if self.screen.tracker is not None:
+            self.screen.tracker.reset()
+        self.screen.perception_cache.invalidate()
+        self.screen.region_tracker.reset()
 
-        # Sleep until the cards are actually shown on screen
-        time.sleep(8)
+        # Wait until the cards are actually shown on screen
+        frame = self.scheduler.wait_for(HandShown(self.screen, self.deck_info), timeout=8)
 
         # Get the initial observation of the game state
-        observation, _ = self.get_observation()
+        observation, _ = self.get_observation(frame)
+
+        self.last_observation = observation
+        if self.trajectory_writer is not None:
+            self.trajectory_writer.start_episode()
 
         return observation, {}
 
 
-    def step(self, action: tuple[int, int, int]) -> tuple[list[float], int, bool, bool, dict]:
+    @traced("ClashRoyaleEnv.step")
+    def step(self, action: tuple[int, int, int]) -> tuple[np.ndarray, int, bool, bool, dict]:
         """ 
         Execute one step in the environment which consists of playing a card at a position or choosing not to move
 
@@ -227,12 +305,17 @@ class ClashRoyaleEnv(gym.Env):
             reward: The reward after the given move
             terminated: Boolean determining if the game has finished after this step
             truncated: Always set to False as game cannot be truncated early
-            info: An information dictionary which is not used so a blank dictionary is returned
+            info: An information dictionary containing how many seconds the step waited for the game to react and the timings of the step
         
         """
         # Extract values from action
         card_index, x, y = action
 
+        # Frame from before the move used for validation and to tell when the game has reacted
+        frame = self.screen.capture_frame()
+        card_played = None
+        elixir = 0
+
         # Get the name of the card chosen
         if card_index == 0:
             card_chosen = None
@@ -241,144 +324,84 @@ class ClashRoyaleEnv(gym.Env):
 
         if card_chosen is not None:
             # Check if the move is valid by being in the hand and having enough elixir to play it
-            cards_in_hand = self.screen.get_cards_in_hand(self.deck_info)
+            cards_in_hand = self.screen.get_cards_in_hand(self.deck_info, frame)
             if card_chosen in cards_in_hand:
                 elixir_cost = self.cards.get_card_stats(card_chosen)[-1]
-                if elixir_cost <= self.screen.get_elixir_count():
+                elixir = self.screen.get_elixir_count(frame)
+                if elixir_cost > elixir:
+                    self.invalid_move = True
+                elif not self.placement.is_valid(self.tower_state, self.card_is_spell[card_index], x, y):
+                    # The game would not accept the card there so it is not clicked
+                    tracer.count("invalid_placements")
+                    self.invalid_move = True
+                else:
                     # Reset the card index as the move is valid
                     card_index = cards_in_hand.index(card_chosen) + 1
-                else:
-                    self.invalid_move = True
+                    card_played = card_chosen
             else:
                 self.invalid_move = True
 
+        if self.invalid_move:
+            tracer.count("invalid_moves")
+        # Calculating the reward clears the flag so it is kept for the stored trajectory
+        invalid_move = self.invalid_move
+
         # Map coordinates grid to x,y values
         x = x * 25
         y = y * 25
 
         # Make the move if it is not invalid
+        move_time = time.time()
         if not self.invalid_move:
             self.ai.make_move(card_index, x, y)
+            # The hand, elixir and board are about to change so nothing read before the move can be reused
+            self.screen.perception_cache.invalidate()
 
-        # Wait to let the game state settle to provide better observations
-        time.sleep(2)
+        # Report how long it took to get from starting up to the first action
+        if startup_report.milestone("first action"):
+            print(startup_report.summary())
 
-        # Check if the game is over and get the observation and reward for the move
-        terminated = self.screen.game_over_check()
-        observation, reward = self.get_observation()
+        # Keep the action with the recorded frames
+        if self.screen.capture.recorder is not None:
+            self.screen.capture.recorder.record_action(action, move_time)
+
+        # Wait until the game has reacted to the move to provide better observations
+        frame = self.scheduler.wait_after_move(move_time, frame, self.board_region, self.deck_info, card_played, card_index - 1, elixir)
+        wait_time = self.scheduler.last_wait
+
+        # Check if the game is over and get the observation and reward for the move from the same frame
+        terminated = self.screen.game_over_check(frame)
+        observation, reward = self.get_observation(frame)
+        observation_frame_id = frame.frame_id
 
         # If the game has finished wait for the winner screen to show to determine winner
         if terminated:
-            time.sleep(8)
-            winner = self.screen.game_winner_check()
-            if winner:
-                win_reward = 5000
-            else:
-                win_reward = -5000
+            frame = self.scheduler.wait_for_screen("winner_screen", timeout=8)
+            winner = self.screen.game_winner_check(frame)
+            win_reward = float(self.reward_engine.outcome_reward(np.array([True]), np.array([winner]))[0])
+            outcome = 1 if winner else -1
         else:
             win_reward = 0
-            
-        return observation, reward+win_reward, terminated, False, {}
+            outcome = 0
 
-    def calculate_reward(self, elixir: int, ally_tower_hp: list[int], enemy_tower_hp: list[int], 
-                         ally_troop_stats: list[float], enemy_troop_stats: list[float]) -> float:
-        """ 
-        Calculates a reward based on information provided by observation
+        # Frame id lets the transition be matched with the frames of a recorded session
+        if self.trajectory_writer is not None and self.last_observation is not None:
+            self.trajectory_writer.record(self.last_observation, action, reward + win_reward, observation, terminated, False, move_time,
+                                          observation_frame_id, invalid_move, outcome)
+        self.last_observation = observation
 
-        Parameters: 
-            elixir: The players elixir count
-            ally_tower_hp: List of all 3 ally towers and their hp values
-            enemy_tower_hp: List of all 3 enemy towers and their hp values
-            ally_troop_stats: List of the stats of the ally troops that are currently on the screen
-            enemy_troop_stats: List of the stats of the enemy troops that are currently on screen
+        # Timings are sent through the info as the env can be in a worker process with its own tracer
+        return observation, reward+win_reward, terminated, False, {"wait_time": wait_time, "perf": tracer.summary()}
+
+    @traced("ClashRoyaleEnv.calculate_reward")
+    def calculate_reward(self) -> float:
+        """ 
+        Calculates a reward based on the observation in the observation buffer
 
         Returns: 
             reward: Float value for the reward of the current state
         """
+        invalid_moves = np.array([self.invalid_move])
+        self.invalid_move = False
 
-        # Punish for not picking a valid move
-        if self.invalid_move:
-            self.invalid_move = False
-            return -5000
-
-        # Find the lowest hp ally tower and how many have been destroyed
-        ally_towers_destroyed = 0
-        min_ally_tower_hp = 4000
-        for hp in ally_tower_hp:
-            if hp == 0:
-                ally_towers_destroyed += 1
-            else:
-                min_ally_tower_hp = min(min_ally_tower_hp, hp)
-
-        # Find the lowest hp enemy tower and how many have been destroyed
-        enemy_towers_destroyed = 0
-        min_enemy_tower_hp = 4000
-        for hp in enemy_tower_hp:
-            if hp == 0:
-                enemy_towers_destroyed += 1
-            else:
-                min_enemy_tower_hp = min(min_enemy_tower_hp, hp)
-
-        # Add the minimum tower hp and towers destroyed to the list of previous values
-        # Previous values are stored so that the reward function can be spread for a longer timeframe reward based on change in hp over time
-        # This helps promote long term goals rather than immediate reward that could lead to losing the game
-        self.previous_min_ally_tower_hp.append(min_ally_tower_hp)
-        self.previous_min_enemy_tower_hp.append(min_enemy_tower_hp)
-        self.previous_ally_towers_destroyed.append(ally_towers_destroyed)
-        self.previous_enemy_towers_destroyed.append(enemy_towers_destroyed)
-
-        # Remove the first value like a FIFO queue so the size is always 10
-        for list in [self.previous_min_ally_tower_hp, self.previous_min_enemy_tower_hp, self.previous_ally_towers_destroyed, self.previous_enemy_towers_destroyed]:
-            if len(list) > 10:
-                list.pop(0)
-
-        # If we have 10 values then start calculating the reward based on change in tower hp from the first to last position
-        if len(self.previous_min_ally_tower_hp) == 10: 
-            # Change in hp
-            delta_ally_tower_hp = self.previous_min_ally_tower_hp[-1] - self.previous_min_ally_tower_hp[0]
-            delta_enemy_tower_hp = self.previous_min_enemy_tower_hp[-1] - self.previous_min_enemy_tower_hp[0]
-
-            # Change in towers destroyed
-            delta_ally_towers_destroyed = self.previous_ally_towers_destroyed[-1] - self.previous_ally_towers_destroyed[0]
-            delta_enemy_towers_destroyed = self.previous_enemy_towers_destroyed[-1] - self.previous_enemy_towers_destroyed[0]
-
-            # Sometimes towers may mistakenly be marked as lost and will come back again, this change back should be ignored
-            if delta_enemy_towers_destroyed < 0:
-                delta_enemy_towers_destroyed = 0
-            if delta_ally_towers_destroyed < 0:
-                delta_ally_towers_destroyed = 0
-
-            # Reward is simply the amount of hp difference change between ally towers and enemy towers
-            tower_difference_reward = 1400 * (delta_enemy_towers_destroyed - delta_ally_towers_destroyed)
-            min_tower_difference_reward = delta_ally_tower_hp - delta_enemy_tower_hp
-        
-        # If we dont have 10 values yet then don't give a reward
-        else:
-            tower_difference_reward = 0
-            min_tower_difference_reward = 0
-
-
-        troop_hp_difference = 0
-        # Remove the troop stats that are padded with 0's
-        # Also add the hp difference between troops on the screen
-        for i in range(len(ally_troop_stats)):
-            if ally_troop_stats[i] == [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]:
-                ally_troop_stats = ally_troop_stats[:i]
-                break
-            else:
-                troop_hp_difference += ally_troop_stats[i][0]
-
-        for i in range(len(enemy_troop_stats)):
-            if enemy_troop_stats[i] == [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]:
-                enemy_troop_stats = enemy_troop_stats[:i]
-                break
-            else:
-                troop_hp_difference -= enemy_troop_stats[i][0]
-
-        # Troop hp difference is weighted less as tower hp is more important but helps to guide the AI to kill enemy troops
-        troop_hp_difference = troop_hp_difference / 20
-
-        # Reward for elixir the player has remaining
-        elixir_reward = elixir ** 2
-
-        return elixir_reward + troop_hp_difference + tower_difference_reward + min_tower_difference_reward
+        return float(self.reward_engine.score(self.observation[np.newaxis], invalid_moves)[0])
@@ -0,0 +1,178 @@
+import os
+import json
+import cv2
+from cv2.typing import MatLike
+import numpy as np
+
+class DeckCache:
+    '''
+    Remembers the decks found on the collection screen by a fingerprint of the deck area so the deck does not have to be template matched again
+    '''
+
+    def __init__(self, cache_path: str = "deck_cache.json", max_distance: int = 20, refresh: bool = False, key: str = "default",
+                 trust_last: bool = False):
+        '''
+        Parameters:
+            cache_path: File the decks are saved to
+
+            max_distance: Maximum number of differing fingerprint bits for the deck area to be counted as showing a cached deck
+
+            refresh: Ignore the cached decks and detect the deck again, the new deck is still saved
+
+            key: Name of the game window or account the last deck is remembered for, windows can use different decks
+
+            trust_last: Use the last deck without looking at the collection screen, only set once the player has confirmed it is still the deck in use
+        '''
+        self.cache_path = cache_path
+        self.max_distance = max_distance
+        self.refresh = refresh
+        self.key = key
+        self.trust_last = trust_last
+
+        # Size of the image the fingerprint is computed from, one bit per pixel compared to its right neighbour
+        self.fingerprint_size = (17, 16)
+
+        # Dictionary where key is the hex fingerprint and value is the card names of the deck in order, plus the fingerprint of the last deck
+        # used by each window
+        self.decks, self.last_fingerprints = self.load_cache()
+
+    @property
+    def last_fingerprint(self) -> str | None:
+        '''
+        Fingerprint of the deck this window used last, None if it has not saved a deck
+        '''
+        return self.last_fingerprints.get(self.key)
+
+    def load_cache(self) -> tuple[dict[str, list[str]], dict[str, str]]:
+        '''
+        Loads the saved decks if there are any
+
+        Returns:
+            decks: Dictionary where key is the hex fingerprint and value is the card names of the deck
+
+            last_fingerprints: Dictionary where key is the window key and value is the fingerprint of the deck it used last
+        '''
+        if not os.path.exists(self.cache_path):
+            return {}, {}
+
+        with open(self.cache_path, "r") as cache_file:
+            cache = json.load(cache_file)
+
+        # Caches from before windows were told apart store a single fingerprint
+        last_fingerprints = cache.get("last") or {}
+        if isinstance(last_fingerprints, str):
+            last_fingerprints = {"default": last_fingerprints}
+
+        return cache.get("decks", {}), last_fingerprints
+
+    def save_cache(self):
+        '''
+        Saves the decks so later runs can skip detecting them
+        '''
+        # Other windows may have saved since this cache was loaded so their decks are kept
+        decks, last_fingerprints = self.load_cache()
+        decks.update(self.decks)
+        last_fingerprints.update(self.last_fingerprints)
+        self.decks, self.last_fingerprints = decks, last_fingerprints
+
+        # Several workers can save at once so each writes its own file and swaps it in
+        temporary_path = "{}.{}.tmp".format(self.cache_path, os.getpid())
+        with open(temporary_path, "w") as cache_file:
+            cache_file.write(json.dumps({"last": self.last_fingerprints, "decks": self.decks}, indent=4))
+        os.replace(temporary_path, self.cache_path)
+
+    def fingerprint(self, gray_deck_image: MatLike) -> str:
+        '''
+        Computes a 256 bit difference hash of the deck area that survives small changes in brightness and noise
+
+        Parameters:
+            gray_deck_image: Grayscale image of the deck area on the collection screen
+
+        Returns:
+            fingerprint: Hex string where each bit is whether a pixel is brighter than its right neighbour in a 17x16 version of the image
+        '''
+        small = cv2.resize(gray_deck_image, self.fingerprint_size, interpolation=cv2.INTER_AREA)
+        bits = small[:, 1:] > small[:, :-1]
+
+        return np.packbits(bits).tobytes().hex()
+
+    def distance(self, fingerprint: str, other_fingerprint: str) -> int:
+        '''
+        Counts the differing bits of two fingerprints
+
+        Parameters:
+            fingerprint: Hex fingerprint
+
+            other_fingerprint: Hex fingerprint to compare with
+
+        Returns:
+            distance: Number of differing bits
+        '''
+        return (int(fingerprint, 16) ^ int(other_fingerprint, 16)).bit_count()
+
+    def lookup(self, fingerprint: str) -> list[str] | None:
+        '''
+        Finds the cached deck with the closest fingerprint
+
+        Parameters:
+            fingerprint: Fingerprint of the deck area
+
+        Returns:
+            deck: Card names of the deck in order, None if no cached deck is close enough or a refresh was asked for
+        '''
+        if self.refresh or not self.decks:
+            return None
+
+        closest = min(self.decks, key=lambda cached_fingerprint: self.distance(fingerprint, cached_fingerprint))
+        if self.distance(fingerprint, closest) > self.max_distance:
+            return None
+
+        self.use(closest)
+        return self.decks[closest]
+
+    def last_deck(self) -> list[str] | None:
+        '''
+        Gets the deck this window used last, which may have been changed since so it is only given once the player has confirmed it
+
+        Returns:
+            deck: Card names of the deck in order, None if it is not trusted, no deck has been saved or a refresh was asked for
+        '''
+        if self.refresh or not self.trust_last or self.last_fingerprint not in self.decks:
+            return None
+
+        return self.decks[self.last_fingerprint]
+
+    def use(self, fingerprint: str):
+        '''
+        Marks a cached deck as the one being used
+
+        Parameters:
+            fingerprint: Fingerprint of the deck
+        '''
+        if fingerprint != self.last_fingerprint:
+            self.last_fingerprints[self.key] = fingerprint
+            self.save_cache()
+
+    def store(self, fingerprint: str, deck: list[str]) -> list[str]:
+        '''
+        Saves a detected deck, keeping the card order of any cached deck with the same cards so card indices stay the same between runs
+
+        Parameters:
+            fingerprint: Fingerprint of the deck area
+
+            deck: Card names found in the deck in any order
+
+        Returns:
+            deck: Card names of the deck in the order they should be indexed
+        '''
+        ordered_deck = sorted(deck)
+        for cached_deck in self.decks.values():
+            if sorted(cached_deck) == ordered_deck:
+                ordered_deck = cached_deck
+                break
+
+        self.decks[fingerprint] = ordered_deck
+        self.last_fingerprints[self.key] = fingerprint
+        self.save_cache()
+
+        return ordered_deck
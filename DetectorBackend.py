@@ -0,0 +1,377 @@
+import os
+import ast
+import argparse
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+class Detections:
+    '''
+    Troops found by a detector in a single image, the same for every backend
+    '''
+
+    def __init__(self, boxes: NDArray, classes: NDArray, confidences: NDArray, names: dict[int, str], track_ids: NDArray | None = None,
+                 velocities: NDArray | None = None, ages: NDArray | None = None):
+        '''
+        Parameters:
+            boxes: Array of shape (n, 4) with the centre x, centre y, width and height of each box in image coordinates
+
+            classes: Class id of each box
+
+            confidences: Confidence of each box
+
+            names: Dictionary where key is the class id and value is the class name such as ally_knight
+
+            track_ids: Id of the troop each box belongs to, only set when troops are tracked
+
+            velocities: Array of shape (n, 2) with the velocity of each troop in pixels per second, only set when troops are tracked
+
+            ages: Seconds each troop has been tracked for, only set when troops are tracked
+        '''
+        self.boxes = boxes
+        self.classes = classes
+        self.confidences = confidences
+        self.names = names
+        self.track_ids = track_ids
+        self.velocities = velocities
+        self.ages = ages
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+def box_iou(boxes: NDArray, other_boxes: NDArray) -> NDArray:
+    '''
+    Calculates the intersection over union of every pair of boxes
+
+    Parameters:
+        boxes: Array of shape (n, 4) of centre x, centre y, width and height
+
+        other_boxes: Array of shape (m, 4) of centre x, centre y, width and height
+
+    Returns:
+        iou: Array of shape (n, m)
+    '''
+    top_left = np.maximum(boxes[:, None, :2] - boxes[:, None, 2:] / 2, other_boxes[None, :, :2] - other_boxes[None, :, 2:] / 2)
+    bottom_right = np.minimum(boxes[:, None, :2] + boxes[:, None, 2:] / 2, other_boxes[None, :, :2] + other_boxes[None, :, 2:] / 2)
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    union = np.prod(boxes[:, 2:], axis=1)[:, None] + np.prod(other_boxes[:, 2:], axis=1)[None, :] - intersection
+
+    return intersection / np.maximum(union, 1e-9)
+
+class DetectorBackend:
+    '''
+    Runs a troop detection model, subclasses run it with a specific inference library
+    '''
+
+    def __init__(self, names: dict[int, str], conf: float = 0.4):
+        '''
+        Parameters:
+            names: Dictionary where key is the class id and value is the class name
+
+            conf: Minimum confidence of a detection
+        '''
+        self.names = names
+        self.conf = conf
+
+    def detect(self, image: NDArray) -> Detections:
+        '''
+        Finds the troops in an image
+
+        Parameters:
+            image: RGB image to search
+
+        Returns:
+            detections: The troops found with boxes in the coordinates of the image
+        '''
+        raise NotImplementedError
+
+    def detect_batch(self, images: list[NDArray]) -> list[Detections]:
+        '''
+        Finds the troops in several images, backends that can run a batch at once override this
+
+        Parameters:
+            images: RGB images to search
+
+        Returns:
+            detections: The troops found in each image
+        '''
+        return [self.detect(image) for image in images]
+
+class UltralyticsDetector(DetectorBackend):
+    '''
+    Runs the PyTorch model through ultralytics
+    '''
+
+    def __init__(self, model_path: str = "troop_detector.pt", conf: float = 0.4, imgsz: int | None = None):
+        '''
+        Parameters:
+            model_path: Path of the model
+
+            conf: Minimum confidence of a detection
+
+            imgsz: Size images are resized to, if None then the size the model was trained at is used
+        '''
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        self.imgsz = imgsz
+        super().__init__(self.model.names, conf)
+
+    def detect(self, image: NDArray) -> Detections:
+        arguments = {} if self.imgsz is None else {"imgsz": self.imgsz}
+        # Not streamed so the model runs inside this method and its time is measured by the caller
+        result = self.model.predict(source=image, stream=False, conf=self.conf, verbose=False, **arguments)[0]
+
+        return self.to_detections(result)
+
+    def detect_batch(self, images: list[NDArray]) -> list[Detections]:
+        arguments = {} if self.imgsz is None else {"imgsz": self.imgsz}
+        results = self.model.predict(source=images, stream=False, conf=self.conf, verbose=False, **arguments)
+
+        return [self.to_detections(result) for result in results]
+
+    def to_detections(self, result) -> Detections:
+        '''
+        Converts an ultralytics result to detections
+
+        Parameters:
+            result: Ultralytics result of a single image
+
+        Returns:
+            detections: The troops found
+        '''
+        return Detections(result.boxes.xywh.cpu().numpy(), result.boxes.cls.cpu().numpy().astype(np.int64),
+                          result.boxes.conf.cpu().numpy(), self.names)
+
+class ExportedDetector(DetectorBackend):
+    '''
+    Runs an exported model with a fixed input size, doing the resizing and box filtering that ultralytics would otherwise do
+    '''
+
+    def __init__(self, names: dict[int, str], input_size: tuple[int, int], conf: float = 0.4, iou: float = 0.7):
+        '''
+        Parameters:
+            names: Dictionary where key is the class id and value is the class name
+
+            input_size: Height and width of the model input
+
+            conf: Minimum confidence of a detection
+
+            iou: Boxes of the same class overlapping more than this are merged
+        '''
+        super().__init__(names, conf)
+        self.input_size = input_size
+        self.iou = iou
+
+        # Input is reused for every image, the padding only has to be written when the image size changes
+        self.input = np.full((1, 3, input_size[0], input_size[1]), 114 / 255, dtype=np.float32)
+        self.image_shape = None
+        self.scale = 1.0
+        self.padding = (0, 0)
+
+    def infer(self, model_input: NDArray) -> NDArray:
+        '''
+        Runs the model
+
+        Parameters:
+            model_input: Array of shape (1, 3, height, width)
+
+        Returns:
+            output: Array of shape (1, 4 + classes, anchors)
+        '''
+        raise NotImplementedError
+
+    def preprocess(self, image: NDArray):
+        '''
+        Letterboxes an image into the reused model input
+
+        Parameters:
+            image: RGB image
+        '''
+        height, width = self.input_size
+        if image.shape[:2] != self.image_shape:
+            self.image_shape = image.shape[:2]
+            self.scale = min(height / image.shape[0], width / image.shape[1])
+            resized_height, resized_width = round(image.shape[0] * self.scale), round(image.shape[1] * self.scale)
+            self.padding = ((width - resized_width) // 2, (height - resized_height) // 2)
+            self.input[:] = 114 / 255
+
+        resized_width, resized_height = round(image.shape[1] * self.scale), round(image.shape[0] * self.scale)
+        resized = cv2.resize(image[:, :, :3], (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+        left, top = self.padding
+        np.multiply(resized.transpose(2, 0, 1), 1 / 255, out=self.input[0, :, top:top + resized_height, left:left + resized_width],
+                    casting="unsafe")
+
+    def postprocess(self, output: NDArray) -> Detections:
+        '''
+        Filters the raw model output into detections in image coordinates
+
+        Parameters:
+            output: Array of shape (1, 4 + classes, anchors)
+
+        Returns:
+            detections: The troops found
+        '''
+        predictions = output[0].T
+        scores = predictions[:, 4:]
+        classes = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), classes]
+
+        keep = confidences >= self.conf
+        boxes, classes, confidences = predictions[keep, :4], classes[keep], confidences[keep]
+
+        # Merge overlapping boxes of the same class
+        top_left_boxes = np.column_stack([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, 2:]])
+        kept = cv2.dnn.NMSBoxesBatched(top_left_boxes.tolist(), confidences.tolist(), classes.tolist(), self.conf, self.iou)
+        kept = np.asarray(kept, dtype=np.int64).reshape(-1)
+        boxes, classes, confidences = boxes[kept], classes[kept], confidences[kept]
+
+        # Undo the letterbox
+        boxes = boxes.copy()
+        boxes[:, 0] -= self.padding[0]
+        boxes[:, 1] -= self.padding[1]
+        boxes /= self.scale
+
+        return Detections(boxes.astype(np.float32), classes.astype(np.int64), confidences.astype(np.float32), self.names)
+
+    def detect(self, image: NDArray) -> Detections:
+        self.preprocess(image)
+        return self.postprocess(self.infer(self.input))
+
+class OnnxDetector(ExportedDetector):
+    '''
+    Runs a model exported to ONNX with ONNX Runtime on the CPU
+    '''
+
+    def __init__(self, model_path: str = "troop_detector.onnx", conf: float = 0.4, iou: float = 0.7, threads: int | None = None):
+        '''
+        Parameters:
+            model_path: Path of the exported model
+
+            conf: Minimum confidence of a detection
+
+            iou: Boxes of the same class overlapping more than this are merged
+
+            threads: Threads used by a single inference, if None then ONNX Runtime decides
+        '''
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads is not None:
+            options.intra_op_num_threads = threads
+
+        # Session is created once and reused for every image
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        input_shape = self.session.get_inputs()[0].shape
+
+        # Ultralytics stores the class names in the model metadata
+        names = ast.literal_eval(self.session.get_modelmeta().custom_metadata_map["names"])
+        super().__init__(names, (int(input_shape[2]), int(input_shape[3])), conf, iou)
+
+    def infer(self, model_input: NDArray) -> NDArray:
+        return self.session.run(None, {self.input_name: model_input})[0]
+
+class OpenVinoDetector(ExportedDetector):
+    '''
+    Runs a model exported to OpenVINO on the CPU
+    '''
+
+    def __init__(self, model_path: str = "troop_detector_openvino_model", conf: float = 0.4, iou: float = 0.7):
+        '''
+        Parameters:
+            model_path: Folder of the exported model
+
+            conf: Minimum confidence of a detection
+
+            iou: Boxes of the same class overlapping more than this are merged
+        '''
+        import yaml
+        import openvino
+
+        xml_path = [name for name in os.listdir(model_path) if name.endswith(".xml")][0]
+        core = openvino.Core()
+        self.compiled_model = core.compile_model("{}/{}".format(model_path, xml_path), "CPU")
+        # Infer request is created once and reused for every image
+        self.request = self.compiled_model.create_infer_request()
+        input_shape = self.compiled_model.input(0).shape
+
+        # Ultralytics saves the class names next to the exported model
+        with open("{}/metadata.yaml".format(model_path), "r") as metadata_file:
+            names = yaml.safe_load(metadata_file)["names"]
+        super().__init__(names, (int(input_shape[2]), int(input_shape[3])), conf, iou)
+
+    def infer(self, model_input: NDArray) -> NDArray:
+        self.request.infer({0: model_input})
+        return self.request.get_output_tensor(0).data
+
+def export_detector(model_path: str = "troop_detector.pt", format: str = "onnx", int8: bool = False, imgsz: int = 640,
+                    data: str | None = None) -> str:
+    '''
+    Exports the PyTorch model so it can be run by a faster backend
+
+    Parameters:
+        model_path: Path of the PyTorch model
+
+        format: Either onnx or openvino
+
+        int8: Quantize the weights to 8 bit integers
+
+        imgsz: Fixed size of the exported model input
+
+        data: Dataset yaml used to calibrate OpenVINO int8 quantization
+
+    Returns:
+        export_path: Path of the exported model
+    '''
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    if format == "openvino":
+        return model.export(format="openvino", imgsz=imgsz, int8=int8, data=data, dynamic=False)
+
+    export_path = model.export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True)
+    if not int8:
+        return export_path
+
+    # Ultralytics only quantizes OpenVINO exports so ONNX weights are quantized with ONNX Runtime
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    int8_path = export_path.replace(".onnx", "_int8.onnx")
+    quantize_dynamic(export_path, int8_path, weight_type=QuantType.QUInt8)
+
+    return int8_path
+
+def create_detector(backend: str = "ultralytics", model_path: str | None = None, conf: float = 0.4) -> DetectorBackend:
+    '''
+    Creates a detector backend by name
+
+    Parameters:
+        backend: One of ultralytics, onnx or openvino
+
+        model_path: Path of the model, if None then the default path of the backend is used
+
+        conf: Minimum confidence of a detection
+
+    Returns:
+        detector: The detector backend
+    '''
+    backends = {"ultralytics": UltralyticsDetector, "onnx": OnnxDetector, "openvino": OpenVinoDetector}
+    if backend not in backends:
+        raise ValueError("Unknown detector backend {}, expected one of {}".format(backend, ", ".join(backends)))
+
+    if model_path is None:
+        return backends[backend](conf=conf)
+
+    return backends[backend](model_path, conf=conf)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the troop detector for a faster backend")
+    parser.add_argument("--model", default="troop_detector.pt", help="path of the PyTorch model")
+    parser.add_argument("--format", default="onnx", choices=["onnx", "openvino"], help="backend to export for")
+    parser.add_argument("--int8", action="store_true", help="quantize the weights to 8 bit integers")
+    parser.add_argument("--imgsz", type=int, default=640, help="fixed size of the model input")
+    parser.add_argument("--data", help="dataset yaml used to calibrate OpenVINO int8 quantization")
+    args = parser.parse_args()
+
+    print("Exported to {}".format(export_detector(args.model, args.format, args.int8, args.imgsz, args.data)))
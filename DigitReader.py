@@ -0,0 +1,184 @@
+import os
+import cv2
+from cv2.typing import MatLike
+import numpy as np
+from numpy.typing import NDArray
+
+class DigitReader:
+    '''
+    Reads the fixed font numbers shown on the game screen such as tower hp by matching each digit against glyph templates taken from game frames
+    '''
+
+    def __init__(self, glyph_directory: str = "digit_glyphs", text_threshold: int = 180, max_glyphs_per_digit: int = 3):
+        '''
+        Parameters:
+            glyph_directory: Directory holding the glyph images, each named by its digit followed by anything e.g. 7_2.png
+
+            text_threshold: Grayscale value above which a pixel is counted as part of the white text
+
+            max_glyphs_per_digit: Number of glyphs learned for each digit from numbers read by easyocr
+        '''
+        self.glyph_directory = glyph_directory
+        self.text_threshold = text_threshold
+        self.max_glyphs_per_digit = max_glyphs_per_digit
+
+        # Size every glyph is scaled to before being compared
+        self.glyph_width = 10
+        self.glyph_height = 14
+
+        # Glyphs narrower than this many pixels are noise from the hp bar border
+        self.min_glyph_width = 2
+
+        # Matrix of normalised glyph vectors and the digit each row belongs to
+        self.templates, self.template_digits = self.load_glyphs()
+
+    def load_glyphs(self) -> tuple[NDArray, NDArray]:
+        '''
+        Loads the glyph images and turns them into normalised vectors ready for matching
+
+        Returns:
+            templates: Array of shape (glyphs, glyph_height * glyph_width) with one normalised glyph per row
+
+            template_digits: Array containing the digit of each template row
+        '''
+        templates = []
+        template_digits = []
+
+        if os.path.isdir(self.glyph_directory):
+            for glyph_name in sorted(os.listdir(self.glyph_directory)):
+                if not glyph_name.endswith(".png"):
+                    continue
+                glyph = cv2.imread("{}/{}".format(self.glyph_directory, glyph_name), cv2.IMREAD_GRAYSCALE)
+                templates.append(self.normalise_glyph(glyph))
+                template_digits.append(int(glyph_name[0]))
+
+        templates = np.array(templates, dtype=np.float32).reshape(len(templates), self.glyph_width * self.glyph_height)
+        template_digits = np.array(template_digits, dtype=np.int64)
+
+        return templates, template_digits
+
+    def normalise_glyph(self, glyph: MatLike) -> NDArray:
+        '''
+        Scales a glyph to the fixed glyph size and normalises it so matching is a single dot product
+
+        Parameters:
+            glyph: Binary or grayscale image of a single digit
+
+        Returns:
+            vector: Flattened zero mean, unit length vector of the glyph
+        '''
+        glyph = cv2.resize(glyph, (self.glyph_width, self.glyph_height), interpolation=cv2.INTER_AREA)
+        vector = glyph.astype(np.float32).ravel()
+        vector -= vector.mean()
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+
+        return vector
+
+    def segment(self, image: MatLike) -> list[MatLike]:
+        '''
+        Splits an image of a number into an image of each digit from left to right
+
+        Parameters:
+            image: BGR or grayscale crop containing the number
+
+        Returns:
+            glyphs: List of binary images, one for each digit
+        '''
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        text_mask = (image > self.text_threshold).astype(np.uint8) * 255
+
+        # Digits are separated by columns without any text pixels
+        text_columns = np.concatenate(([False], text_mask.any(axis=0), [False]))
+        edges = np.flatnonzero(text_columns[1:] != text_columns[:-1])
+        starts, ends = edges[0::2], edges[1::2]
+
+        glyphs = []
+        for start, end in zip(starts, ends):
+            if end - start < self.min_glyph_width:
+                continue
+            glyph = text_mask[:, start:end]
+            rows = np.flatnonzero(glyph.any(axis=1))
+            glyphs.append(glyph[rows[0]:rows[-1] + 1])
+
+        return glyphs
+
+    def read(self, image: MatLike) -> tuple[int, float]:
+        '''
+        Reads the number shown in an image
+
+        Parameters:
+            image: BGR or grayscale crop containing the number
+
+        Returns:
+            value: The number that was read, 0 if nothing could be read
+
+            confidence: Match score of the least certain digit from 0 to 1, 0 if nothing could be read
+        '''
+        if len(self.templates) == 0:
+            return 0, 0.0
+
+        glyphs = self.segment(image)
+        if not glyphs:
+            return 0, 0.0
+
+        # Correlate every glyph against every template at once
+        vectors = np.stack([self.normalise_glyph(glyph) for glyph in glyphs])
+        scores = vectors @ self.templates.T
+        best = scores.argmax(axis=1)
+        digits = self.template_digits[best]
+
+        value = int("".join(str(digit) for digit in digits))
+        confidence = float(max(scores[np.arange(len(glyphs)), best].min(), 0))
+
+        return value, confidence
+
+    def needs_glyphs(self, text: str) -> bool:
+        '''
+        Checks if any digit of a number has fewer glyphs than wanted
+
+        Parameters:
+            text: The number as a string
+
+        Returns: True if learning from an image of the number would add glyphs
+        '''
+        return any(np.count_nonzero(self.template_digits == int(digit)) < self.max_glyphs_per_digit for digit in text)
+
+    def save_glyphs(self, image: MatLike, text: str) -> bool:
+        '''
+        Segments an image of a known number, saves each digit as a glyph template and starts matching with it straight away
+
+        Parameters:
+            image: BGR or grayscale crop containing the number
+
+            text: The number shown in the image
+
+        Returns: True if the glyphs were saved
+        '''
+        glyphs = self.segment(image)
+        if len(glyphs) != len(text):
+            return False
+
+        os.makedirs(self.glyph_directory, exist_ok=True)
+        for digit, glyph in zip(text, glyphs):
+            index = 0
+            while os.path.exists("{}/{}_{}.png".format(self.glyph_directory, digit, index)):
+                index += 1
+            cv2.imwrite("{}/{}_{}.png".format(self.glyph_directory, digit, index), glyph)
+
+        self.templates = np.concatenate([self.templates, np.stack([self.normalise_glyph(glyph) for glyph in glyphs])])
+        self.template_digits = np.concatenate([self.template_digits, np.array([int(digit) for digit in text], dtype=np.int64)])
+
+        return True
+
+if __name__ == "__main__":
+    # Creates glyph templates from a saved game frame and the hp value shown in one of the tower hp regions
+    frame_path = input("frame image path ")
+    region = [int(value) for value in input("hp region in the frame (left top right bottom) ").split()]
+    text = input("hp shown ")
+
+    frame = cv2.imread(frame_path)
+    if not DigitReader().save_glyphs(frame[region[1]:region[3], region[0]:region[2]], text):
+        print("The number of glyphs found does not match {}, glyphs not saved".format(text))
@@ -0,0 +1,83 @@
+import time
+import cv2
+from cv2.typing import MatLike
+from numpy.typing import NDArray
+
+class Frame:
+    '''
+    A single snapshot of the game screen that every perception reader crops its views from so that all readers in a tick see the same instant
+    '''
+
+    def __init__(self, image: NDArray, region: tuple[int, int, int, int], frame_id: int, timestamp: float | None = None):
+        '''
+        Parameters:
+            image: The screenshot of the region exactly as returned by the camera
+
+            region: The screen region (left, top, right, bottom) that the image covers
+
+            frame_id: Increasing number identifying the frame
+
+            timestamp: Time the frame was captured, if None then the current time is used
+        '''
+        self.image = image
+        self.region = region
+        self.frame_id = frame_id
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+        # Colour conversions are only done once per frame and only if a reader asks for them
+        self._gray = None
+        self._rgb = None
+
+    @property
+    def gray(self) -> MatLike:
+        '''
+        Grayscale version of the whole frame, converted on first use
+        '''
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def rgb(self) -> MatLike:
+        '''
+        Channel swapped version of the whole frame used by the troop detector, converted on first use
+        '''
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    def crop(self, screen_region: tuple[int, int, int, int], image: NDArray | None = None) -> NDArray:
+        '''
+        Gets a view of a part of the frame without copying
+
+        Parameters:
+            screen_region: The region (left, top, right, bottom) in absolute screen coordinates
+
+            image: The image to crop from, if None then the raw frame is used
+
+        Returns:
+            crop: View of the frame covering the requested region
+        '''
+        if image is None:
+            image = self.image
+
+        left = max(screen_region[0] - self.region[0], 0)
+        top = max(screen_region[1] - self.region[1], 0)
+        right = max(screen_region[2] - self.region[0], 0)
+        bottom = max(screen_region[3] - self.region[1], 0)
+
+        return image[top:bottom, left:right]
+
+    def pixels(self, xs: NDArray, ys: NDArray) -> NDArray:
+        '''
+        Gets the colour of several pixels at once
+
+        Parameters:
+            xs: Absolute screen x coordinates of the pixels
+
+            ys: Absolute screen y coordinates of the pixels
+
+        Returns:
+            pixels: Array of shape (n, channels) with the colour of each pixel
+        '''
+        return self.image[ys - self.region[1], xs - self.region[0]]
@@ -0,0 +1,130 @@
+import cv2
+from cv2.typing import MatLike
+import numpy as np
+from numpy.typing import NDArray
+from TemplateBank import TemplateBank
+from Frame import Frame
+
+class HandClassifier:
+    '''
+    Identifies the card in each of the four hand slots by comparing a small signature of the slot against a signature of each deck card
+    '''
+
+    def __init__(self, deck_info: TemplateBank, context: str = "battle", signature_size: int = 16, threshold: float = 0.8):
+        '''
+        Parameters:
+            deck_info: Template bank containing the cards in the players deck
+
+            context: Screen context of the templates that show cards the same size as they are in the hand
+
+            signature_size: Width and height the slot images are scaled down to before being compared
+
+            threshold: Minimum similarity for a slot to be classified as a card instead of empty
+        '''
+        self.deck_info = deck_info
+        self.signature_size = signature_size
+        self.threshold = threshold
+
+        # Card names in the same order as the rows of the signature matrix, empty is used when nothing matches
+        self.card_names = deck_info.card_names
+
+        # Every card image is compared using the same top left area so one crop per slot is enough
+        templates = [deck_info.templates[context][card_name] for card_name in self.card_names]
+        self.slot_width = min((template.shape[1] for template in templates), default=0)
+        self.slot_height = min((template.shape[0] for template in templates), default=0)
+        self.signatures = np.array([self.signature(template[:self.slot_height, :self.slot_width]) for template in templates],
+                                   dtype=np.float32).reshape(len(templates), signature_size * signature_size)
+
+        # Top left corner of each slot in screenshot coordinates, found from full template matches
+        self.slot_locations: list[tuple[int, int] | None] = [None, None, None, None]
+
+    @property
+    def calibrated(self) -> bool:
+        '''
+        True once the location of every slot is known
+        '''
+        return all(location is not None for location in self.slot_locations)
+
+    def calibrate(self, slot: int, location: tuple[int, int]):
+        '''
+        Records where a slot is on the screen from a card found there by template matching
+
+        Parameters:
+            slot: Index of the slot from left to right
+
+            location: Top left corner of the card found in the slot
+        '''
+        self.slot_locations[slot] = (int(location[0]), int(location[1]))
+
+    def signature(self, image: MatLike) -> NDArray:
+        '''
+        Creates a compact signature of an image that is not affected by brightness or contrast so greyed out cards still match
+
+        Parameters:
+            image: Grayscale image of a card
+
+        Returns:
+            signature: Flattened zero mean, unit length vector of the downsampled image
+        '''
+        small = cv2.resize(image, (self.signature_size, self.signature_size), interpolation=cv2.INTER_AREA)
+        signature = small.astype(np.float32).ravel()
+        signature -= signature.mean()
+        norm = np.linalg.norm(signature)
+        if norm > 0:
+            signature /= norm
+
+        return signature
+
+    def slot_images(self, image: NDArray) -> list[NDArray]:
+        '''
+        Crops every hand slot out of an image of the frame
+
+        Parameters:
+            image: Whole frame image to crop from, such as the grayscale or raw frame
+
+        Returns:
+            slot_images: View of each slot from left to right
+        '''
+        return [image[y:y + self.slot_height, x:x + self.slot_width] for x, y in self.slot_locations]
+
+    def classify_slots(self, frame: Frame, slots: list[int] | None = None) -> list[tuple[str, float]]:
+        '''
+        Classifies each hand slot
+
+        Parameters:
+            frame: The frame to read from
+
+            slots: Indices of the slots to classify, if None then every slot is classified
+
+        Returns:
+            slots: The card name (or empty) and similarity for each slot in the order given
+        '''
+        if slots is None:
+            slots = list(range(len(self.slot_locations)))
+        gray_slots = self.slot_images(frame.gray)
+
+        signatures = np.stack([self.signature(gray_slots[slot]) for slot in slots])
+        similarities = signatures @ self.signatures.T
+        best = similarities.argmax(axis=1)
+
+        classified = []
+        for row, slot in enumerate(slots):
+            similarity = float(similarities[row, best[row]])
+            # Whether the player can afford a card comes from the elixir count so only the card itself is classified
+            classified.append((self.card_names[best[row]] if similarity >= self.threshold else "empty", similarity))
+
+        return classified
+
+    def classify(self, frame: Frame, slots: list[int] | None = None) -> list[str]:
+        '''
+        Gets the name of the card in each hand slot
+
+        Parameters:
+            frame: The frame to read from
+
+            slots: Indices of the slots to classify, if None then every slot is classified
+
+        Returns:
+            cards_in_hand: Card name for each slot in the order given, empty if no card matches
+        '''
+        return [card_name for card_name, _ in self.classify_slots(frame, slots)]
@@ -0,0 +1,436 @@
+import time
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from numpy.typing import NDArray
+from DetectorBackend import DetectorBackend, Detections
+from Metrics import tracer
+from ObservationLayout import ObservationLayout
+
+# Values stored for each detection in the shared results (centre x, centre y, width, height, confidence, class)
+DETECTION_VALUES = 6
+
+class SharedArrays:
+    '''
+    Arrays in shared memory that the server and every client can read and write without copying through a pipe
+    '''
+
+    def __init__(self, shapes: dict[str, tuple[tuple[int, ...], str]], names: dict[str, str] | None = None):
+        '''
+        Parameters:
+            shapes: Dictionary where key is the array name and value is its shape and dtype
+
+            names: Names of existing shared memory blocks to attach to, if None then new blocks are created
+        '''
+        self.shapes = shapes
+        self.blocks = {}
+        self.arrays = {}
+        for array_name, (shape, dtype) in shapes.items():
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            if names is None:
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                # Processes started from the creator share its resource tracker so the block is only removed once the creator exits
+                block = shared_memory.SharedMemory(name=names[array_name])
+            self.blocks[array_name] = block
+            self.arrays[array_name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        self.created = names is None
+
+    @property
+    def names(self) -> dict[str, str]:
+        '''
+        Names of the shared memory blocks, used to attach to them from another process
+        '''
+        return {array_name: block.name for array_name, block in self.blocks.items()}
+
+    def __getitem__(self, array_name: str) -> NDArray:
+        return self.arrays[array_name]
+
+    def close(self):
+        '''
+        Detaches from the shared memory and removes it if this process created it
+        '''
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if self.created:
+                block.unlink()
+
+def answer(responses: list[multiprocessing.Queue], request: tuple, value):
+    '''
+    Answers a request, tagged with its sequence number so the client can tell it apart from answers to requests it gave up on
+
+    Parameters:
+        responses: Queue of each client
+
+        request: The request being answered
+
+        value: What to answer with
+    '''
+    client, _, _, sequence = request
+    responses[client].put((sequence, value))
+
+def send_error(responses: list[multiprocessing.Queue], failed: list[tuple], kind: str, error: Exception):
+    '''
+    Answers requests that failed with an error the clients raise, so one bad request does not stop the server or leave clients waiting
+
+    Parameters:
+        responses: Queue of each client
+
+        failed: Requests that failed
+
+        kind: Kind of request that failed
+
+        error: What went wrong
+    '''
+    # The error is rebuilt from its message as not every exception can be pickled
+    for request in failed:
+        answer(responses, request, RuntimeError("The inference server failed the {} request: {!r}".format(kind, error)))
+
+def serve(shapes: dict, memory_names: dict[str, str], requests: multiprocessing.Queue, responses: list[multiprocessing.Queue],
+          detector_factory, policy_path: str | None, max_batch: int, max_wait: float):
+    '''
+    Runs the inference server until None is requested, used as the target of the server process
+
+    Parameters:
+        shapes: Shapes and dtypes of the shared arrays
+
+        memory_names: Names of the shared memory blocks
+
+        requests: Queue every client sends its requests to
+
+        responses: Queue of each client that its results are announced on
+
+        detector_factory: Function that creates the detector, if None then detection requests are not served
+
+        policy_path: Path of the saved PPO model, if None then action requests are not served
+
+        max_batch: Maximum number of requests run together
+
+        max_wait: Seconds to wait for more requests after the first one before running the batch
+    '''
+    shared = SharedArrays(shapes, memory_names)
+    detector: DetectorBackend | None = detector_factory() if detector_factory is not None else None
+    policy = None
+    if policy_path is not None:
+        from stable_baselines3 import PPO
+        policy = PPO.load(policy_path, device="cpu")
+
+    batches = 0
+    batched_requests = 0
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+
+        # Collect more requests until the batch is full or the latency budget is used up
+        batch = [request]
+        deadline = time.perf_counter() + max_wait
+        while len(batch) < max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                requests.put(None)
+                break
+            batch.append(request)
+
+        batches += 1
+        batched_requests += len(batch)
+
+        detect_requests = [request for request in batch if request[1] == "detect"]
+        if detect_requests:
+            answered = []
+            try:
+                if detector is None:
+                    raise RuntimeError("the server was started without a detector")
+                images = [shared["frames"][client, :height, :width] for client, _, (height, width), _ in detect_requests]
+                for request, detections in zip(detect_requests, detector.detect_batch(images)):
+                    count = min(len(detections), shapes["detections"][0][1])
+                    results = shared["detections"][request[0]]
+                    results[:count, :4] = detections.boxes[:count]
+                    results[:count, 4] = detections.confidences[:count]
+                    results[:count, 5] = detections.classes[:count]
+                    answer(responses, request, count)
+                    answered.append(request)
+            except Exception as error:
+                send_error(responses, [request for request in detect_requests if request not in answered], "detect", error)
+
+        act_requests = [request for request in batch if request[1] == "act"]
+        if act_requests:
+            # Deterministic and stochastic requests are run as separate batches
+            for deterministic in (False, True):
+                group = [request for request in act_requests if request[2] == deterministic]
+                if not group:
+                    continue
+                clients = [client for client, _, _, _ in group]
+                try:
+                    if policy is None:
+                        raise RuntimeError("the server was started without a policy")
+                    actions, _ = policy.predict(shared["observations"][clients], deterministic=deterministic)
+                    shared["actions"][clients] = np.asarray(actions).reshape(len(clients), -1)
+                except Exception as error:
+                    send_error(responses, group, "act", error)
+                    continue
+                for request in group:
+                    answer(responses, request, len(clients))
+
+        for request in batch:
+            kind = request[1]
+            if kind == "names":
+                if detector is None:
+                    send_error(responses, [request], kind, RuntimeError("the server was started without a detector"))
+                else:
+                    answer(responses, request, detector.names)
+            elif kind == "stats":
+                answer(responses, request, {"batches": batches, "mean_batch_size": batched_requests / batches})
+            elif kind not in ("detect", "act"):
+                send_error(responses, [request], kind, ValueError("unknown request"))
+
+    shared.close()
+
+class InferenceServer:
+    '''
+    Process that owns a single detector and policy and runs the requests of every environment worker in small batches
+    '''
+
+    def __init__(self, num_clients: int, detector_factory=None, policy_path: str | None = None, frame_shape: tuple[int, int, int] = (1200, 1920, 3),
+                 observation_size: int | None = None, action_size: int = 3, max_detections: int = 100, max_batch: int = 8, max_wait: float = 0.005):
+        '''
+        Parameters:
+            num_clients: Number of environment workers that send requests
+
+            detector_factory: Picklable function that creates the detector inside the server, such as functools.partial(create_detector, "onnx")
+
+            policy_path: Path of the saved PPO model, if None then only detections are served
+
+            frame_shape: Largest image a client can send
+
+            observation_size: Size of a single observation, if None then the size of the untracked observation layout the workers use
+
+            action_size: Number of values in a single action
+
+            max_detections: Maximum detections returned for an image
+
+            max_batch: Maximum number of requests run together
+
+            max_wait: Seconds to wait for more requests after the first one before running the batch
+        '''
+        self.num_clients = num_clients
+        if observation_size is None:
+            observation_size = ObservationLayout().size
+        self.shapes = {
+            "frames": ((num_clients,) + tuple(frame_shape), "uint8"),
+            "detections": ((num_clients, max_detections, DETECTION_VALUES), "float32"),
+            "observations": ((num_clients, observation_size), "float32"),
+            "actions": ((num_clients, action_size), "int64"),
+        }
+        self.shared = SharedArrays(self.shapes)
+
+        # Same start method the environment workers use so the queues can be handed to them
+        context = multiprocessing.get_context("spawn")
+        self.requests = context.Queue()
+        self.responses = [context.Queue() for _ in range(num_clients)]
+        self.process = context.Process(target=serve, name="InferenceServer", daemon=True,
+                                       args=(self.shapes, self.shared.names, self.requests, self.responses, detector_factory, policy_path,
+                                             max_batch, max_wait))
+
+    def start(self):
+        '''
+        Starts the server process
+        '''
+        self.process.start()
+
+    def client(self, client_id: int) -> "InferenceClient":
+        '''
+        Creates the client of a single environment worker, it has to be given to the worker when the worker process starts
+        such as through the environment functions of SubprocVecEnv
+
+        Parameters:
+            client_id: Index of the worker, each worker needs its own
+
+        Returns:
+            client: Client that can be sent to the worker process
+        '''
+        return InferenceClient(client_id, self.shapes, self.shared.names, self.requests, self.responses[client_id])
+
+    def stop(self):
+        '''
+        Stops the server process and removes the shared memory
+        '''
+        self.requests.put(None)
+        self.process.join(timeout=5)
+        self.shared.close()
+
+class InferenceClient:
+    '''
+    Sends requests to the inference server from an environment worker
+    '''
+
+    def __init__(self, client_id: int, shapes: dict, memory_names: dict[str, str], requests: multiprocessing.Queue,
+                 responses: multiprocessing.Queue, timeout: float = 5):
+        '''
+        Parameters:
+            client_id: Index of the worker
+
+            shapes: Shapes and dtypes of the shared arrays
+
+            memory_names: Names of the shared memory blocks
+
+            requests: Queue requests are sent to
+
+            responses: Queue the server announces this client's results on
+
+            timeout: Seconds to wait for a result before giving up
+        '''
+        self.client_id = client_id
+        self.shapes = shapes
+        self.memory_names = memory_names
+        self.requests = requests
+        self.responses = responses
+        self.timeout = timeout
+        # Number of the last request sent, answers carry it so late answers to requests that timed out are dropped
+        self.sequence = 0
+        # Shared memory is attached on first use so the client can be pickled into the worker
+        self.shared: SharedArrays | None = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["shared"] = None
+        return state
+
+    def attach(self) -> SharedArrays:
+        '''
+        Attaches to the shared memory the first time it is needed
+
+        Returns:
+            shared: The shared arrays
+        '''
+        if self.shared is None:
+            self.shared = SharedArrays(self.shapes, self.memory_names)
+        return self.shared
+
+    def request(self, kind: str, payload=None):
+        '''
+        Sends a request and waits for the server to answer it
+
+        Parameters:
+            kind: One of detect, act, names or stats
+
+            payload: Extra information the request needs
+
+        Returns:
+            response: What the server answered with, an error sent back by the server is raised instead
+        '''
+        self.sequence += 1
+        self.requests.put((self.client_id, kind, payload, self.sequence))
+
+        deadline = time.perf_counter() + self.timeout
+        while True:
+            try:
+                sequence, response = self.responses.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                raise RuntimeError("The inference server did not answer a {} request within {} seconds".format(kind, self.timeout))
+            if sequence == self.sequence:
+                break
+            tracer.count("inference_stale_responses")
+
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def detect(self, image: NDArray) -> tuple[NDArray, int]:
+        '''
+        Runs the shared detector on an image
+
+        Parameters:
+            image: RGB image no larger than the frame shape of the server
+
+        Returns:
+            results: Array of shape (detections, 6) of centre x, centre y, width, height, confidence and class
+
+            count: Number of detections
+        '''
+        shared = self.attach()
+        height, width = image.shape[:2]
+        shared["frames"][self.client_id, :height, :width] = image[:, :, :3]
+        count = self.request("detect", (height, width))
+        tracer.count("remote_detections")
+
+        return shared["detections"][self.client_id, :count], count
+
+    def act(self, observation: NDArray, deterministic: bool = False) -> NDArray:
+        '''
+        Runs the shared policy on an observation
+
+        Parameters:
+            observation: Observation of the environment
+
+            deterministic: Pick the most likely action instead of sampling one
+
+        Returns:
+            action: The action chosen by the policy
+        '''
+        shared = self.attach()
+        shared["observations"][self.client_id] = observation
+        self.request("act", deterministic)
+
+        return shared["actions"][self.client_id].copy()
+
+class RemoteDetector(DetectorBackend):
+    '''
+    Detector backend that runs the detector of the inference server
+    '''
+
+    def __init__(self, client: InferenceClient, conf: float = 0.4):
+        '''
+        Parameters:
+            client: Client of this worker
+
+            conf: Minimum confidence of a detection, only used for reference as the server filters detections
+        '''
+        self.client = client
+        super().__init__(client.request("names"), conf)
+
+    def detect(self, image: NDArray) -> Detections:
+        results, count = self.client.detect(image)
+
+        return Detections(results[:, :4].copy(), results[:, 5].astype(np.int64), results[:, 4].copy(), self.names)
+
+class RemotePolicy:
+    '''
+    Stands in for a PPO model when choosing actions in a worker, using the policy of the inference server
+    '''
+
+    def __init__(self, client: InferenceClient):
+        '''
+        Parameters:
+            client: Client of this worker
+        '''
+        self.client = client
+
+    def predict(self, observation: NDArray, state=None, episode_start=None, deterministic: bool = False) -> tuple[NDArray, None]:
+        '''
+        Chooses an action the same way PPO.predict does
+
+        Parameters:
+            observation: Observation of the environment
+
+            state: Unused as the policy is not recurrent
+
+            episode_start: Unused as the policy is not recurrent
+
+            deterministic: Pick the most likely action instead of sampling one
+
+        Returns:
+            action: The action chosen by the policy
+
+            state: Always None
+        '''
+        return self.client.act(observation, deterministic), None
@@ -0,0 +1,245 @@
+import os
+import argparse
+import functools
+import multiprocessing
+import pygetwindow as gw
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import SubprocVecEnv
+from LoggingCallback import LoggingCallback
+from DetectorBackend import create_detector
+from InferenceServer import InferenceServer, InferenceClient, RemoteDetector, RemotePolicy
+
+def find_game_windows(title: str = "Clash Royale") -> list:
+    '''
+    Finds every open game window
+
+    Parameters:
+        title: Exact title of the game windows
+
+    Returns:
+        game_windows: Every window with the title, ordered from left to right and top to bottom
+    '''
+    # gw.getWindowsWithTitle does not match the string exactly so other windows could be fetched
+    game_windows = [window for window in gw.getWindowsWithTitle(title) if window.title == title]
+
+    return sorted(game_windows, key=lambda window: (window.top, window.left))
+
+def window_region(window) -> tuple[int, int, int, int]:
+    '''
+    Gets the screen region of a window
+
+    Parameters:
+        window: The game window
+
+    Returns:
+        region: The screen region (left, top, right, bottom) of the window
+    '''
+    return (window.left, window.top, window.left + window.width, window.top + window.height)
+
+def make_env(region: tuple[int, int, int, int], deck: list[str] | None = None, input_lock=None, inference_client: InferenceClient | None = None,
+             refresh_deck: bool = False, trajectory_directory: str | None = None, window: int = 0):
+    '''
+    Creates the environment of one game window, called inside each worker process
+
+    Parameters:
+        region: The screen region (left, top, right, bottom) of the game window
+
+        deck: Names of the cards in the players deck, if None then each worker detects its own deck
+
+        input_lock: Lock shared by every worker so the clicks of one move are not split up
+
+        inference_client: Client of the shared inference server, if None then the worker loads its own detector
+
+        refresh_deck: Detect the deck again instead of using the deck found in earlier runs
+
+        trajectory_directory: Folder every transition of the window is stored in, if None then transitions are not stored
+
+        window: Index of the game window, used to remember the deck of each window separately
+
+    Returns:
+        env: Environment playing in the game window
+    '''
+    # Imported here so only the worker processes load the perception models
+    from Screen import Screen
+    from Cards import Cards
+    from AI import AI
+    from ClashRoyaleEnv import ClashRoyaleEnv
+    from DeckCache import DeckCache
+    from TrajectoryStore import TrajectoryWriter
+
+    detector = None
+    if inference_client is not None:
+        detector = RemoteDetector(inference_client)
+
+    screen = Screen(region, detector=detector)
+    ai = AI(region, input_lock)
+
+    trajectory_writer = TrajectoryWriter(trajectory_directory) if trajectory_directory is not None else None
+
+    # Each window remembers its own last deck and checks it on the collection screen as windows can use different decks
+    deck_cache = DeckCache(refresh=refresh_deck, key="window_{}".format(window))
+
+    return ClashRoyaleEnv(ai, Cards(), screen, deck=deck, deck_cache=deck_cache, trajectory_writer=trajectory_writer)
+
+class WindowVecEnv(SubprocVecEnv):
+    '''
+    Vectorized environment of the game windows that keeps the manager of the shared input lock running until it is closed
+    '''
+
+    def __init__(self, env_fns: list, manager, start_method: str = "spawn"):
+        '''
+        Parameters:
+            env_fns: Functions that create the environment of each window
+
+            manager: Manager process that owns the input lock given to the workers
+
+            start_method: How the worker processes are started
+        '''
+        # The lock stops working once its manager is garbage collected so the environment holds on to it
+        self.manager = manager
+        super().__init__(env_fns, start_method=start_method)
+
+    def close(self):
+        super().close()
+        self.manager.shutdown()
+
+def create_vec_env(regions: list[tuple[int, int, int, int]], deck: list[str] | None = None, start_method: str = "spawn",
+                   inference_server: InferenceServer | None = None, refresh_deck: bool = False,
+                   trajectory_directory: str | None = None) -> WindowVecEnv:
+    '''
+    Creates a vectorized environment with one worker process for each game window
+
+    Parameters:
+        regions: The screen region (left, top, right, bottom) of each game window
+
+        deck: Names of the cards in the players deck, if None then each worker detects its own deck
+
+        start_method: How the worker processes are started, spawn works on every platform
+
+        inference_server: Started server every worker sends its detections to, if None then each worker loads its own detector
+
+        refresh_deck: Detect the deck again in every window instead of using the deck found in earlier runs
+
+        trajectory_directory: Folder the transitions are stored in with a subfolder for each window, if None then transitions are not stored
+
+    Returns:
+        env: Vectorized environment stepping every game window at once
+    '''
+    # A manager lock can be sent to the workers however they are started
+    manager = multiprocessing.Manager()
+    input_lock = manager.Lock()
+
+    env_fns = []
+    for worker, region in enumerate(regions):
+        inference_client = inference_server.client(worker) if inference_server is not None else None
+        window_directory = os.path.join(trajectory_directory, "window_{}".format(worker)) if trajectory_directory is not None else None
+        env_fns.append(functools.partial(make_env, region, deck, input_lock, inference_client, refresh_deck, window_directory,
+                                         worker))
+
+    return WindowVecEnv(env_fns, manager, start_method)
+
+def play_games(region: tuple[int, int, int, int], deck: list[str] | None, input_lock, inference_client: InferenceClient, games: int,
+               refresh_deck: bool = False, window: int = 0):
+    '''
+    Plays games in one game window with the policy of the inference server, used as the target of each worker process when testing
+
+    Parameters:
+        region: The screen region (left, top, right, bottom) of the game window
+
+        deck: Names of the cards in the players deck, if None then the worker detects its own deck
+
+        input_lock: Lock shared by every worker so the clicks of one move are not split up
+
+        inference_client: Client of the inference server, used for both detections and actions
+
+        games: Number of games to play
+
+        refresh_deck: Detect the deck again instead of using the deck found in earlier runs
+
+        window: Index of the game window
+    '''
+    env = make_env(region, deck, input_lock, inference_client, refresh_deck, window=window)
+    policy = RemotePolicy(inference_client)
+
+    try:
+        for game in range(games):
+            observation, _ = env.reset()
+            terminated = False
+            total_reward = 0
+            while not terminated:
+                action, _ = policy.predict(observation, deterministic=True)
+                observation, reward, terminated, truncated, info = env.step(action)
+                total_reward += reward
+            print("Window at {} finished game {} with a reward of {}".format(region[:2], game + 1, total_reward))
+    finally:
+        env.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train on every open game window at once")
+    parser.add_argument("--title", default="Clash Royale", help="exact title of the game windows")
+    parser.add_argument("--deck", help="comma separated names of the cards in the deck, defaults to detecting it in every window")
+    parser.add_argument("--timesteps", type=int, default=100000, help="total timesteps across every window")
+    parser.add_argument("--load", type=int, help="model number to continue training from")
+    parser.add_argument("--server", help="run one shared detector for every window with this backend, backend or backend:model_path")
+    parser.add_argument("--refresh-deck", action="store_true", help="detect the deck again instead of using the deck found in earlier runs")
+    parser.add_argument("--trajectories", help="folder to store every transition in for offline training")
+    parser.add_argument("--policy", type=int, help="test this model number in every window with one shared policy instead of training")
+    parser.add_argument("--games", type=int, default=100, help="games to play in each window when testing a policy")
+    args = parser.parse_args()
+
+    game_windows = find_game_windows(args.title)
+    if not game_windows:
+        print("No game window found, please launch the game")
+        exit()
+
+    # Windows are left where they are so they do not cover each other
+    for window in game_windows:
+        if window.isMinimized:
+            window.restore()
+    print("Found {} game windows".format(len(game_windows)))
+
+    regions = [window_region(window) for window in game_windows]
+
+    # One process holds the detector weights and batches the detections of every window
+    # A shared policy also needs the shared detector so it defaults to the ultralytics backend
+    inference_server = None
+    if args.server is not None or args.policy is not None:
+        backend, _, model_path = (args.server or "ultralytics").partition(":")
+        frame_shape = (max(region[3] - region[1] for region in regions), max(region[2] - region[0] for region in regions), 3)
+        policy_path = "./train/best_model_{}".format(args.policy) if args.policy is not None else None
+        inference_server = InferenceServer(len(regions), functools.partial(create_detector, backend, model_path or None), policy_path,
+                                           frame_shape=frame_shape)
+        inference_server.start()
+
+    deck = args.deck.split(",") if args.deck else None
+
+    if args.policy is not None:
+        # Every window plays in its own process and their observations are batched through the one policy
+        context = multiprocessing.get_context("spawn")
+        manager = context.Manager()
+        input_lock = manager.Lock()
+        players = [context.Process(target=play_games, args=(region, deck, input_lock, inference_server.client(worker), args.games,
+                                                            args.refresh_deck, worker))
+                   for worker, region in enumerate(regions)]
+        for player in players:
+            player.start()
+        for player in players:
+            player.join()
+        manager.shutdown()
+        inference_server.stop()
+        exit()
+
+    env = create_vec_env(regions, deck, inference_server=inference_server,
+                         refresh_deck=args.refresh_deck, trajectory_directory=args.trajectories)
+    callback = LoggingCallback(check_freq=5000)
+    log_dir = './logs/'
+
+    if args.load is None:
+        model = PPO("MlpPolicy", env, verbose=1, tensorboard_log=log_dir)
+    else:
+        model = PPO.load("./train/best_model_{}".format(args.load), env=env)
+    model.learn(total_timesteps=args.timesteps, callback=callback)
+
+    env.close()
+    if inference_server is not None:
+        inference_server.stop()
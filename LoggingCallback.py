@@ -1,5 +1,6 @@
 from stable_baselines3.common.callbacks import BaseCallback
 import os
+from Metrics import tracer, merge_summaries
 class LoggingCallback(BaseCallback):
     '''
     Class for callback functions with the logs while training
@@ -9,6 +10,8 @@ class LoggingCallback(BaseCallback):
         super(LoggingCallback, self).__init__(verbose)
         self.check_freq = check_freq
         self.save_path = save_path
+        # Tracer summaries sent by the environments through their info, worker processes can not write to this process's tracer
+        self.env_summaries = []
 
     def _init_callback(self):
         if self.save_path is not None:
@@ -19,4 +22,14 @@ class LoggingCallback(BaseCallback):
             model_path = os.path.join(self.save_path, 'best_model_{}'.format(self.n_calls))
             self.model.save(model_path)
 
-        return True
\ No newline at end of file
+        for info in self.locals.get("infos", []):
+            if "perf" in info:
+                self.env_summaries.append(info["perf"])
+
+        return True
+
+    def _on_rollout_end(self):
+        # Send the timings and counters of the rollout from every environment and this process to the tensorboard log
+        for key, value in merge_summaries(self.env_summaries + [tracer.summary()]).items():
+            self.logger.record("perf/{}".format(key), value)
+        self.env_summaries = []
\ No newline at end of file
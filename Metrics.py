@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+
+class Tracer:
+    '''
+    Records timed spans and counters from the hot path into a bounded buffer that can be exported as a Chrome trace or summarised for tensorboard
+    '''
+
+    def __init__(self, capacity: int = 100000, enabled: bool = True):
+        '''
+        Parameters:
+            capacity: Number of most recent spans kept for the Chrome trace
+
+            enabled: Whether anything is recorded
+        '''
+        self.enabled = enabled
+
+        # Each span is (name, category, start in ns, duration in ns, thread id), oldest spans are dropped once full
+        self.spans = deque(maxlen=capacity)
+        # Running count and total duration of each span name since the last summary
+        self.totals: dict[str, list[int]] = {}
+        # Time spent in each category since the last summary, only counting time not already inside a nested span so categories add up to wall time
+        self.category_totals: dict[str, int] = {}
+        self.counters: dict[str, int] = {}
+
+        self.start_ns = time.perf_counter_ns()
+        self.lock = threading.Lock()
+        # Time spent in nested spans of each open span, one stack per thread
+        self.local = threading.local()
+
+    def begin(self) -> int:
+        '''
+        Opens a span on the current thread
+
+        Returns:
+            start: Start time from time.perf_counter_ns
+        '''
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        stack.append(0)
+
+        return time.perf_counter_ns()
+
+    def end(self, name: str, category: str, start: int):
+        '''
+        Closes the innermost span opened on the current thread and records it
+
+        Parameters:
+            name: Name of what was timed
+
+            category: Kind of time spent, such as compute or sleep
+
+            start: Start time returned by begin
+        '''
+        duration = time.perf_counter_ns() - start
+        stack = self.local.stack
+        nested = stack.pop()
+        # The whole span is time spent inside the span that contains it
+        if stack:
+            stack[-1] += duration
+        self.record(name, category, start, duration, duration - nested)
+
+    def record(self, name: str, category: str, start: int, duration: int, self_duration: int | None = None):
+        '''
+        Records a finished span
+
+        Parameters:
+            name: Name of what was timed
+
+            category: Kind of time spent, such as compute or sleep
+
+            start: Start time from time.perf_counter_ns
+
+            duration: Duration in nanoseconds
+
+            self_duration: Nanoseconds not spent in nested spans, added to the category, if None then the whole duration is used
+        '''
+        if self_duration is None:
+            self_duration = duration
+        self.spans.append((name, category, start, duration, threading.get_ident()))
+        with self.lock:
+            totals = self.totals.get(name)
+            if totals is None:
+                self.totals[name] = [1, duration]
+            else:
+                totals[0] += 1
+                totals[1] += duration
+            self.category_totals[category] = self.category_totals.get(category, 0) + self_duration
+
+    def count(self, name: str, amount: int = 1):
+        '''
+        Adds to a counter such as invalid moves or dropped frames
+
+        Parameters:
+            name: Name of the counter
+
+            amount: Amount to add
+        '''
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def span(self, name: str, category: str = "compute") -> "Span":
+        '''
+        Creates a context manager that times the code inside it
+
+        Parameters:
+            name: Name of what is timed
+
+            category: Kind of time spent, such as compute or sleep
+
+        Returns:
+            span: The context manager
+        '''
+        return Span(self, name, category)
+
+    def summary(self, reset: bool = True) -> dict[str, float]:
+        '''
+        Summarises the spans and counters recorded since the last summary
+
+        Parameters:
+            reset: Start the next summary from zero
+
+        Returns:
+            summary: Dictionary of the mean milliseconds and calls of each span, the time in each category and every counter
+        '''
+        with self.lock:
+            summary = {}
+            for name, (calls, total) in self.totals.items():
+                summary["{}/mean_ms".format(name)] = total / calls / 1e6
+                summary["{}/calls".format(name)] = calls
+            for category, total in self.category_totals.items():
+                summary["time/{}_s".format(category)] = total / 1e9
+            for name, value in self.counters.items():
+                summary["counters/{}".format(name)] = value
+
+            if reset:
+                self.totals = {}
+                self.category_totals = {}
+                self.counters = {}
+
+        return summary
+
+    def export_chrome_trace(self, path: str):
+        '''
+        Saves the buffered spans in the Chrome trace format that can be opened in chrome://tracing or Perfetto
+
+        Parameters:
+            path: File the trace is saved to
+        '''
+        process_id = os.getpid()
+        events = []
+        for name, category, start, duration, thread_id in list(self.spans):
+            events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.start_ns) / 1000,
+                "dur": duration / 1000,
+                "pid": process_id,
+                "tid": thread_id,
+            })
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+class Span:
+    '''
+    Context manager that records the time spent inside it
+    '''
+
+    def __init__(self, tracer: Tracer, name: str, category: str):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.start = 0
+        self.enabled = False
+
+    def __enter__(self) -> "Span":
+        self.enabled = self.tracer.enabled
+        if self.enabled:
+            self.start = self.tracer.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.enabled:
+            self.tracer.end(self.name, self.category, self.start)
+
+# Tracer shared by every instrumented class, each process has its own
+tracer = Tracer()
+
+def merge_summaries(summaries: list[dict[str, float]]) -> dict[str, float]:
+    '''
+    Combines the summaries of several tracers, such as one from each worker process, into one
+
+    Parameters:
+        summaries: Summaries returned by Tracer.summary
+
+    Returns:
+        summary: Summary with the calls, times and counters of every tracer added together and the means weighted by calls
+    '''
+    totals: dict[str, float] = {}
+    for summary in summaries:
+        for key, value in summary.items():
+            if key.endswith("/mean_ms"):
+                # Means are turned back into totals so they can be added
+                name = key[:-len("/mean_ms")]
+                totals[name + "/total_ms"] = totals.get(name + "/total_ms", 0) + value * summary["{}/calls".format(name)]
+            else:
+                totals[key] = totals.get(key, 0) + value
+
+    merged = {}
+    for key, value in totals.items():
+        if key.endswith("/total_ms"):
+            name = key[:-len("/total_ms")]
+            merged["{}/mean_ms".format(name)] = value / totals["{}/calls".format(name)]
+        else:
+            merged[key] = value
+
+    return merged
+
+def traced(name: str, category: str = "compute"):
+    '''
+    Decorator that records a span every time a function is called
+
+    Parameters:
+        name: Name the span is recorded under
+
+        category: Kind of time spent, such as compute or sleep
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            start = tracer.begin()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                tracer.end(name, category, start)
+        return wrapper
+    return decorator
@@ -0,0 +1,77 @@
+import gymnasium as gym
+import numpy as np
+
+class ObservationLayout:
+    '''
+    Describes where each part of the game state is stored in the flattened observation so every environment builds the same layout
+    '''
+
+    def __init__(self, max_troops: int = 20, max_towers: int = 3, hand_size: int = 4, card_stats: int = 13, troop_stats: int = 13,
+                 tracked: bool = False):
+        '''
+        Parameters:
+            max_troops: Maximum amount of troops observed for each player
+
+            max_towers: Maximum amount of towers for each player
+
+            hand_size: Number of cards in the hand
+
+            card_stats: Number of stats for each card in hand
+
+            troop_stats: Number of values for each troop, its stats followed by its x, y position
+
+            tracked: Add the x, y velocity and age of each tracked troop after its position
+        '''
+        self.max_troops = max_troops
+        self.max_towers = max_towers
+        self.hand_size = hand_size
+        self.card_stats = card_stats
+        self.tracked = tracked
+        # Velocity and age columns come after the position
+        self.troop_stats = troop_stats + 3 if tracked else troop_stats
+
+        # Slices of the flattened observation in the order they are stored
+        sizes = [
+            ("hand", hand_size * card_stats),           # cards in hand, each with their stats
+            ("elixir", 1),                              # elixir
+            ("ally_troops", max_troops * self.troop_stats),  # max ally troops, each with their stats
+            ("enemy_troops", max_troops * self.troop_stats), # max enemy troops, each with their stats
+            ("ally_towers", max_towers),                # max number of ally towers
+            ("enemy_towers", max_towers),               # max number of enemy towers
+            ("time", 1),                                # time remaining
+        ]
+        self.slices = {}
+        start = 0
+        for name, size in sizes:
+            self.slices[name] = slice(start, start + size)
+            start += size
+        self.size = start
+
+    def observation_space(self) -> gym.spaces.Box:
+        '''
+        Creates the observation space of the layout
+
+        Returns:
+            observation_space: Box space the size of the flattened observation
+        '''
+        # Tracked troops can move left or up so their velocities can be negative
+        low = -6000 if self.tracked else 0
+        return gym.spaces.Box(low=low, high=6000, shape=(self.size,), dtype=np.float32)
+
+    def split(self, observations: np.ndarray) -> dict[str, np.ndarray]:
+        '''
+        Gets a view of each part of one or many observations
+
+        Parameters:
+            observations: Array of shape (size,) or (batch, size)
+
+        Returns:
+            parts: Dictionary where key is the part name and value is a view of the part, troops and hand are shaped per row
+        '''
+        batch_shape = observations.shape[:-1]
+        parts = {name: observations[..., part] for name, part in self.slices.items()}
+        parts["hand"] = parts["hand"].reshape(batch_shape + (self.hand_size, self.card_stats))
+        parts["ally_troops"] = parts["ally_troops"].reshape(batch_shape + (self.max_troops, self.troop_stats))
+        parts["enemy_troops"] = parts["enemy_troops"].reshape(batch_shape + (self.max_troops, self.troop_stats))
+
+        return parts
@@ -0,0 +1,70 @@
+from Frame import Frame
+from Metrics import tracer
+
+class PerceptionCache:
+    '''
+    Remembers what each perception reader found in the most recent frame so readers are not run twice on the same frame within a tick
+    '''
+
+    def __init__(self, ttl: float = 0.0):
+        '''
+        Parameters:
+            ttl: Seconds a result stays valid for newer frames, 0 only reuses results for the exact same frame
+        '''
+        self.ttl = ttl
+
+        # Dictionary where key is the reader name and value is the frame id, frame timestamp, reader key and result
+        self.entries: dict[str, tuple[int, float, object, object]] = {}
+
+    def get(self, reader: str, frame: Frame, key=None):
+        '''
+        Gets the result a reader found in a frame
+
+        Parameters:
+            reader: Name of the reader such as elixir
+
+            frame: The frame being read
+
+            key: Anything else the result depends on such as the deck being matched, compared by identity
+
+        Returns:
+            result: The cached result or None if the reader has to run
+        '''
+        entry = self.entries.get(reader)
+        if entry is None:
+            return None
+
+        frame_id, timestamp, entry_key, result = entry
+        if entry_key is not key:
+            return None
+        if frame_id != frame.frame_id and not 0 <= frame.timestamp - timestamp <= self.ttl:
+            return None
+
+        tracer.count("perception_cache_hits")
+        return result
+
+    def put(self, reader: str, frame: Frame, result, key=None):
+        '''
+        Stores the result a reader found in a frame
+
+        Parameters:
+            reader: Name of the reader such as elixir
+
+            frame: The frame that was read
+
+            result: What the reader found
+
+            key: Anything else the result depends on such as the deck being matched
+
+        Returns:
+            result: The stored result so a reader can return straight away
+        '''
+        self.entries[reader] = (frame.frame_id, frame.timestamp, key, result)
+
+        return result
+
+    def invalidate(self):
+        '''
+        Forgets every result, used after acting as the hand, elixir and board are about to change
+        '''
+        self.entries = {}
@@ -0,0 +1,155 @@
+import numpy as np
+from numpy.typing import NDArray
+
+# Arena size in tiles, the ally side is at the bottom
+ARENA_WIDTH = 18
+ARENA_HEIGHT = 32
+RIVER_Y = 16
+
+# Towers of each side in the same order as the tower hp regions (right princess, left princess, king)
+TOWER_X = np.array([[14.5, 3.5, 9], [14.5, 3.5, 9]])
+TOWER_Y = np.array([[25.5, 25.5, 29], [6.5, 6.5, 3]])
+# Half the width of each tower in tiles, troops can not be placed on a standing tower
+TOWER_HALF_SIZE = np.array([1.5, 1.5, 2])
+
+# Furthest tile from the river troops can be placed in once the enemy princess tower of that lane is destroyed
+POCKET_TOP = 11
+
+# Board borders in the reference game window used to convert between tiles and the pixel positions used by ClashRoyaleEnv
+BOARD_LEFT = 15
+BOARD_TOP = 130
+TILE_WIDTH = (525 - BOARD_LEFT) / ARENA_WIDTH
+TILE_HEIGHT = (875 - BOARD_TOP) / ARENA_HEIGHT
+
+# Number of tower states, one bit for each enemy princess tower and each ally tower being destroyed
+TOWER_STATES = 2 ** 5
+
+class PlacementGrid:
+    '''
+    Where troops can be placed on the action grid for every combination of destroyed towers, precomputed so checking a placement is a lookup
+    '''
+
+    def __init__(self, grid_width: int = 20, grid_height: int = 30, grid_step: int = 25):
+        '''
+        Parameters:
+            grid_width: Number of x values in the action grid
+
+            grid_height: Number of y values in the action grid
+
+            grid_step: Pixels between neighbouring action grid points
+        '''
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+
+        # Tile position of every action grid point, the same mapping ClashRoyaleEnv uses to click
+        self.tile_x, self.tile_y = np.meshgrid(np.arange(grid_width) * grid_step / TILE_WIDTH, np.arange(grid_height) * grid_step / TILE_HEIGHT,
+                                               indexing="ij")
+
+        # Array of shape (tower states, grid_width, grid_height) of where troops can be placed
+        self.troop_bitmaps = np.stack([self.build_bitmap(tower_state) for tower_state in range(TOWER_STATES)])
+        self.troop_bitmaps.flags.writeable = False
+
+        # Whether any placement exists for each x and y value, used for the coordinate parts of the action masks
+        self.troop_x_masks = self.troop_bitmaps.any(axis=2)
+        self.troop_y_masks = self.troop_bitmaps.any(axis=1)
+
+    def tower_state(self, ally_tower_hp, enemy_tower_hp):
+        '''
+        Turns the tower hp of both sides into the key of a placement bitmap
+
+        Parameters:
+            ally_tower_hp: Hp of each ally tower, an array of shape (games, 3) gives the key of each game
+
+            enemy_tower_hp: Hp of each enemy tower in the same shape
+
+        Returns:
+            tower_state: Bits of which towers are destroyed, the enemy princess towers first and then the ally towers
+        '''
+        enemy_destroyed = np.asarray(enemy_tower_hp)[..., :2] <= 0
+        ally_destroyed = np.asarray(ally_tower_hp)[..., :3] <= 0
+        tower_state = enemy_destroyed @ np.array([1, 2]) + ally_destroyed @ np.array([4, 8, 16])
+
+        return int(tower_state) if np.ndim(tower_state) == 0 else tower_state
+
+    def build_bitmap(self, tower_state: int) -> NDArray:
+        '''
+        Works out where troops can be placed when some towers are destroyed
+
+        Parameters:
+            tower_state: Bits of which towers are destroyed
+
+        Returns:
+            bitmap: Boolean array of shape (grid_width, grid_height)
+        '''
+        # Troops can always be placed on the players own half past the river
+        bitmap = (self.tile_y > RIVER_Y + 1) & (self.tile_y < ARENA_HEIGHT)
+
+        # Destroying an enemy princess tower opens a pocket on its lane in front of the river
+        for tower in range(2):
+            if tower_state & (1 << tower):
+                lane = self.tile_x >= ARENA_WIDTH / 2 if TOWER_X[1, tower] > ARENA_WIDTH / 2 else self.tile_x < ARENA_WIDTH / 2
+                bitmap |= lane & (self.tile_y >= POCKET_TOP) & (self.tile_y < RIVER_Y - 1)
+
+        # Standing ally towers block the tiles they are on
+        for tower in range(3):
+            if not tower_state & (1 << (tower + 2)):
+                on_tower = ((np.abs(self.tile_x - TOWER_X[0, tower]) < TOWER_HALF_SIZE[tower])
+                            & (np.abs(self.tile_y - TOWER_Y[0, tower]) < TOWER_HALF_SIZE[tower]))
+                bitmap &= ~on_tower
+
+        return bitmap
+
+    def is_valid(self, tower_state: int, is_spell: bool, x: int, y: int) -> bool:
+        '''
+        Checks if a card can be placed at a point of the action grid
+
+        Parameters:
+            tower_state: Bits of which towers are destroyed
+
+            is_spell: Spells can be cast anywhere
+
+            x: X value of the action grid
+
+            y: Y value of the action grid
+
+        Returns: True if the game would accept the placement
+        '''
+        return bool(is_spell or self.troop_bitmaps[tower_state, x, y])
+
+    def is_valid_batch(self, tower_states: NDArray, is_spell: NDArray, xs: NDArray, ys: NDArray) -> NDArray:
+        '''
+        Checks the placements of several games at once
+
+        Parameters:
+            tower_states: Tower state of each game
+
+            is_spell: Whether each card is a spell
+
+            xs: X value of each placement
+
+            ys: Y value of each placement
+
+        Returns:
+            valid: Boolean array of whether each placement would be accepted
+        '''
+        return is_spell | self.troop_bitmaps[tower_states, xs, ys]
+
+    def coordinate_masks(self, tower_state: int, troop_playable: bool, spell_playable: bool) -> NDArray:
+        '''
+        Masks the x and y values where no playable card could be placed, each allowed separately as the action dimensions are masked on their own
+
+        Parameters:
+            tower_state: Bits of which towers are destroyed
+
+            troop_playable: Whether any troop card can be played
+
+            spell_playable: Whether any spell card can be played
+
+        Returns:
+            coordinate_masks: Boolean array of the x mask followed by the y mask
+        '''
+        # The coordinates do not matter when only spells or nothing can be played
+        if spell_playable or not troop_playable:
+            return np.ones(self.grid_width + self.grid_height, dtype=bool)
+
+        return np.concatenate([self.troop_x_masks[tower_state], self.troop_y_masks[tower_state]])
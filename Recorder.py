@@ -0,0 +1,287 @@
+import os
+import json
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+from Capture import CaptureSource
+from Metrics import tracer
+
+# Layout of the index stored next to each chunk of frames
+FRAME_INDEX_DTYPE = np.dtype([("frame_id", np.int64), ("timestamp", np.float64), ("offset", np.int64), ("length", np.int64)])
+# Layout of the actions taken during a session
+ACTION_DTYPE = np.dtype([("timestamp", np.float64), ("card", np.int64), ("x", np.int64), ("y", np.int64)])
+
+class SessionRecorder:
+    '''
+    Records captured frames and the actions taken into chunks of compressed frames with an index so sessions can be replayed without the game
+    '''
+
+    def __init__(self, directory: str, region: tuple[int, int, int, int], chunk_size: int = 500, min_interval: float = 0,
+                 png_compression: int = 1, queue_size: int = 64):
+        '''
+        Parameters:
+            directory: Folder the session is saved in
+
+            region: The screen region (left, top, right, bottom) the frames cover
+
+            chunk_size: Number of frames stored in each chunk file
+
+            min_interval: Minimum seconds between recorded frames, 0 records every captured frame
+
+            png_compression: PNG compression level from 0 to 9, low levels are faster to write
+
+            queue_size: Number of frames that can wait to be written before new frames are dropped
+        '''
+        self.directory = directory
+        self.region = region
+        self.chunk_size = chunk_size
+        self.min_interval = min_interval
+        self.png_compression = png_compression
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Chunk currently being written
+        self.chunk = 0
+        self.chunk_file = None
+        self.chunk_index = []
+        self.frame_shape = None
+
+        # Actions are added from the env thread while the writer thread saves them
+        self.actions = []
+        self.actions_lock = threading.Lock()
+        self.last_frame_time = 0.0
+        self.recorded_frames = 0
+        self.dropped_frames = 0
+
+        # Frames are encoded and written on a background thread so capture is never slowed down
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run, name="SessionRecorder", daemon=True)
+        self.thread.start()
+
+    def chunk_path(self, chunk: int, extension: str) -> str:
+        '''
+        Gets the path of a chunk file
+
+        Parameters:
+            chunk: Number of the chunk
+
+            extension: File extension of the chunk file
+
+        Returns:
+            path: Path of the file
+        '''
+        return "{}/frames_{:05d}.{}".format(self.directory, chunk, extension)
+
+    def record_frame(self, image: NDArray, timestamp: float, frame_id: int):
+        '''
+        Queues a captured frame to be written, dropping it if the writer has fallen behind
+
+        Parameters:
+            image: The captured frame exactly as the camera returned it
+
+            timestamp: Time the frame was captured
+
+            frame_id: Id of the frame
+        '''
+        if timestamp - self.last_frame_time < self.min_interval:
+            return
+        self.last_frame_time = timestamp
+
+        try:
+            self.frame_queue.put_nowait((image, timestamp, frame_id))
+        except queue.Full:
+            self.dropped_frames += 1
+            tracer.count("dropped_frames")
+
+    def record_action(self, action: tuple[int, int, int], timestamp: float):
+        '''
+        Records an action taken by the AI
+
+        Parameters:
+            action: The action consisting of the card index and the x, y grid position
+
+            timestamp: Time the action was made
+        '''
+        with self.actions_lock:
+            self.actions.append((timestamp, int(action[0]), int(action[1]), int(action[2])))
+
+    def run(self):
+        '''
+        Writes queued frames until a None is queued
+        '''
+        while True:
+            item = self.frame_queue.get()
+            if item is None:
+                break
+            self.write_frame(*item)
+
+    def write_frame(self, image: NDArray, timestamp: float, frame_id: int):
+        '''
+        Encodes a frame and appends it to the current chunk
+
+        Parameters:
+            image: The captured frame
+
+            timestamp: Time the frame was captured
+
+            frame_id: Id of the frame
+        '''
+        if self.chunk_file is None:
+            self.chunk_file = open(self.chunk_path(self.chunk, "bin"), "wb")
+            self.chunk_index = []
+        if self.frame_shape is None:
+            self.frame_shape = list(image.shape)
+
+        success, encoded = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression])
+        if not success:
+            self.dropped_frames += 1
+            return
+
+        offset = self.chunk_file.tell()
+        self.chunk_file.write(encoded.tobytes())
+        self.chunk_index.append((frame_id, timestamp, offset, len(encoded)))
+        self.recorded_frames += 1
+
+        if len(self.chunk_index) >= self.chunk_size:
+            self.finish_chunk()
+
+    def finish_chunk(self):
+        '''
+        Closes the current chunk and saves its index
+        '''
+        if self.chunk_file is None:
+            return
+
+        self.chunk_file.close()
+        np.save(self.chunk_path(self.chunk, "idx.npy"), np.array(self.chunk_index, dtype=FRAME_INDEX_DTYPE))
+        self.chunk_file = None
+        self.chunk += 1
+        self.save_metadata()
+
+    def save_metadata(self):
+        '''
+        Saves the actions and a description of the session
+        '''
+        with self.actions_lock:
+            actions = np.array(self.actions, dtype=ACTION_DTYPE)
+        np.save("{}/actions.npy".format(self.directory), actions)
+        metadata = {"region": list(self.region), "chunks": self.chunk, "frame_shape": self.frame_shape, "encoding": "png"}
+        with open("{}/metadata.json".format(self.directory), "w") as metadata_file:
+            metadata_file.write(json.dumps(metadata, indent=4))
+
+    def close(self):
+        '''
+        Writes every queued frame and finishes the session
+        '''
+        self.frame_queue.put(None)
+        self.thread.join()
+        self.finish_chunk()
+        self.save_metadata()
+
+class Recording:
+    '''
+    Reads a recorded session, memory mapping the chunks so frames are only decoded when asked for
+    '''
+
+    def __init__(self, directory: str):
+        '''
+        Parameters:
+            directory: Folder the session was saved in
+        '''
+        self.directory = directory
+
+        with open("{}/metadata.json".format(directory), "r") as metadata_file:
+            self.metadata = json.load(metadata_file)
+        self.region = tuple(self.metadata["region"])
+
+        self.chunks = []
+        indexes = []
+        for chunk in range(self.metadata["chunks"]):
+            index = np.load("{}/frames_{:05d}.idx.npy".format(directory, chunk))
+            if len(index) == 0:
+                continue
+            self.chunks.append(np.memmap("{}/frames_{:05d}.bin".format(directory, chunk), dtype=np.uint8, mode="r"))
+            indexes.append((np.full(len(index), len(self.chunks) - 1), index))
+
+        # Which chunk each frame is in and where
+        self.frame_chunks = np.concatenate([chunks for chunks, _ in indexes]) if indexes else np.zeros(0, dtype=np.int64)
+        self.index = np.concatenate([index for _, index in indexes]) if indexes else np.zeros(0, dtype=FRAME_INDEX_DTYPE)
+        self.timestamps = self.index["timestamp"]
+
+        self.actions = np.load("{}/actions.npy".format(directory))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def frame(self, position: int) -> NDArray:
+        '''
+        Decodes a single frame
+
+        Parameters:
+            position: Position of the frame in the recording
+
+        Returns:
+            image: The frame exactly as the camera returned it
+        '''
+        entry = self.index[position]
+        data = self.chunks[self.frame_chunks[position]][entry["offset"]:entry["offset"] + entry["length"]]
+
+        return cv2.imdecode(np.asarray(data), cv2.IMREAD_UNCHANGED)
+
+    def action_before(self, timestamp: float) -> NDArray | None:
+        '''
+        Gets the last action made before a time
+
+        Parameters:
+            timestamp: The time to look before
+
+        Returns:
+            action: The action record or None if no action was made before the time
+        '''
+        position = np.searchsorted(self.actions["timestamp"], timestamp, side="right") - 1
+        if position < 0:
+            return None
+
+        return self.actions[position]
+
+class ReplaySource(CaptureSource):
+    '''
+    Feeds the frames of a recorded session to Screen in place of dxcam, give Screen pull_frames=True so every frame is read once and in order
+    '''
+
+    def __init__(self, recording: Recording, realtime: bool = False, loop: bool = False):
+        '''
+        Parameters:
+            recording: The recorded session to play
+
+            realtime: Wait between frames as long as they were apart when recorded, otherwise play as fast as possible
+
+            loop: Start again from the first frame once the last one has been played
+        '''
+        self.recording = recording
+        self.realtime = realtime
+        self.loop = loop
+        self.position = 0
+        self.start_time = None
+
+    def grab(self) -> NDArray | None:
+        if self.position >= len(self.recording):
+            if not self.loop or len(self.recording) == 0:
+                return None
+            self.position = 0
+            self.start_time = None
+
+        if self.realtime:
+            if self.start_time is None:
+                self.start_time = time.time() - self.recording.timestamps[self.position]
+            # Frame is not due yet
+            if time.time() - self.start_time < self.recording.timestamps[self.position]:
+                return None
+
+        image = self.recording.frame(self.position)
+        self.position += 1
+
+        return image
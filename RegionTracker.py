@@ -0,0 +1,117 @@
+import cv2
+from cv2.typing import MatLike
+import numpy as np
+from numpy.typing import NDArray
+from Metrics import tracer
+
+class RegionTracker:
+    '''
+    Remembers a downsampled copy of each screen region along with what was read from it so unchanged regions do not have to be read again
+    '''
+
+    def __init__(self, thumbnail_size: int = 16, tolerance: int = 8):
+        '''
+        Parameters:
+            thumbnail_size: Width and height regions are scaled down to before being compared
+
+            tolerance: Largest difference of any thumbnail pixel for a region to count as unchanged
+        '''
+        self.thumbnail_size = thumbnail_size
+        self.tolerance = tolerance
+
+        # Dictionary where key is the region name and value is the thumbnail, key and result of the last read
+        self.entries: dict[str, tuple[NDArray, object, object]] = {}
+        # Thumbnails of regions that changed, stored with the result once the region has been read
+        self.pending: dict[str, tuple[NDArray, object]] = {}
+
+        # Number of times each region was unchanged and changed
+        self.hits: dict[str, int] = {}
+        self.misses: dict[str, int] = {}
+
+    def thumbnail(self, image: MatLike, thumbnail_size: int | None = None) -> NDArray:
+        '''
+        Scales a region down so it can be compared cheaply while ignoring noise from single pixels
+
+        Parameters:
+            image: Grayscale image of the region
+
+            thumbnail_size: Width and height of the thumbnail, if None then the default size is used
+
+        Returns:
+            thumbnail: Downsampled region
+        '''
+        size = self.thumbnail_size if thumbnail_size is None else thumbnail_size
+
+        return cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def lookup(self, name: str, image: MatLike, key=None, thumbnail_size: int | None = None) -> tuple[bool, object]:
+        '''
+        Checks if a region looks the same as the last time it was read
+
+        Parameters:
+            name: Name of the region such as hand_slot_0
+
+            image: Grayscale image of the region
+
+            key: Anything else the result depends on such as the deck being matched, compared by identity
+
+            thumbnail_size: Width and height of the thumbnail, larger for regions where small changes matter such as the board
+
+        Returns:
+            unchanged: True if the region has not changed since it was read
+
+            result: What was read from the region last time, None if the region changed
+        '''
+        thumbnail = self.thumbnail(image, thumbnail_size)
+        entry = self.entries.get(name)
+        if (entry is not None and entry[1] is key and entry[0].shape == thumbnail.shape
+                and np.abs(thumbnail - entry[0]).max() <= self.tolerance):
+            self.hits[name] = self.hits.get(name, 0) + 1
+            tracer.count("unchanged_regions")
+            return True, entry[2]
+
+        self.misses[name] = self.misses.get(name, 0) + 1
+        tracer.count("changed_regions")
+        self.pending[name] = (thumbnail, key)
+        return False, None
+
+    def store(self, name: str, result):
+        '''
+        Stores what was read from a region that changed
+
+        Parameters:
+            name: Name of the region
+
+            result: What was read from the region
+
+        Returns:
+            result: The stored result so a reader can return straight away
+        '''
+        thumbnail, key = self.pending.pop(name)
+        self.entries[name] = (thumbnail, key, result)
+
+        return result
+
+    def reset(self):
+        '''
+        Forgets every region, used when a new game starts
+        '''
+        self.entries = {}
+        self.pending = {}
+
+    def stats(self) -> dict[str, float]:
+        '''
+        Summarises how often each region was unchanged
+
+        Returns:
+            stats: Hit rate of each region and of every region together
+        '''
+        stats = {}
+        for name in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits.get(name, 0), self.misses.get(name, 0)
+            stats["{}/hit_rate".format(name)] = hits / (hits + misses)
+
+        total_hits, total_misses = sum(self.hits.values()), sum(self.misses.values())
+        stats["hit_rate"] = total_hits / (total_hits + total_misses) if total_hits + total_misses else 0.0
+
+        return stats
@@ -0,0 +1,213 @@
+import numpy as np
+from numpy.typing import NDArray
+from ObservationLayout import ObservationLayout
+
+class RewardEngine:
+    '''
+    Calculates rewards from observations, keeping the recent tower values of each environment in fixed size ring buffers
+    '''
+
+    def __init__(self, layout: ObservationLayout, num_envs: int = 1, window: int = 10, tower_destroyed_weight: float = 1400,
+                 tower_hp_weight: float = 1, troop_hp_weight: float = 1 / 20, elixir_weight: float = 1, elixir_power: float = 2,
+                 invalid_move_reward: float = -5000, win_reward: float = 5000):
+        '''
+        Parameters:
+            layout: Layout of the observations being scored
+
+            num_envs: Number of environments scored at once, each has its own history
+
+            window: Number of steps the change in tower hp is measured over
+
+            tower_destroyed_weight: Reward for each enemy tower destroyed and punishment for each ally tower lost over the window
+
+            tower_hp_weight: Reward for each point of hp the lowest enemy tower lost more than the lowest ally tower over the window
+
+            troop_hp_weight: Reward for each point of hp the ally troops on screen have more than the enemy troops
+
+            elixir_weight: Reward for the elixir the player has raised to elixir_power
+
+            elixir_power: Power the elixir is raised to so saving elixir is rewarded more the more elixir there is
+
+            invalid_move_reward: Reward given instead of everything else when the move was not valid
+
+            win_reward: Reward for winning a game and punishment for losing one
+        '''
+        self.layout = layout
+        self.num_envs = num_envs
+        self.window = window
+        self.tower_destroyed_weight = tower_destroyed_weight
+        self.tower_hp_weight = tower_hp_weight
+        self.troop_hp_weight = troop_hp_weight
+        self.elixir_weight = elixir_weight
+        self.elixir_power = elixir_power
+        self.invalid_move_reward = invalid_move_reward
+        self.win_reward = win_reward
+
+        # Lowest tower hp and towers destroyed of each side (ally, enemy) for the last window steps
+        self.min_tower_hp = np.zeros((num_envs, window, 2), dtype=np.float32)
+        self.towers_destroyed = np.zeros((num_envs, window, 2), dtype=np.float32)
+        # Slot the next step is written to and how many slots are filled
+        self.position = np.zeros(num_envs, dtype=np.int64)
+        self.length = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self, env_ids: NDArray | None = None):
+        '''
+        Clears the history when a game restarts
+
+        Parameters:
+            env_ids: Indices of the environments to clear, if None then every environment is cleared
+        '''
+        if env_ids is None:
+            env_ids = np.arange(self.num_envs)
+        self.position[env_ids] = 0
+        self.length[env_ids] = 0
+
+    def tower_summary(self, observations: NDArray) -> tuple[NDArray, NDArray]:
+        '''
+        Finds the lowest hp tower and how many towers have been destroyed for each side
+
+        Parameters:
+            observations: Array of shape (..., observation size)
+
+        Returns:
+            min_tower_hp: Array of shape (..., 2) with the hp of the lowest ally and enemy tower still standing, 4000 if none are
+
+            towers_destroyed: Array of shape (..., 2) with the number of ally and enemy towers destroyed
+        '''
+        parts = self.layout.split(observations)
+        towers = np.stack([parts["ally_towers"], parts["enemy_towers"]], axis=-2)
+
+        min_tower_hp = np.where(towers == 0, 4000, towers).min(axis=-1)
+        towers_destroyed = (towers == 0).sum(axis=-1).astype(np.float32)
+
+        return min_tower_hp, towers_destroyed
+
+    def state_reward(self, observations: NDArray) -> NDArray:
+        '''
+        Calculates the part of the reward that only depends on the current observation
+
+        Parameters:
+            observations: Array of shape (..., observation size)
+
+        Returns:
+            rewards: Reward for the troops on screen and the elixir held
+        '''
+        parts = self.layout.split(observations)
+
+        # Padded troop rows are all 0's so they do not change the hp difference
+        troop_hp_difference = parts["ally_troops"][..., 0].sum(axis=-1) - parts["enemy_troops"][..., 0].sum(axis=-1)
+        elixir = parts["elixir"][..., 0]
+
+        return self.troop_hp_weight * troop_hp_difference + self.elixir_weight * elixir ** self.elixir_power
+
+    def tower_reward(self, delta_min_tower_hp: NDArray, delta_towers_destroyed: NDArray) -> NDArray:
+        '''
+        Calculates the part of the reward from the change in towers over the window
+
+        Parameters:
+            delta_min_tower_hp: Array of shape (..., 2) with the change in lowest ally and enemy tower hp
+
+            delta_towers_destroyed: Array of shape (..., 2) with the change in ally and enemy towers destroyed
+
+        Returns:
+            rewards: Reward for damaging enemy towers more than ally towers were damaged
+        '''
+        # Sometimes towers may mistakenly be marked as lost and will come back again, this change back should be ignored
+        delta_towers_destroyed = np.maximum(delta_towers_destroyed, 0)
+
+        tower_difference = delta_towers_destroyed[..., 1] - delta_towers_destroyed[..., 0]
+        min_tower_difference = delta_min_tower_hp[..., 0] - delta_min_tower_hp[..., 1]
+
+        return self.tower_destroyed_weight * tower_difference + self.tower_hp_weight * min_tower_difference
+
+    def score(self, observations: NDArray, invalid_moves: NDArray) -> NDArray:
+        '''
+        Scores the newest observation of every environment and adds it to their history
+
+        Parameters:
+            observations: Array of shape (num_envs, observation size)
+
+            invalid_moves: True for every environment where the move was not valid, their history is left unchanged
+
+        Returns:
+            rewards: Reward of each environment
+        '''
+        min_tower_hp, towers_destroyed = self.tower_summary(observations)
+
+        # Write the valid steps into the ring buffers
+        valid = np.flatnonzero(~invalid_moves)
+        newest = self.position[valid]
+        self.min_tower_hp[valid, newest] = min_tower_hp[valid]
+        self.towers_destroyed[valid, newest] = towers_destroyed[valid]
+        self.position[valid] = (newest + 1) % self.window
+        self.length[valid] = np.minimum(self.length[valid] + 1, self.window)
+
+        # Once the window is full the oldest value is in the slot written next
+        envs = np.arange(self.num_envs)
+        newest = (self.position - 1) % self.window
+        oldest = self.position
+        delta_min_tower_hp = self.min_tower_hp[envs, newest] - self.min_tower_hp[envs, oldest]
+        delta_towers_destroyed = self.towers_destroyed[envs, newest] - self.towers_destroyed[envs, oldest]
+
+        # No tower reward is given until there are enough values
+        tower_rewards = np.where(self.length == self.window, self.tower_reward(delta_min_tower_hp, delta_towers_destroyed), 0)
+        rewards = tower_rewards + self.state_reward(observations)
+
+        return np.where(invalid_moves, self.invalid_move_reward, rewards).astype(np.float32)
+
+    def outcome_reward(self, terminated: NDArray, won: NDArray) -> NDArray:
+        '''
+        Calculates the reward for finishing a game
+
+        Parameters:
+            terminated: True for every game that finished
+
+            won: True for every game the player won
+
+        Returns:
+            rewards: The win reward for won games, minus the win reward for lost games and 0 for unfinished games
+        '''
+        return np.where(terminated, np.where(won, self.win_reward, -self.win_reward), 0).astype(np.float32)
+
+    def score_batch(self, observations: NDArray, invalid_moves: NDArray, episode_starts: NDArray,
+                    outcomes: NDArray | None = None) -> NDArray:
+        '''
+        Scores a stored trajectory at once, giving the same rewards score would have given step by step
+
+        Parameters:
+            observations: Array of shape (steps, observation size) in the order they were observed
+
+            invalid_moves: True for every step where the move was not valid
+
+            episode_starts: True for the first step of every game
+
+            outcomes: 1 for the last step of a won game, -1 for the last step of a lost game and 0 otherwise, if None then no outcome reward is given
+
+        Returns:
+            rewards: Reward of each step
+        '''
+        invalid_moves = np.asarray(invalid_moves, dtype=bool)
+        min_tower_hp, towers_destroyed = self.tower_summary(observations)
+
+        # Only valid steps are kept in the history so the window is counted over them
+        valid = np.flatnonzero(~invalid_moves)
+        episodes = np.cumsum(episode_starts)[valid]
+        steps = np.arange(len(valid))
+        new_episode = np.ones(len(valid), dtype=bool)
+        new_episode[1:] = episodes[1:] != episodes[:-1]
+        episode_first = np.maximum.accumulate(np.where(new_episode, steps, 0))
+
+        # Compare every valid step against the valid step window - 1 before it in the same game
+        full = steps - episode_first >= self.window - 1
+        oldest = valid[np.maximum(steps - (self.window - 1), 0)]
+        delta_min_tower_hp = min_tower_hp[valid] - min_tower_hp[oldest]
+        delta_towers_destroyed = towers_destroyed[valid] - towers_destroyed[oldest]
+
+        rewards = np.full(len(observations), self.invalid_move_reward, dtype=np.float32)
+        tower_rewards = np.where(full, self.tower_reward(delta_min_tower_hp, delta_towers_destroyed), 0)
+        rewards[valid] = tower_rewards + self.state_reward(observations[valid])
+
+        if outcomes is not None:
+            rewards += self.outcome_reward(outcomes != 0, outcomes > 0)
+
+        return rewards
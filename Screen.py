@@ -1,47 +1,182 @@
-import os
 import cv2
 from cv2.typing import MatLike
-import dxcam
 import numpy as np
 from numpy.typing import NDArray
 import pyautogui
 import time
-from ultralytics import YOLO
-from ultralytics.engine.results import Results
-import easyocr
+from Frame import Frame
+from Capture import CaptureSource, CaptureThread, DxcamSource, PullCapture
+from Recorder import SessionRecorder
+from Metrics import traced, tracer
+from DigitReader import DigitReader
+from TemplateBank import TemplateBank
+from HandClassifier import HandClassifier
+from ScreenIdentifier import ScreenIdentifier
+from DetectorBackend import DetectorBackend, Detections, UltralyticsDetector
+from Tracker import TroopTracker
+from AssetBundle import load_image_directory
+from Startup import LazyResource, startup_report
+from DeckCache import DeckCache
+from PerceptionCache import PerceptionCache
+from RegionTracker import RegionTracker
+from WindowLayout import WindowLayout
 
 class Screen():
     '''
     Class that controls everything to do with detecting images on the screen and details about the screen
     '''
 
-    def __init__(self, region: tuple[int, int, int, int]):
+    def __init__(self, region: tuple[int, int, int, int], source: CaptureSource | None = None, recorder: SessionRecorder | None = None,
+                 detector: DetectorBackend | None = None, crop_detections: bool = True, tracker: TroopTracker | None = None, warm_up: bool = True,
+                 perception_ttl: float = 0.0, pull_frames: bool = False):
+        '''
+        Parameters:
+            region: The screen region (left, top, right, bottom) of the game window
+
+            source: Where frames of the game come from, if None then the screen region is captured with dxcam
+
+            recorder: Records every captured frame if given
+
+            detector: Backend that detects troops, if None then the PyTorch model is run with ultralytics
+
+            crop_detections: Only run the detector on the board instead of the whole frame
+
+            tracker: Tracks troops between frames so the detector can be skipped on some frames, if None then every frame is detected
+
+            warm_up: Start loading the models on background threads straight away instead of when they are first used
+
+            perception_ttl: Seconds a reader result is reused for newer frames, 0 only reuses results for the same frame
+
+            pull_frames: Take the next frame of the source every time a frame is asked for instead of the newest one captured in the
+                         background, used when replaying a recording so no frame is skipped or repeated
+        '''
         self.region = region
-        self.camera = dxcam.create()
-
-        # Image identifiers used to tell what menu screen we are currently looking at
-        self.identifiers = self.load_screen_identifiers()
-        # Machine learning model for troop detection
-        self.model = YOLO("troop_detector.pt")
-        # Easyocr text recognition reader
-        self.reader = easyocr.Reader(['en'])
+
+        # Frames are captured on a background thread and readers take the newest one, unless frames are pulled from a replay
+        capture_start = time.perf_counter()
+        if source is None:
+            source = DxcamSource(region)
+        self.capture = PullCapture(source, region) if pull_frames else CaptureThread(source, region)
+        self.capture.recorder = recorder
+        self.capture.start()
+        startup_report.record("capture", capture_start, time.perf_counter() - capture_start)
+        # Maximum seconds to wait for a frame before giving up
+        self.capture_timeout = 5
+        # Results of each reader for the newest frame so validating a move and observing share them
+        self.perception_cache = PerceptionCache(perception_ttl)
+        # Downsampled copy of each HUD region and the board so regions that have not changed between frames are not read again
+        self.region_tracker = RegionTracker()
+        # Thumbnail size of the board, large enough that a single troop moving changes it
+        self.board_thumbnail_size = 64
+
+        # Heavy resources are only loaded when first used, or sooner on a background thread when warmed up
+        self.resources = {
+            # Index of where each identifier appears so screens can be checked without searching the whole screen
+            "screen_identifier": LazyResource("screen_identifier", lambda: ScreenIdentifier(self.load_screen_identifiers())),
+            # Machine learning model for troop detection
+            "detector": LazyResource("detector", self.load_detector) if detector is None else LazyResource.ready("detector", detector),
+            # Easyocr text recognition reader, only used when the digit reader is not confident
+            "reader": LazyResource("easyocr", self.load_reader),
+        }
+        self.crop_detections = crop_detections
+        self.tracker = tracker
+        # Fast digit reader for the tower hp numbers
+        self.digit_reader = DigitReader()
+        # Digit reader confidence below which easyocr is used instead
+        self.digit_confidence_threshold = 0.8
+        # Easyocr confidence above which a number it read is used to teach the digit reader its glyphs
+        self.glyph_learning_confidence = 0.9
         # Kernel used for sharpening images for text recognition
         self.kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
 
+        # Every location below is relative to the top left of the reference game window and is moved and scaled to this window
+        self.layout = WindowLayout(region)
+
         # All menu locations are assuming that the current state is in the shop
-        self.shop_location = [20 + region[0], 1080 + region[1]]
-        self.collection_location = [260 + region[0], 1080 + region[1]]
-        self.battle_location = [370 + region[0], 1080 + region[1]]
-        self.menu_bar_location = [575 + region[0], 148 + region[1]]
-        self.training_camp_location = [385 + region[0], 397 + region[1]]
-        self.training_camp_ok_location = [435 + region[0], 675 + region[1]]
-        self.leave_game_location = [950, 1000]
+        self.shop_location = self.layout.screen_point(20, 1080)
+        self.collection_location = self.layout.screen_point(260, 1080)
+        self.battle_location = self.layout.screen_point(370, 1080)
+        self.menu_bar_location = self.layout.screen_point(575, 148)
+        self.training_camp_location = self.layout.screen_point(385, 397)
+        self.training_camp_ok_location = self.layout.screen_point(435, 675)
+        self.leave_game_location = self.layout.screen_point(260, 1000)
+
+        # Screen regions (left, top, right, bottom) of the tower hp numbers
+        ally_tower_hp_regions = [(411, 723, 460, 745), (85, 723, 135, 745), (250, 872, 305, 892)]
+        enemy_tower_hp_regions = [(411, 176, 460, 205), (85, 176, 135, 205), (252, 48, 305, 68)]
+        self.ally_tower_hp_regions = [self.layout.screen_region(tower_region) for tower_region in ally_tower_hp_regions]
+        self.enemy_tower_hp_regions = [self.layout.screen_region(tower_region) for tower_region in enemy_tower_hp_regions]
+
+        # Screen region of the board troops can be on
+        self.board_region = self.layout.screen_region((15, 130, 525, 875))
+
+        self.elixir_bar_width = 45 * self.layout.scale_x
+        self.elixir_bar_location = self.layout.screen_point(554, 1120)
+
+        # Regions (left, top, right, bottom) of the screenshot where cards can appear, used to limit template matching
+        self.hand_region = self.layout.window_region((100, 900, 700, 1200))
+        self.deck_region = self.layout.window_region((0, 100, 800, 750))
+
+        # Range of x values for the top left of a card in each hand slot from left to right
+        self.hand_slot_ranges = [(self.layout.window_point(slot_start, 0)[0], self.layout.window_point(slot_end, 0)[0])
+                                 for slot_start, slot_end in [(150, 200), (250, 300), (375, 425), (500, 550)]]
+        # Classifies the hand slots directly once their locations are known
+        self.hand_classifier: HandClassifier | None = None
+
+        if warm_up:
+            self.warm_up()
+
+    @property
+    def screen_identifier(self) -> ScreenIdentifier:
+        '''
+        Tells what menu screen is shown from the screen identifier images
+        '''
+        return self.resources["screen_identifier"].get()
+
+    @property
+    def detector(self) -> DetectorBackend:
+        '''
+        Backend that detects troops
+        '''
+        return self.resources["detector"].get()
+
+    @property
+    def reader(self):
+        '''
+        Easyocr text recognition reader
+        '''
+        return self.resources["reader"].get()
+
+    def warm_up(self):
+        '''
+        Starts loading every heavy resource at once on background threads so they are ready by the time they are first used
+        '''
+        for resource in self.resources.values():
+            resource.warm_up()
+
+    def load_detector(self) -> DetectorBackend:
+        '''
+        Loads the PyTorch troop detector and runs it once, as the first prediction is much slower than the rest
 
-        self.ally_tower_hp_regions = [(1101, 723, 1150, 745), (775, 723, 825, 745), (940, 872, 995, 892)]
-        self.enemy_tower_hp_regions = [(1101, 176, 1150, 205), (775, 176, 825, 205), (942, 48, 995, 68)]
+        Returns:
+            detector: The ultralytics detector
+        '''
+        detector = UltralyticsDetector("troop_detector.pt")
+        left, top, right, bottom = self.board_region
+        detector.detect(np.zeros((bottom - top, right - left, 3), dtype=np.uint8))
+
+        return detector
+
+    def load_reader(self):
+        '''
+        Creates the easyocr reader, imported here as importing easyocr alone takes seconds
+
+        Returns:
+            reader: The easyocr reader
+        '''
+        import easyocr
 
-        self.elixir_bar_width = 45
-        self.elixir_bar_location = [1244, 1120]
+        return easyocr.Reader(['en'])
 
     def load_screen_identifiers(self) -> dict[str, MatLike]:
         '''
@@ -51,15 +186,10 @@ class Screen():
             screen_identifiers: Dictionary where key is the screen name and value is the image of the screen identifier
         '''
 
-        screen_identifiers = {}
-        for img_name in os.listdir("./screen_identifiers"):
-            img = cv2.imread("screen_identifiers/{}".format(img_name))
-            gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            img_name = img_name.split(".")[0]
-            screen_identifiers[img_name] = gray_img
-
-        return screen_identifiers
+        # Read from the packed asset bundle instead of every png
+        return load_image_directory("screen_identifiers")
     
+    @traced("Screen.take_screenshot")
     def take_screenshot(self, region: tuple[int, int, int, int] | None = None) -> NDArray:
         '''
         Takes a screenshot of the current game screen and returns the image
@@ -70,68 +200,83 @@ class Screen():
         Returns:
             screenshot: Screenshot of the region
         '''
-        screenshot = np.array(None)
+        frame = self.capture_frame()
+        if region is None:
+            return frame.image
 
-        #TODO: Maybe consider just discarding a screenshot if it fails for efficiency
-        while (screenshot is None) or (screenshot.size == 0) or (screenshot.shape == ()):
+        return frame.crop(region)
 
-            if region is None:
-                screenshot = np.array(self.camera.grab(region=(self.region)))
-            else:
-                screenshot = np.array(self.camera.grab(region=(region)))
+    def close(self):
+        '''
+        Stops the capture thread, which also finishes the recorded session if there is one
+        '''
+        self.capture.stop()
+
+    @traced("Screen.capture_frame")
+    def capture_frame(self) -> Frame:
+        '''
+        Gets the newest frame of the game screen that can be shared between every reader in a tick
 
-        return screenshot
+        Returns:
+            frame: Snapshot of the game region
+        '''
+        frame = self.capture.latest()
+        if frame is None and self.capture.wait_for_frame(timeout=self.capture_timeout) is not None:
+            # Nothing had been captured yet so the capture thread was waited for instead of spinning
+            frame = self.capture.latest()
+        if frame is None:
+            raise RuntimeError("No frame was captured within {} seconds".format(self.capture_timeout))
+
+        return frame
     
-    def get_menu_screen(self) -> str:
+    @traced("Screen.get_menu_screen")
+    def get_menu_screen(self, frame: Frame | None = None) -> str:
         '''
         Gets the menu screen that the player is currently looking at
 
+        Parameters:
+            frame: The frame to read from, if None then a new frame is captured
+
         Returns:
             menu_screen: The name of the current menu on screen  
         '''
 
-        menu_screen = "undefined"
+        if frame is None:
+            frame = self.capture_frame()
 
-        screenshot = self.take_screenshot()
-        gray_screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-        for key in self.identifiers:
-            result = cv2.matchTemplate(gray_screenshot, self.identifiers[key], cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            if max_val >= 0.8:
-                # Detected a screen identifier
-                menu_screen = key
-                break
-
-        return menu_screen
+        return self.screen_identifier.identify(frame.gray)
     
-    def game_over_check(self) -> bool:
+    @traced("Screen.game_over_check")
+    def game_over_check(self, frame: Frame | None = None) -> bool:
         '''
         Checks if the game has ended or is still being played
 
+        Parameters:
+            frame: The frame to read from, if None then a new frame is captured
+
         Returns: True if the game is over and False if the game is ongoing
         '''
-        screenshot = self.take_screenshot()
-        gray_screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
+        if frame is None:
+            frame = self.capture_frame()
 
-        result = cv2.matchTemplate(gray_screenshot, self.identifiers["mid_battle"], cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-        if max_val >= 0.8:
-            # Game is still being played 
-            return False
-        else:
-            return True
+        # Game is still being played while the mid battle identifier is in its usual place
+        return not self.screen_identifier.is_present(frame.gray, "mid_battle")
         
-    def game_winner_check(self) -> bool:
+    @traced("Screen.game_winner_check")
+    def game_winner_check(self, frame: Frame | None = None) -> bool:
         '''
         Checks which player has won the game
 
+        Parameters:
+            frame: The frame to read from, if None then a new frame is captured
+
         Returns: True if the player has won the game and False if the opponent has won the game
         '''
-        screenshot = self.take_screenshot()
-        gray_screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
+        if frame is None:
+            frame = self.capture_frame()
 
-        result = cv2.matchTemplate(gray_screenshot, self.identifiers["winner_screen"], cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        # The winner banner can be at the top or bottom of the screen so the whole screen is searched
+        max_val, max_loc = self.screen_identifier.locate(frame.gray, "winner_screen")
 
         # If match is at a y value of greater than 200 then player won
         if max_loc[1] > 200: 
@@ -139,22 +284,28 @@ class Screen():
         else:
             return False
     
-    def get_deck_info(self, menu_screen: str, card_info: dict[str, MatLike]) -> dict[str, MatLike]:
+    @traced("Screen.get_deck_info")
+    def get_deck_info(self, menu_screen: str, template_bank: TemplateBank, deck_cache: DeckCache | None = None) -> TemplateBank:
         '''
         Gets the deck the player is using by navigating to the deck screen and matching card images against it
 
         Parameters:
             menu_screen: Name of the current menu screen the player is on
-            card_info: Dictionary where key is the card name and value is the card image
+            template_bank: Template bank containing every card
+            deck_cache: Decks found before, if given the menus are only navigated when the deck is not already known
 
         Returns:
-            deck_info: Subset of the card info dictionary only containing cards in the current players deck 
+            deck_info: Subset of the template bank only containing cards in the current players deck 
         
         '''
-        deck_info = {}
+        # Decks can only be changed on the collection screen so a deck the player confirmed is still in use can be trusted elsewhere
+        if deck_cache is not None and menu_screen != "collection_screen":
+            deck_cards = deck_cache.last_deck()
+            if self.usable_deck(deck_cards, template_bank):
+                tracer.count("deck_cache_hits")
+                return template_bank.subset(deck_cards)
 
-        # The amount of resizing needed to detect cards on the deck screen
-        card_image_resize = 1.35
+        deck_cards = []
 
         if menu_screen != "collection_screen" and menu_screen != "undefined":
             # On a menu screen that isn't the collection screen
@@ -166,26 +317,54 @@ class Screen():
             menu_screen = "collection_screen"
 
         if menu_screen == "collection_screen":
-            # Currently looking at the deck, do image detection
-            cards_found = 0
-            screenshot = self.take_screenshot()
-            gray_screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-            
-            for card_name in card_info:
-                # Resize the template according to the scale
-                resized_card = cv2.resize(card_info[card_name], (0, 0), fx=card_image_resize, fy=card_image_resize)
-                result = cv2.matchTemplate(gray_screenshot, resized_card, cv2.TM_CCOEFF_NORMED)
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                if max_val >= 0.8:
-                    # Detected a card
-                    deck_info[card_name] = card_info[card_name]
-                    cards_found +=1
-                    print(cards_found)
-                    if cards_found >= 8:
-                        break
-
-        return deck_info
-    
+            gray_screenshot = self.capture_frame().gray
+
+            # The deck shown is always checked against the cache as it could have been changed since it was last seen
+            if deck_cache is not None:
+                deck_cards = deck_cache.lookup(deck_cache.fingerprint(self.crop_deck_area(gray_screenshot)))
+                if self.usable_deck(deck_cards, template_bank):
+                    tracer.count("deck_cache_hits")
+                    return template_bank.subset(deck_cards)
+
+            # Currently looking at the deck, do image detection inside the deck grid
+            matches = template_bank.match(gray_screenshot, "collection", self.deck_region, max_matches=8)
+            deck_cards = [card_name for card_name, _, _ in matches]
+            print("Found {} cards in the deck".format(len(deck_cards)))
+
+            # Only a complete deck is remembered, the cache also decides the card order so indices match earlier runs
+            if deck_cache is not None and len(deck_cards) == 8:
+                deck_cards = deck_cache.store(deck_cache.fingerprint(self.crop_deck_area(gray_screenshot)), deck_cards)
+
+        return template_bank.subset(deck_cards)
+
+    def usable_deck(self, deck_cards: list[str] | None, template_bank: TemplateBank) -> bool:
+        '''
+        Checks if a cached deck can be used
+
+        Parameters:
+            deck_cards: Card names of the cached deck, None if nothing was cached
+
+            template_bank: Template bank containing every card
+
+        Returns: True if every card of the deck has a template
+        '''
+        return deck_cards is not None and all(card_name in template_bank.card_info for card_name in deck_cards)
+
+    def crop_deck_area(self, gray_screenshot: MatLike) -> MatLike:
+        '''
+        Crops the deck grid out of a screenshot of the collection screen
+
+        Parameters:
+            gray_screenshot: Grayscale screenshot of the game window
+
+        Returns:
+            deck_area: Grayscale image of the deck grid
+        '''
+        left, top, right, bottom = self.deck_region
+
+        return gray_screenshot[top:bottom, left:right]
+
+    @traced("Screen.start_training_battle", "sleep")
     def start_training_battle(self):
         '''
         Clicks a set of buttons to initiate a training camp battle
@@ -202,6 +381,7 @@ class Screen():
         # Final sleep to synchronise the game clock with the timer I use
         time.sleep(1)
 
+    @traced("Screen.leave_game", "sleep")
     def leave_game(self):
         '''
         Ends a game by clicking the OK button when finished
@@ -209,104 +389,158 @@ class Screen():
         pyautogui.click(self.leave_game_location)
         time.sleep(4)
     
-    def get_cards_in_hand(self, deck_info: dict[str, MatLike]) -> list[str]:
+    @traced("Screen.get_cards_in_hand")
+    def get_cards_in_hand(self, deck_info: TemplateBank, frame: Frame | None = None) -> list[str]:
         '''
         Gets the cards in the players hand by matching against images of cards in the players deck
         
         Parameters: 
-            deck_info: Dictionary where key is the card name and value is the card image
+            deck_info: Template bank containing the cards in the players deck
+
+            frame: The frame to read from, if None then a new frame is captured
 
         Returns:
             cards_in_hand: Array of strings relating to the cards in the players hand from left to right
         
         '''
-        cards_in_hand = []
-        cards_found = 0
-
-        # The amount of resizing needed to detect cards on the battle screen
-        card_image_resize = 1.15
-
-        screenshot = self.take_screenshot()
-        gray_screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-        for card_name in deck_info:
-            # Resize the template according to the scale
-            resized_card = cv2.resize(deck_info[card_name], (0, 0), fx=card_image_resize, fy=card_image_resize)
-            result = cv2.matchTemplate(gray_screenshot, resized_card, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            if max_val >= 0.8:
-                # Detected a card
-                cards_in_hand.append([max_loc, card_name])
-                cards_found +=1
-                if cards_found >= 4:
-                    break
-                
-        # Sort the cards based on their x location to get cards in order of left to right
-        sorted_cards_in_hand = sorted(cards_in_hand, key=lambda x: x[0][0])
+        if frame is None:
+            frame = self.capture_frame()
+
+        cards_in_hand = self.perception_cache.get("hand", frame, deck_info)
+        if cards_in_hand is not None:
+            return cards_in_hand
+
+        if self.hand_classifier is None or self.hand_classifier.deck_info is not deck_info:
+            self.hand_classifier = HandClassifier(deck_info)
+
+        # Once every slot has been located each slot is classified on its own, only if it changed since it was last classified
+        if self.hand_classifier.calibrated:
+            cards_in_hand = []
+            changed_slots = []
+            for slot, slot_image in enumerate(self.hand_classifier.slot_images(frame.gray)):
+                unchanged, card_name = self.region_tracker.lookup("hand_slot_{}".format(slot), slot_image, self.hand_classifier)
+                cards_in_hand.append(card_name)
+                if not unchanged:
+                    changed_slots.append(slot)
+            if changed_slots:
+                for slot, card_name in zip(changed_slots, self.hand_classifier.classify(frame, changed_slots)):
+                    cards_in_hand[slot] = self.region_tracker.store("hand_slot_{}".format(slot), card_name)
+            tracer.count("empty_hand_slots", cards_in_hand.count("empty"))
+            return self.perception_cache.put("hand", frame, cards_in_hand, deck_info)
+
+        # Only the strip at the bottom of the screen can contain cards in hand
+        matches = deck_info.match(frame.gray, "battle", self.hand_region, max_matches=4)
 
         # Create empty array so if cards are not found then an empty card is in their place
         cards_in_hand = ["empty", "empty", "empty", "empty"]
 
-        # Replace empty with card name for the cards that are found
-        for card in sorted_cards_in_hand:
-            if card[0][0] > 150 and card[0][0] < 200:
-                cards_in_hand[0] = card[1] 
-            elif card[0][0] > 250 and card[0][0] < 300:
-                cards_in_hand[1] = card[1]
-            elif card[0][0] > 375 and card[0][0] < 425:
-                cards_in_hand[2] = card[1]
-            elif card[0][0] > 500 and card[0][0] < 550:
-                cards_in_hand[3] = card[1]
-
-        return cards_in_hand
+        # Replace empty with card name for the cards that are found and remember where each slot is
+        for card_name, _, location in matches:
+            for slot, (slot_start, slot_end) in enumerate(self.hand_slot_ranges):
+                if location[0] > slot_start and location[0] < slot_end:
+                    cards_in_hand[slot] = card_name
+                    self.hand_classifier.calibrate(slot, location)
+                    break
+
+        tracer.count("empty_hand_slots", cards_in_hand.count("empty"))
+        return self.perception_cache.put("hand", frame, cards_in_hand, deck_info)
     
-    def get_tower_hp(self) -> tuple[list[int], list[int]]:
+    @traced("Screen.read_tower_hp")
+    def read_tower_hp(self, screenshot: MatLike) -> int:
+        '''
+        Reads the hp value from the image of a single tower hp bar
+
+        Parameters:
+            screenshot: Image of the tower hp bar
+
+        Returns:
+            hp: The hp of the tower, 0 if no number could be read
+        '''
+        hp, confidence = self.digit_reader.read(screenshot)
+        if confidence >= self.digit_confidence_threshold:
+            return hp
+
+        # Fall back to easyocr when the digit templates do not match well
+        tracer.count("ocr_fallbacks")
+        # Change to RGB as easyocr seems to work better in RGB
+        rgb_screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2RGB)
+        # Sharpen the image to pronounce the edges of the numbers
+        sharpened = cv2.filter2D(rgb_screenshot, -1, self.kernel)
+
+        # Extract the hp if digits are found
+        text = self.reader.readtext(sharpened)
+        if text:
+            hp = str(text[0][1])
+            if hp.isdigit():
+                self.learn_glyphs(screenshot, rgb_screenshot, hp, text[0][2])
+                return int(hp)
+
+        return 0
+
+    def learn_glyphs(self, screenshot: MatLike, rgb_screenshot: MatLike, hp: str, ocr_confidence: float):
         '''
-        Takes screenshots of each crown tower hp bar and uses easyocr to detect the number values
+        Saves the digits of a number easyocr read as glyphs for the digit reader, only when easyocr is sure and reads the unsharpened image the same way
+
+        Parameters:
+            screenshot: Image of the tower hp bar as captured
+
+            rgb_screenshot: The same image in RGB
+
+            hp: The number easyocr read from the sharpened image
+
+            ocr_confidence: Confidence easyocr gave the number
+        '''
+        if ocr_confidence < self.glyph_learning_confidence or not self.digit_reader.needs_glyphs(hp):
+            return
+
+        text = self.reader.readtext(rgb_screenshot)
+        if text and str(text[0][1]) == hp and self.digit_reader.save_glyphs(screenshot, hp):
+            tracer.count("learned_glyphs")
+
+    def read_tower_region(self, frame: Frame, name: str, tower_region: tuple[int, int, int, int]) -> int:
+        '''
+        Reads the hp of a tower, reusing the last value if the hp bar has not changed
+
+        Parameters:
+            frame: The frame to read from
+
+            name: Name of the tower region used by the region tracker
+
+            tower_region: Screen region (left, top, right, bottom) of the tower hp number
+
+        Returns:
+            hp: The hp of the tower, 0 if no number could be read
+        '''
+        unchanged, hp = self.region_tracker.lookup(name, frame.crop(tower_region, frame.gray))
+        if unchanged:
+            return hp
+
+        return self.region_tracker.store(name, self.read_tower_hp(frame.crop(tower_region)))
+
+    @traced("Screen.get_tower_hp")
+    def get_tower_hp(self, frame: Frame | None = None) -> tuple[list[int], list[int]]:
+        '''
+        Crops each crown tower hp bar out of the frame and reads the number values
+
+        Parameters:
+            frame: The frame to read from, if None then a new frame is captured
 
         Returns:
             ally_tower_hp: List containing each ally tower hp value
 
             enemy_tower_hp: List containing each enemy tower hp value
         '''
-        ally_tower_hp = []
-        enemy_tower_hp = []
-
-        for tower_region in self.ally_tower_hp_regions:
-            screenshot = self.take_screenshot(tower_region)
-            # Change to RGB as easyocr seems to work better in RGB
-            screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2RGB)
-            # Sharpen the image to pronounce the edges of the numbers
-            screenshot = cv2.filter2D(screenshot, -1, self.kernel)
-
-            # Extract the hp if digits are found
-            text = self.reader.readtext(screenshot)
-            if text:
-                hp = str(text[0][1])
-                if hp.isdigit():
-                    ally_tower_hp.append(int(hp))
-                else:
-                    ally_tower_hp.append(0)
-            else:
-                ally_tower_hp.append(0)
-
-        for tower_region in self.enemy_tower_hp_regions:
-            screenshot = self.take_screenshot(tower_region)
-            # Change to RGB as easyocr seems to work better in RGB
-            screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2RGB)
-            # Sharpen the image to pronounce the edges of the numbers
-            screenshot = cv2.filter2D(screenshot, -1, self.kernel)
-
-            # Extract the hp if digits are found
-            text = self.reader.readtext(screenshot)
-            if text:
-                hp = str(text[0][1])
-                if hp.isdigit():
-                    enemy_tower_hp.append(int(hp))
-                else:
-                    enemy_tower_hp.append(0)
-            else:
-                enemy_tower_hp.append(0)
+        if frame is None:
+            frame = self.capture_frame()
 
+        tower_hp = self.perception_cache.get("tower_hp", frame)
+        if tower_hp is not None:
+            return tower_hp
+
+        ally_tower_hp = [self.read_tower_region(frame, "ally_tower_{}".format(tower), tower_region)
+                         for tower, tower_region in enumerate(self.ally_tower_hp_regions)]
+        enemy_tower_hp = [self.read_tower_region(frame, "enemy_tower_{}".format(tower), tower_region)
+                          for tower, tower_region in enumerate(self.enemy_tower_hp_regions)]
 
         # If king tower has 0 hp then set it to max as it is not activated yet
         if ally_tower_hp[2] == 0:
@@ -314,51 +548,109 @@ class Screen():
         if enemy_tower_hp[2] == 0:
             enemy_tower_hp[2] = 2568
 
-        return ally_tower_hp, enemy_tower_hp
+        return self.perception_cache.put("tower_hp", frame, (ally_tower_hp, enemy_tower_hp))
     
-    def get_elixir_count(self) -> int:
+    @traced("Screen.get_elixir_count")
+    def get_elixir_count(self, frame: Frame | None = None) -> int:
         '''
         Gets the current elixir count of the player by checking pixel colours in the elixir bar
 
+        Parameters:
+            frame: The frame to read from, if None then a new frame is captured
+
         Returns:
             elixir_count: Integer amount of elixir the player has
         '''
-        # Check pixels from right hand side of elixir bar so start at 10 elixir
-        elixir_count = 10
-
-        # Move back an elixir_bar_width each time we can't detect the players elixir
-        for i in range(0, 10):
-            x = self.elixir_bar_location[0] - (i * self.elixir_bar_width)
-            y = self.elixir_bar_location[1]
-
-            #TODO: Could maybe take a single screenshot and get multiple pixel values at once to improve efficiency
-            # This pixel colour is the background of the elixir bar so if false then we return the elixir amount
-            if pyautogui.pixelMatchesColor(x, y, (5,53,122), tolerance=50):
-                elixir_count -= 1
-            else:
-                return elixir_count
-            
-        return 0
+        if frame is None:
+            frame = self.capture_frame()
 
-    def detect_troops(self) -> list[Results]:
+        elixir_count = self.perception_cache.get("elixir", frame)
+        if elixir_count is not None:
+            return elixir_count
+
+        # Read one pixel per elixir from right hand side of elixir bar to the left
+        # The bar width is scaled to the window so the positions are rounded back to whole pixels
+        xs = np.round(self.elixir_bar_location[0] - (np.arange(10) * self.elixir_bar_width)).astype(np.intp)
+        ys = np.full(10, self.elixir_bar_location[1], dtype=np.intp)
+        pixels = frame.pixels(xs, ys)[:, :3].astype(np.int16)
+
+        # This pixel colour is the background of the elixir bar, same tolerance check as pyautogui.pixelMatchesColor
+        # The camera returns RGB frames so the channels are in the same order as the colour
+        is_background = np.all(np.abs(pixels - np.array([5, 53, 122])) <= 50, axis=1)
+
+        # Every background pixel counted from the right is one elixir the player does not have, none if the whole bar is background
+        elixir_count = 0 if is_background.all() else 10 - int(np.argmin(is_background))
+
+        return self.perception_cache.put("elixir", frame, elixir_count)
+
+    @traced("Screen.detect_troops")
+    def detect_troops(self, frame: Frame | None = None) -> Detections:
         '''
-        Takes a screenshot of the current game screen and uses the machine learning model to predict where troops are on the screen
+        Uses the machine learning model to predict where troops are in the frame
+
+        Parameters:
+            frame: The frame to read from, if None then a new frame is captured
 
         Returns:
-            results: List containing the information for each detected troop
+            detections: The boxes, classes and confidences of each detected troop scaled to the reference window
         '''
-        screenshot = self.take_screenshot()
-        screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2RGB)
-        results = self.model.predict(source=screenshot, stream=True, conf=0.4, verbose=False)
+        if frame is None:
+            frame = self.capture_frame()
+
+        # The tracker must only see each frame once so detections are always reused for the same frame
+        detections = self.perception_cache.get("troops", frame)
+        if detections is not None:
+            return detections
+
+        if self.tracker is None:
+            detections = self.run_detector(frame)
+        elif not self.tracker.needs_detection():
+            # Troops are extrapolated from their last detection until the tracker needs the detector again
+            tracer.count("skipped_detections")
+            detections = self.tracker.predict(frame.timestamp)
+        else:
+            detections = self.tracker.update(self.run_detector(frame), frame.timestamp)
 
-        return results
+        return self.perception_cache.put("troops", frame, detections)
 
-        # These comments are left in for future reference about where data is held in the result
-        # for result in results:
-        #     result.show()
-            # print(result.boxes.xywh)
-            # print(result.boxes.cls)
-            # print(result.boxes.cls[0].item())
-            # print(result.boxes.xywh[0].numpy())
+    @traced("Screen.run_detector")
+    def run_detector(self, frame: Frame) -> Detections:
+        '''
+        Runs the troop detector on a frame
+
+        Parameters:
+            frame: The frame to detect troops in
+
+        Returns:
+            detections: The boxes, classes and confidences of each detected troop scaled to the reference window
+        '''
+        # Nothing has moved on a board that looks the same so the last detections still hold
+        unchanged, detections = self.region_tracker.lookup("board", frame.crop(self.board_region, frame.gray), self.detector,
+                                                           self.board_thumbnail_size)
+        if unchanged:
+            return detections
+
+        if not self.crop_detections:
+            return self.region_tracker.store("board", self.to_reference(self.detector.detect(frame.rgb)))
+
+        # Troops can only be on the board so the rest of the frame is not given to the model
+        detections = self.detector.detect(frame.crop(self.board_region, frame.rgb))
+        detections.boxes[:, 0] += max(self.board_region[0] - self.region[0], 0)
+        detections.boxes[:, 1] += max(self.board_region[1] - self.region[1], 0)
+
+        return self.region_tracker.store("board", self.to_reference(detections))
+
+    def to_reference(self, detections: Detections) -> Detections:
+        '''
+        Scales detections to the size of the reference window so observations and troop speeds do not depend on the window size
+
+        Parameters:
+            detections: Detections in the coordinates of the frame
+
+        Returns:
+            detections: The same detections with their boxes scaled in place
+        '''
+        detections.boxes[:, [0, 2]] /= self.layout.scale_x
+        detections.boxes[:, [1, 3]] /= self.layout.scale_y
 
-            # print("there is a : {} at position: x = {}, y = {}".format(result.names[result.boxes.cls[0].item()], result.boxes.xywh[0][0], result.boxes.xywh[0][1]))
+        return detections
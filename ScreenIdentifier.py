@@ -0,0 +1,212 @@
+import os
+import json
+import cv2
+from cv2.typing import MatLike
+import numpy as np
+
+class ScreenIdentifier:
+    '''
+    Index of where each screen identifier appears on the screen with a cheap hash of that region so screens can be identified without full screen template matching
+    '''
+
+    def __init__(self, identifiers: dict[str, MatLike], index_path: str = "screen_identifier_index.json", threshold: float = 0.8,
+                 max_distance: int = 10, padding: int = 10):
+        '''
+        Parameters:
+            identifiers: Dictionary where key is the screen name and value is the grayscale image of the screen identifier
+
+            index_path: File the index is saved to so regions are only searched for once
+
+            threshold: Minimum template match value for an identifier to be counted as found
+
+            max_distance: Maximum number of differing hash bits for a region to be counted as showing the identifier
+
+            padding: Pixels added around an indexed region when confirming with template matching
+        '''
+        self.identifiers = identifiers
+        self.index_path = index_path
+        self.threshold = threshold
+        self.max_distance = max_distance
+        self.padding = padding
+
+        # Dictionary where key is the screen name and value holds the region (left, top, right, bottom), hash and screenshot size
+        self.index = self.load_index()
+
+    def load_index(self) -> dict[str, dict]:
+        '''
+        Loads the saved index if there is one
+
+        Returns:
+            index: Dictionary where key is the screen name and value is the indexed region and hash
+        '''
+        if not os.path.exists(self.index_path):
+            return {}
+
+        with open(self.index_path, "r") as index_file:
+            index = json.load(index_file)
+
+        # Only keep identifiers that still exist
+        return {name: entry for name, entry in index.items() if name in self.identifiers}
+
+    def save_index(self):
+        '''
+        Saves the index so later runs can skip searching for identifiers
+        '''
+        # Several workers can save at once so each writes its own file and swaps it in
+        temporary_path = "{}.{}.tmp".format(self.index_path, os.getpid())
+        with open(temporary_path, "w") as index_file:
+            index_file.write(json.dumps(self.index, indent=4))
+        os.replace(temporary_path, self.index_path)
+
+    def region_hash(self, image: MatLike) -> int:
+        '''
+        Computes a 64 bit difference hash of an image that survives small changes in brightness and noise
+
+        Parameters:
+            image: Grayscale image to hash
+
+        Returns:
+            hash: Integer where each bit is whether a pixel is brighter than its right neighbour in an 9x8 version of the image
+        '''
+        small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+        bits = small[:, 1:] > small[:, :-1]
+
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    def indexed_entry(self, gray_screenshot: MatLike, name: str) -> dict | None:
+        '''
+        Gets the index entry of an identifier if it was recorded for a screenshot of the same size
+
+        Parameters:
+            gray_screenshot: Grayscale screenshot the entry will be used on
+
+            name: Name of the screen identifier
+
+        Returns:
+            entry: The index entry or None if the identifier has not been indexed for this screenshot size
+        '''
+        entry = self.index.get(name)
+        if entry is None or tuple(entry["shape"]) != gray_screenshot.shape[:2]:
+            return None
+
+        return entry
+
+    def locate(self, gray_screenshot: MatLike, name: str) -> tuple[float, tuple[int, int]]:
+        '''
+        Searches the whole screenshot for an identifier
+
+        Parameters:
+            gray_screenshot: Grayscale screenshot to search
+
+            name: Name of the screen identifier
+
+        Returns:
+            max_val: The best template match value
+
+            max_loc: Top left location of the best match
+        '''
+        result = cv2.matchTemplate(gray_screenshot, self.identifiers[name], cv2.TM_CCOEFF_NORMED)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+
+        return max_val, max_loc
+
+    def add_to_index(self, gray_screenshot: MatLike, name: str, location: tuple[int, int]):
+        '''
+        Records where an identifier was found along with the hash of that region
+
+        Parameters:
+            gray_screenshot: Grayscale screenshot the identifier was found in
+
+            name: Name of the screen identifier
+
+            location: Top left location of the identifier
+        '''
+        height, width = self.identifiers[name].shape[:2]
+        region = [location[0], location[1], location[0] + width, location[1] + height]
+        crop = gray_screenshot[region[1]:region[3], region[0]:region[2]]
+
+        self.index[name] = {"region": region, "hash": self.region_hash(crop), "shape": list(gray_screenshot.shape[:2])}
+        self.save_index()
+
+    def confirm(self, gray_screenshot: MatLike, name: str, entry: dict) -> bool:
+        '''
+        Template matches an identifier only around its indexed region
+
+        Parameters:
+            gray_screenshot: Grayscale screenshot to search
+
+            name: Name of the screen identifier
+
+            entry: Index entry of the identifier
+
+        Returns: True if the identifier is in its indexed region
+        '''
+        left, top, right, bottom = entry["region"]
+        crop = gray_screenshot[max(top - self.padding, 0):bottom + self.padding, max(left - self.padding, 0):right + self.padding]
+        result = cv2.matchTemplate(crop, self.identifiers[name], cv2.TM_CCOEFF_NORMED)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+
+        return max_val >= self.threshold
+
+    def is_present(self, gray_screenshot: MatLike, name: str) -> bool:
+        '''
+        Checks if an identifier is on the screen, only template matching around its region when it has been indexed
+
+        Parameters:
+            gray_screenshot: Grayscale screenshot to search
+
+            name: Name of the screen identifier
+
+        Returns: True if the identifier is on the screen
+        '''
+        entry = self.indexed_entry(gray_screenshot, name)
+
+        if entry is None:
+            # Not indexed yet so search the whole screen and remember where it was
+            max_val, max_loc = self.locate(gray_screenshot, name)
+            if max_val >= self.threshold:
+                self.add_to_index(gray_screenshot, name, max_loc)
+                return True
+            return False
+
+        # A close hash alone can match a different screen and a changed hash can come from the identifier moving a few pixels,
+        # so template matching around the indexed region decides either way
+        return self.confirm(gray_screenshot, name, entry)
+
+    def identify(self, gray_screenshot: MatLike) -> str:
+        '''
+        Gets the name of the screen shown, checking the indexed identifiers with the closest hashes first
+
+        Parameters:
+            gray_screenshot: Grayscale screenshot to identify
+
+        Returns:
+            menu_screen: The name of the screen identifier found or undefined if none are found
+        '''
+        candidates = []
+        for name in self.identifiers:
+            entry = self.indexed_entry(gray_screenshot, name)
+            if entry is None:
+                continue
+            left, top, right, bottom = entry["region"]
+            distance = (self.region_hash(gray_screenshot[top:bottom, left:right]) ^ entry["hash"]).bit_count()
+            if distance <= self.max_distance:
+                candidates.append((distance, name, entry))
+
+        # Hashes only pick the candidates, template matching around the region confirms them
+        for distance, name, entry in sorted(candidates, key=lambda candidate: candidate[0]):
+            if self.confirm(gray_screenshot, name, entry):
+                return name
+
+        # Nothing indexed is on screen so fall back to searching the whole screen for the rest
+        # Identifiers such as the menu bar can move between pages so indexed ones are searched again too
+        rejected = {candidate[1] for candidate in candidates}
+        for name in self.identifiers:
+            if name in rejected:
+                continue
+            max_val, max_loc = self.locate(gray_screenshot, name)
+            if max_val >= self.threshold:
+                self.add_to_index(gray_screenshot, name, max_loc)
+                return name
+
+        return "undefined"
@@ -0,0 +1,156 @@
+import time
+import threading
+from Metrics import tracer
+
+class StartupReport:
+    '''
+    Records how long each part of starting up took so slow starts can be narrowed down
+    '''
+
+    def __init__(self):
+        # Startup is measured from when this module was first imported
+        self.start_time = time.perf_counter()
+        # Each entry is (name, thread name, seconds since start when it began, seconds it took)
+        self.timings: list[tuple[str, str, float, float]] = []
+        # Seconds since start each milestone such as the first action was reached
+        self.milestones: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def record(self, name: str, start: float, duration: float):
+        '''
+        Records a finished part of startup
+
+        Parameters:
+            name: Name of what was loaded
+
+            start: Start time from time.perf_counter
+
+            duration: Seconds it took
+        '''
+        with self.lock:
+            self.timings.append((name, threading.current_thread().name, start - self.start_time, duration))
+
+    def milestone(self, name: str) -> bool:
+        '''
+        Records the first time a milestone is reached
+
+        Parameters:
+            name: Name of the milestone
+
+        Returns:
+            first: True if this is the first time the milestone was reached
+        '''
+        with self.lock:
+            if name in self.milestones:
+                return False
+            self.milestones[name] = time.perf_counter() - self.start_time
+
+        return True
+
+    def summary(self) -> str:
+        '''
+        Formats every timing and milestone as a table ordered by start time
+
+        Returns:
+            summary: The startup report
+        '''
+        with self.lock:
+            timings = sorted(self.timings, key=lambda timing: timing[2])
+            milestones = sorted(self.milestones.items(), key=lambda milestone: milestone[1])
+
+        lines = ["Startup timings (seconds)", "{:<28}{:<18}{:>8}{:>8}".format("resource", "thread", "start", "took")]
+        for name, thread_name, start, duration in timings:
+            lines.append("{:<28}{:<18}{:>8.2f}{:>8.2f}".format(name, thread_name[:17], start, duration))
+        for name, elapsed in milestones:
+            lines.append("{:<46}{:>8.2f}".format(name, elapsed))
+
+        return "\n".join(lines)
+
+# Shared report every module records its startup into
+startup_report = StartupReport()
+
+class LazyResource:
+    '''
+    Heavy resource such as a model that is only loaded when first needed, or earlier on a background thread when warmed up
+    '''
+
+    def __init__(self, name: str, loader):
+        '''
+        Parameters:
+            name: Name shown in the startup report
+
+            loader: Function without arguments that creates the resource
+        '''
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.error: BaseException | None = None
+        self.loaded = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def ready(cls, name: str, value) -> "LazyResource":
+        '''
+        Wraps a resource that has already been created
+
+        Parameters:
+            name: Name of the resource
+
+            value: The resource
+
+        Returns:
+            resource: Resource that never needs loading
+        '''
+        resource = cls(name, None)
+        resource.value = value
+        resource.loaded.set()
+
+        return resource
+
+    def load(self):
+        '''
+        Runs the loader and stores the resource or the error it raised
+        '''
+        start = time.perf_counter()
+        try:
+            with tracer.span("Startup.{}".format(self.name), "startup"):
+                self.value = self.loader()
+        except BaseException as error:
+            self.error = error
+        finally:
+            startup_report.record(self.name, start, time.perf_counter() - start)
+            self.loaded.set()
+
+    def warm_up(self):
+        '''
+        Starts loading the resource on a background thread if it has not started loading yet
+        '''
+        with self.lock:
+            if self.thread is not None or self.loaded.is_set():
+                return
+            self.thread = threading.Thread(target=self.load, name="WarmUp-{}".format(self.name), daemon=True)
+            self.thread.start()
+
+    def get(self):
+        '''
+        Gets the resource, loading it on this thread if it was never warmed up or waiting for the warm up to finish
+
+        Returns:
+            value: The resource
+        '''
+        if not self.loaded.is_set():
+            with self.lock:
+                start_here = self.thread is None and not self.loaded.is_set()
+                if start_here:
+                    # Marks the resource as being loaded so a warm up started now does not load it a second time
+                    self.thread = threading.current_thread()
+            if start_here:
+                self.load()
+            else:
+                self.loaded.wait()
+
+        if self.error is not None:
+            raise RuntimeError("Failed to load {}".format(self.name)) from self.error
+
+        return self.value
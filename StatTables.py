@@ -0,0 +1,70 @@
+import os
+import json
+import hashlib
+import numpy as np
+from numpy.typing import NDArray
+
+# Order of the values in the stat tables, the same order the observation stores them in
+CARD_STAT_NAMES = ["hp", "direct_damage", "splash_damage", "hit_speed", "speed", "melee_range", "range", "targets", "flying",
+                   "spell", "spell_radius", "troop_count", "elixir"]
+TROOP_STAT_NAMES = CARD_STAT_NAMES[:11]
+HP, DIRECT_DAMAGE, SPLASH_DAMAGE, HIT_SPEED, SPEED, MELEE_RANGE, RANGE, TARGETS, FLYING, SPELL, SPELL_RADIUS, TROOP_COUNT, ELIXIR = range(13)
+
+# Tiles per second for each speed category (none, slow, medium, fast, very fast)
+SPEED_TILES = np.array([0, 0.75, 1.0, 1.5, 2.0], dtype=np.float32)
+
+def compile_stat_table(json_path: str, stat_names: list[str]) -> tuple[list[str], NDArray]:
+    '''
+    Parses a stats json file into a table with a row for each card or troop
+
+    Parameters:
+        json_path: Path of the json file
+
+        stat_names: Names of the stats in the order of the table columns
+
+    Returns:
+        names: Name of each row
+
+        table: Array of shape (rows, stats)
+    '''
+    with open(json_path, "r") as stats_file:
+        stats = json.load(stats_file)
+
+    names = list(stats.keys())
+    table = np.array([[float(stats[name][stat]) for stat in stat_names] for name in names], dtype=np.float32).reshape(len(names), len(stat_names))
+
+    return names, table
+
+def load_stat_table(json_path: str, stat_names: list[str]) -> tuple[list[str], NDArray]:
+    '''
+    Loads the compiled table of a stats json file, compiling it again if the json has changed since it was cached
+
+    Parameters:
+        json_path: Path of the json file, the compiled table is cached next to it
+
+        stat_names: Names of the stats in the order of the table columns
+
+    Returns:
+        names: Name of each row
+
+        table: Read only array of shape (rows, stats)
+    '''
+    with open(json_path, "rb") as stats_file:
+        source_hash = hashlib.sha1(stats_file.read()).hexdigest()
+    cache_path = os.path.splitext(json_path)[0] + ".npz"
+
+    names, table = None, None
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            if str(cache["source_hash"]) == source_hash and list(cache["stat_names"]) == stat_names:
+                names = [str(name) for name in cache["names"]]
+                table = np.ascontiguousarray(cache["table"])
+
+    if table is None:
+        names, table = compile_stat_table(json_path, stat_names)
+        np.savez(cache_path, source_hash=source_hash, stat_names=np.array(stat_names), names=np.array(names), table=table)
+
+    # Rows are handed out as views so they must not be changed by whoever uses them
+    table.flags.writeable = False
+
+    return names, table
@@ -0,0 +1,305 @@
+import time
+from collections import deque
+import cv2
+import numpy as np
+from Frame import Frame
+from Screen import Screen
+from TemplateBank import TemplateBank
+from Metrics import traced
+
+class StepCondition:
+    '''
+    Base class for something the environment can wait for after acting
+    '''
+    name = "condition"
+
+    def met(self, frame: Frame) -> bool:
+        '''
+        Checks if the condition is true in a frame
+
+        Parameters:
+            frame: The frame to check
+
+        Returns: True if the step can finish
+        '''
+        raise NotImplementedError
+
+class CardLeftHand(StepCondition):
+    '''
+    True once the played card is no longer in its hand slot
+    '''
+    name = "card_left_hand"
+
+    def __init__(self, screen: Screen, deck_info: TemplateBank, slot: int, card_name: str):
+        self.screen = screen
+        self.deck_info = deck_info
+        self.slot = slot
+        self.card_name = card_name
+
+    def met(self, frame: Frame) -> bool:
+        return self.screen.get_cards_in_hand(self.deck_info, frame)[self.slot] != self.card_name
+
+class ElixirDropped(StepCondition):
+    '''
+    True once the players elixir is lower than it was before acting
+    '''
+    name = "elixir_dropped"
+
+    def __init__(self, screen: Screen, elixir: int):
+        self.screen = screen
+        self.elixir = elixir
+
+    def met(self, frame: Frame) -> bool:
+        return self.screen.get_elixir_count(frame) < self.elixir
+
+class BoardChanged(StepCondition):
+    '''
+    True once the board looks different enough from how it looked before acting
+    '''
+    name = "board_changed"
+
+    def __init__(self, reference: Frame, board_region: tuple[int, int, int, int], threshold: float):
+        '''
+        Parameters:
+            reference: Frame from before acting
+
+            board_region: Region (left, top, right, bottom) of the board in screen coordinates
+
+            threshold: Mean grayscale difference of the downsampled board that counts as a change
+        '''
+        self.board_region = board_region
+        self.threshold = threshold
+        self.reference = self.board_thumbnail(reference)
+
+    def board_thumbnail(self, frame: Frame) -> np.ndarray:
+        '''
+        Gets a small grayscale image of the board that ignores noise from single pixels
+
+        Parameters:
+            frame: The frame to take the board from
+
+        Returns:
+            thumbnail: Downsampled board
+        '''
+        board = frame.crop(self.board_region, frame.gray)
+        return cv2.resize(board, (64, 64), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def met(self, frame: Frame) -> bool:
+        return np.abs(self.board_thumbnail(frame) - self.reference).mean() > self.threshold
+
+class HandShown(StepCondition):
+    '''
+    True once every hand slot shows a card
+    '''
+    name = "hand_shown"
+
+    def __init__(self, screen: Screen, deck_info: TemplateBank):
+        self.screen = screen
+        self.deck_info = deck_info
+
+    def met(self, frame: Frame) -> bool:
+        return "empty" not in self.screen.get_cards_in_hand(self.deck_info, frame)
+
+class ScreenShown(StepCondition):
+    '''
+    True once a screen identifier can be found anywhere on screen
+    '''
+    name = "screen_shown"
+
+    def __init__(self, screen: Screen, identifier: str):
+        self.screen = screen
+        self.identifier = identifier
+
+    def met(self, frame: Frame) -> bool:
+        max_val, max_loc = self.screen.screen_identifier.locate(frame.gray, self.identifier)
+        return max_val >= self.screen.screen_identifier.threshold
+
+class StepScheduler:
+    '''
+    Decides how long a step waits after acting by watching new frames until a condition is met instead of sleeping for a fixed time
+    '''
+
+    def __init__(self, screen: Screen, conditions: tuple[str, ...] = ("card_left_hand", "elixir_dropped"), min_wait: float = 0.2,
+                 max_wait: float = 2, idle_wait: float = 0.5, poll_interval: float = 0.05, board_threshold: float = 8, history: int = 1000):
+        '''
+        Parameters:
+            screen: Screen used to read the frames
+
+            conditions: Names of the conditions that can end a step, any of card_left_hand, elixir_dropped and board_changed
+
+            min_wait: Seconds always waited so the game can react to the clicks
+
+            max_wait: Seconds after which a step ends even if no condition was met
+
+            idle_wait: Seconds waited when no card was played and board_changed is not used
+
+            poll_interval: Maximum seconds between checking frames
+
+            board_threshold: Mean grayscale difference of the board that counts as a change
+
+            history: Number of recent waits kept for reporting
+        '''
+        self.screen = screen
+        self.conditions = conditions
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.idle_wait = idle_wait
+        self.poll_interval = poll_interval
+        self.board_threshold = board_threshold
+
+        # Seconds waited and the condition that ended each recent step
+        self.wait_times = deque(maxlen=history)
+        self.finished_by = {}
+
+    @traced("StepScheduler.wait", "sleep")
+    def wait(self, conditions: list[StepCondition], started: float, max_wait: float, poll_interval: float | None = None) -> tuple[Frame, str]:
+        '''
+        Waits until any condition is met in a frame captured after the minimum wait or the maximum wait has passed
+
+        Parameters:
+            conditions: Conditions that end the wait
+
+            started: Time the wait is measured from
+
+            max_wait: Seconds after which the wait ends even if no condition was met
+
+            poll_interval: Maximum seconds between checking frames, if None then the scheduler poll interval is used
+
+        Returns:
+            frame: The frame the wait ended on, later readers should use it for the observation
+
+            finished_by: Name of the condition that ended the wait or deadline
+        '''
+        if poll_interval is None:
+            poll_interval = self.poll_interval
+
+        deadline = started + max_wait
+        after = started + min(self.min_wait, max_wait)
+        time.sleep(max(after - time.time(), 0))
+
+        while True:
+            if self.screen.capture.wait_for_frame(after, poll_interval) is not None:
+                # Check the newest frame as more may have arrived while the last one was being checked
+                frame = self.screen.capture.latest()
+                after = frame.timestamp
+                for condition in conditions:
+                    if condition.met(frame):
+                        return frame, condition.name
+
+            if time.time() >= deadline:
+                return self.screen.capture_frame(), "deadline"
+
+    def wait_after_move(self, started: float, reference: Frame, board_region: tuple[int, int, int, int], deck_info: TemplateBank,
+                        card_name: str | None = None, slot: int = 0, elixir: int = 0) -> Frame:
+        '''
+        Waits after the AI acted until the configured conditions show the game has reacted
+
+        Parameters:
+            started: Time the move was made
+
+            reference: Frame from before the move
+
+            board_region: Region (left, top, right, bottom) of the board in screen coordinates
+
+            deck_info: Template bank containing the cards in the players deck
+
+            card_name: Name of the card played or None if nothing was played
+
+            slot: Index of the hand slot the card was played from
+
+            elixir: Elixir the player had before the move
+
+        Returns:
+            frame: The frame the wait ended on
+        '''
+        conditions = []
+        if card_name is not None and "card_left_hand" in self.conditions:
+            conditions.append(CardLeftHand(self.screen, deck_info, slot, card_name))
+        if card_name is not None and "elixir_dropped" in self.conditions:
+            conditions.append(ElixirDropped(self.screen, elixir))
+        if "board_changed" in self.conditions:
+            conditions.append(BoardChanged(reference, board_region, self.board_threshold))
+
+        # Nothing can end the step early so only wait the idle time
+        max_wait = self.max_wait if conditions else self.idle_wait
+
+        frame, finished_by = self.wait(conditions, started, max_wait)
+        self.record(started, finished_by)
+
+        return frame
+
+    def wait_for(self, condition: StepCondition, timeout: float, poll_interval: float | None = None) -> Frame:
+        '''
+        Waits until a single condition is met, such as the hand being shown at the start of a game
+
+        Parameters:
+            condition: Condition that ends the wait
+
+            timeout: Maximum seconds to wait
+
+            poll_interval: Maximum seconds between checking frames, if None then the scheduler poll interval is used
+
+        Returns:
+            frame: The frame the wait ended on
+        '''
+        started = time.time()
+        frame, finished_by = self.wait([condition], started, timeout, poll_interval)
+        self.record(started, finished_by)
+
+        return frame
+
+    def wait_for_screen(self, identifier: str, timeout: float) -> Frame:
+        '''
+        Waits until a screen identifier is shown such as the winner screen at the end of a game
+
+        Parameters:
+            identifier: Name of the screen identifier
+
+            timeout: Maximum seconds to wait
+
+        Returns:
+            frame: The frame the wait ended on
+        '''
+        # Searching the whole screen is slow so frames are checked less often
+        return self.wait_for(ScreenShown(self.screen, identifier), timeout, max(self.poll_interval, 0.25))
+
+    def record(self, started: float, finished_by: str):
+        '''
+        Records how long a wait took and what ended it
+
+        Parameters:
+            started: Time the wait started
+
+            finished_by: Name of the condition that ended the wait or deadline
+        '''
+        self.wait_times.append(time.time() - started)
+        self.finished_by[finished_by] = self.finished_by.get(finished_by, 0) + 1
+
+    @property
+    def last_wait(self) -> float:
+        '''
+        Seconds the most recent wait took
+        '''
+        return self.wait_times[-1] if self.wait_times else 0.0
+
+    def stats(self) -> dict[str, float]:
+        '''
+        Gets statistics of the recent waits
+
+        Returns:
+            stats: Mean, median, 95th percentile and maximum wait in seconds along with how many waits each condition ended
+        '''
+        if not self.wait_times:
+            return {}
+
+        wait_times = np.array(self.wait_times)
+        stats = {
+            "mean_wait": float(wait_times.mean()),
+            "p50_wait": float(np.percentile(wait_times, 50)),
+            "p95_wait": float(np.percentile(wait_times, 95)),
+            "max_wait": float(wait_times.max()),
+        }
+        for finished_by, count in self.finished_by.items():
+            stats["finished_by_{}".format(finished_by)] = count
+
+        return stats
@@ -0,0 +1,99 @@
+import cv2
+from cv2.typing import MatLike
+
+class TemplateBank:
+    '''
+    Holds every card image already resized for each screen the cards are matched on so templates are only resized once
+    '''
+
+    def __init__(self, card_info: dict[str, MatLike], scales: dict[str, float] | None = None, templates: dict[str, dict[str, MatLike]] | None = None):
+        '''
+        Parameters:
+            card_info: Dictionary where key is the card name and value is the grayscale image of the card
+
+            scales: Dictionary where key is the screen context and value is the amount of resizing needed to detect cards on it
+
+            templates: Already resized templates for each context, only used when creating a subset of another bank
+        '''
+        self.card_info = card_info
+
+        if scales is None:
+            # The amount of resizing needed to detect cards on the battle screen and on the deck screen
+            scales = {"battle": 1.15, "collection": 1.35}
+        self.scales = scales
+
+        if templates is None:
+            templates = {}
+            for context, scale in scales.items():
+                templates[context] = {}
+                for card_name in card_info:
+                    templates[context][card_name] = cv2.resize(card_info[card_name], (0, 0), fx=scale, fy=scale)
+        self.templates = templates
+
+    @property
+    def card_names(self) -> list[str]:
+        '''
+        Names of the cards in the bank in a stable order
+        '''
+        return list(self.card_info.keys())
+
+    def subset(self, card_names: list[str]) -> "TemplateBank":
+        '''
+        Creates a bank only containing some of the cards, such as the cards in the players deck, without resizing again
+
+        Parameters:
+            card_names: Names of the cards to keep in the order they should be stored
+
+        Returns:
+            template_bank: Bank containing only the given cards
+        '''
+        card_info = {card_name: self.card_info[card_name] for card_name in card_names}
+        templates = {}
+        for context in self.templates:
+            templates[context] = {card_name: self.templates[context][card_name] for card_name in card_names}
+
+        return TemplateBank(card_info, self.scales, templates)
+
+    def match(self, gray_image: MatLike, context: str, roi: tuple[int, int, int, int] | None = None, threshold: float = 0.8,
+              max_matches: int | None = None) -> list[tuple[str, float, tuple[int, int]]]:
+        '''
+        Matches the templates of a screen context against an image, only searching inside the region of interest
+
+        Parameters:
+            gray_image: Grayscale image to search in
+
+            context: Screen context which decides the scale of the templates
+
+            roi: Region (left, top, right, bottom) of the image to search in, if None then the whole image is searched
+
+            threshold: Minimum match value for a card to be counted as found
+
+            max_matches: Stop searching once this many cards are found, if None then all cards are searched
+
+        Returns:
+            matches: List of the card name, match value and top left location in image coordinates for each card found
+        '''
+        offset = (0, 0)
+        if roi is not None:
+            search_image = gray_image[max(roi[1], 0):roi[3], max(roi[0], 0):roi[2]]
+            offset = (max(roi[0], 0), max(roi[1], 0))
+        else:
+            search_image = gray_image
+
+        matches = []
+        for card_name, template in self.templates[context].items():
+            # Search the whole image if the region is too small for the template
+            if search_image.shape[0] < template.shape[0] or search_image.shape[1] < template.shape[1]:
+                image, image_offset = gray_image, (0, 0)
+            else:
+                image, image_offset = search_image, offset
+
+            result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            if max_val >= threshold:
+                # Detected a card
+                matches.append((card_name, max_val, (max_loc[0] + image_offset[0], max_loc[1] + image_offset[1])))
+                if max_matches is not None and len(matches) >= max_matches:
+                    break
+
+        return matches
@@ -0,0 +1,269 @@
+import numpy as np
+from numpy.typing import NDArray
+from DetectorBackend import Detections, box_iou
+from StatTables import SPEED_TILES
+
+# Width of a board tile in pixels, used to turn troop speeds into pixels per second
+TILE_PIXELS = (1215 - 705) / 18
+
+class TroopTracker:
+    '''
+    Keeps troops identified between frames by matching detections to moving boxes so the detector does not have to run every frame
+    '''
+
+    def __init__(self, troop_speeds: dict[str, float] | None = None, detect_interval: int = 3, iou_threshold: float = 0.3,
+                 max_missed: int = 2, min_confidence: float = 0.4, confidence_decay: float = 0.85, velocity_smoothing: float = 0.5):
+        '''
+        Parameters:
+            troop_speeds: Dictionary where key is the troop name and value is its speed stat, used to limit how fast a troop can be tracked moving
+
+            detect_interval: The detector runs at least once every this many frames
+
+            iou_threshold: Minimum overlap between a detection and where a troop is expected to be for them to be the same troop
+
+            max_missed: Number of detections in a row a troop can be missing from before it is forgotten
+
+            min_confidence: The detector runs early when any troop's confidence falls below this
+
+            confidence_decay: Confidence of a troop is multiplied by this for every frame it is extrapolated without a detection
+
+            velocity_smoothing: Weight of the newest velocity measurement, the rest comes from the previous velocity
+        '''
+        self.troop_speeds = troop_speeds if troop_speeds is not None else {}
+        self.detect_interval = detect_interval
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.min_confidence = min_confidence
+        self.confidence_decay = confidence_decay
+        self.velocity_smoothing = velocity_smoothing
+
+        # Maximum pixels per second of each detector class, built from the class names of the first detections
+        self.class_speeds: NDArray | None = None
+        self.names: dict[int, str] = {}
+
+        # Id given to the next new troop, ids are never reused
+        self.next_id = 0
+
+        # Number of frames that were detected and extrapolated, used to report how many detector calls were saved
+        self.detected_frames = 0
+        self.extrapolated_frames = 0
+
+        self.reset()
+
+    def reset(self):
+        '''
+        Forgets every troop, used when a new game starts
+        '''
+        # Every tracked troop, one row each
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.classes = np.zeros(0, dtype=np.int64)
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocities = np.zeros((0, 2), dtype=np.float32)
+        self.confidences = np.zeros(0, dtype=np.float32)
+        self.first_seen = np.zeros(0, dtype=np.float64)
+        self.last_seen = np.zeros(0, dtype=np.float64)
+        self.missed = np.zeros(0, dtype=np.int64)
+
+        self.last_detection_time: float | None = None
+        self.frames_since_detection = 0
+
+    def build_class_speeds(self, names: dict[int, str]) -> NDArray:
+        '''
+        Finds the maximum speed of every detector class
+
+        Parameters:
+            names: Dictionary where key is the class id and value is the class name such as ally_knight
+
+        Returns:
+            class_speeds: Pixels per second of each class, infinite when the troop speed is not known
+        '''
+        class_speeds = np.full(max(names, default=-1) + 1, np.inf, dtype=np.float32)
+        for class_id, class_name in names.items():
+            troop_name = str(class_name).partition("_")[2]
+            if troop_name in self.troop_speeds:
+                # Allow some leeway as detected boxes jump around a little
+                class_speeds[class_id] = 1.5 * SPEED_TILES[int(self.troop_speeds[troop_name])] * TILE_PIXELS + TILE_PIXELS
+
+        return class_speeds
+
+    def needs_detection(self) -> bool:
+        '''
+        Checks whether the detector should run for the next frame
+
+        Returns:
+            needs_detection: True if nothing has been detected yet, the detect interval has passed or a troop is no longer trusted
+        '''
+        if self.last_detection_time is None or self.frames_since_detection + 1 >= self.detect_interval:
+            return True
+
+        return bool(np.any(self.current_confidences(1) < self.min_confidence))
+
+    def current_confidences(self, extra_frames: int = 0) -> NDArray:
+        '''
+        Gets how much each troop is trusted after being extrapolated
+
+        Parameters:
+            extra_frames: Frames of extrapolation on top of those already done
+
+        Returns:
+            confidences: Confidence of each troop
+        '''
+        return self.confidences * self.confidence_decay ** (self.frames_since_detection + extra_frames)
+
+    def predicted_boxes(self, timestamp: float) -> NDArray:
+        '''
+        Extrapolates where each troop is from its velocity
+
+        Parameters:
+            timestamp: Time to extrapolate to
+
+        Returns:
+            boxes: Array of shape (troops, 4) with the expected centre x, centre y, width and height of each troop
+        '''
+        boxes = self.boxes.copy()
+        boxes[:, :2] += self.velocities * (timestamp - self.last_seen)[:, np.newaxis]
+
+        return boxes
+
+    def update(self, detections: Detections, timestamp: float) -> Detections:
+        '''
+        Matches new detections to the tracked troops
+
+        Parameters:
+            detections: Output of the detector for the frame
+
+            timestamp: Time the frame was captured
+
+        Returns:
+            detections: The detections with the id, velocity and age of each troop
+        '''
+        if self.class_speeds is None or detections.names != self.names:
+            self.names = detections.names
+            self.class_speeds = self.build_class_speeds(detections.names)
+
+        predicted = self.predicted_boxes(timestamp)
+        iou = box_iou(detections.boxes, predicted)
+
+        # A troop can also match a detection it could have walked to since it was last seen, which catches small fast troops
+        elapsed = timestamp - self.last_seen
+        speeds = np.where(np.isfinite(self.class_speeds[self.classes]), self.class_speeds[self.classes], 0) if len(self.ids) else np.zeros(0)
+        reach = speeds * elapsed + self.boxes[:, 2:].max(axis=1, initial=0) / 2
+        distance = np.linalg.norm(detections.boxes[:, np.newaxis, :2] - predicted[np.newaxis, :, :2], axis=2)
+        # Troops can only match detections of the same class
+        candidates = (detections.classes[:, np.newaxis] == self.classes[np.newaxis, :]) & ((iou >= self.iou_threshold) | (distance <= reach))
+        scores = np.where(candidates, iou + 1 - np.minimum(distance / np.maximum(reach, 1e-6), 1), -1)
+
+        # Greedily pair the best scoring detection and troop until no pairs are left
+        matched_detections = np.full(len(detections), -1, dtype=np.int64)
+        if scores.size:
+            order = np.argsort(-scores, axis=None)
+            used_tracks = np.zeros(len(self.ids), dtype=bool)
+            for detection, track in zip(*np.unravel_index(order, scores.shape)):
+                if scores[detection, track] < 0:
+                    break
+                if matched_detections[detection] >= 0 or used_tracks[track]:
+                    continue
+                matched_detections[detection] = track
+                used_tracks[track] = True
+
+        # Matched troops take the detected box and blend the measured velocity into their velocity
+        matched = matched_detections >= 0
+        tracks = matched_detections[matched]
+        elapsed = np.maximum(timestamp - self.last_seen[tracks], 1e-3)
+        measured = (detections.boxes[matched, :2] - self.boxes[tracks, :2]) / elapsed[:, np.newaxis]
+        velocities = self.velocity_smoothing * measured + (1 - self.velocity_smoothing) * self.velocities[tracks]
+        self.velocities[tracks] = self.limit_speed(velocities, self.classes[tracks])
+        self.boxes[tracks] = detections.boxes[matched]
+        self.confidences[tracks] = detections.confidences[matched]
+        self.last_seen[tracks] = timestamp
+        self.missed[tracks] = 0
+
+        # Troops that were not detected are kept at their extrapolated position for a few detections
+        missing = np.ones(len(self.ids), dtype=bool)
+        missing[tracks] = False
+        self.boxes[missing] = predicted[missing]
+        self.last_seen[missing] = timestamp
+        self.missed[missing] += 1
+        keep = self.missed <= self.max_missed
+
+        # New detections become new troops
+        new = ~matched
+        new_count = int(new.sum())
+        self.ids = np.concatenate([self.ids[keep], np.arange(self.next_id, self.next_id + new_count)])
+        self.classes = np.concatenate([self.classes[keep], detections.classes[new]])
+        self.boxes = np.concatenate([self.boxes[keep], detections.boxes[new]]).astype(np.float32)
+        self.velocities = np.concatenate([self.velocities[keep], np.zeros((new_count, 2), dtype=np.float32)])
+        self.confidences = np.concatenate([self.confidences[keep], detections.confidences[new]]).astype(np.float32)
+        self.first_seen = np.concatenate([self.first_seen[keep], np.full(new_count, timestamp)])
+        self.last_seen = np.concatenate([self.last_seen[keep], np.full(new_count, timestamp)])
+        self.missed = np.concatenate([self.missed[keep], np.zeros(new_count, dtype=np.int64)])
+        self.next_id += new_count
+
+        self.last_detection_time = timestamp
+        self.frames_since_detection = 0
+        self.detected_frames += 1
+
+        return self.tracked_detections(timestamp, self.missed == 0)
+
+    def predict(self, timestamp: float) -> Detections:
+        '''
+        Extrapolates every troop to a frame the detector did not run on
+
+        Parameters:
+            timestamp: Time the frame was captured
+
+        Returns:
+            detections: Where each troop is expected to be with its id, velocity and age
+        '''
+        self.frames_since_detection += 1
+        self.extrapolated_frames += 1
+
+        return self.tracked_detections(timestamp, self.missed == 0)
+
+    def tracked_detections(self, timestamp: float, visible: NDArray) -> Detections:
+        '''
+        Creates detections from the tracked troops
+
+        Parameters:
+            timestamp: Time of the frame
+
+            visible: Which troops to include, troops missing from the last detection are left out
+
+        Returns:
+            detections: The troops with their id, velocity in pixels per second and age in seconds
+        '''
+        return Detections(self.predicted_boxes(timestamp)[visible], self.classes[visible], self.current_confidences()[visible], self.names,
+                          self.ids[visible], self.velocities[visible], (timestamp - self.first_seen[visible]).astype(np.float32))
+
+    def limit_speed(self, velocities: NDArray, classes: NDArray) -> NDArray:
+        '''
+        Scales down velocities faster than the troop can move, which come from boxes jumping rather than movement
+
+        Parameters:
+            velocities: Array of shape (troops, 2) in pixels per second
+
+            classes: Class id of each troop
+
+        Returns:
+            velocities: The limited velocities
+        '''
+        speeds = np.linalg.norm(velocities, axis=1)
+        max_speeds = self.class_speeds[classes] if len(self.class_speeds) else np.full(len(classes), np.inf)
+        scale = np.minimum(1, max_speeds / np.maximum(speeds, 1e-6))
+
+        return (velocities * scale[:, np.newaxis]).astype(np.float32)
+
+    def stats(self) -> dict[str, float]:
+        '''
+        Summarises how often the detector was skipped
+
+        Returns:
+            stats: Frames detected and extrapolated, the fraction of frames the detector ran on and the troops being tracked
+        '''
+        frames = self.detected_frames + self.extrapolated_frames
+        return {
+            "detected_frames": self.detected_frames,
+            "extrapolated_frames": self.extrapolated_frames,
+            "detection_rate": self.detected_frames / frames if frames else 0.0,
+            "tracked_troops": len(self.ids),
+        }
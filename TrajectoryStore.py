@@ -0,0 +1,301 @@
+import os
+import json
+import queue
+import threading
+import numpy as np
+from numpy.typing import NDArray
+from Metrics import tracer
+
+class TrajectoryWriter:
+    '''
+    Streams every transition of the real game into append only column files on a background thread so games can be reused for offline training
+    '''
+
+    def __init__(self, directory: str, chunk_size: int = 4096, queue_size: int = 1024):
+        '''
+        Parameters:
+            directory: Folder the trajectories are saved in
+
+            chunk_size: Number of transitions stored in each chunk
+
+            queue_size: Number of transitions that can wait to be written before new ones are dropped
+        '''
+        self.directory = directory
+        self.chunk_size = chunk_size
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Dictionary where key is the column name and value is its dtype and shape of a single row, known from the first transition
+        self.columns: dict[str, tuple[str, list[int]]] | None = None
+
+        # Chunk currently being written and the open file of each of its columns
+        self.chunk = 0
+        self.chunk_rows = 0
+        self.column_files = {}
+
+        self.episode = 0
+        self.episode_step = 0
+
+        # A folder written by an earlier run is continued after its last chunk and game instead of being written over
+        self.resume()
+        self.written_transitions = 0
+        self.dropped_transitions = 0
+
+        # Transitions are written on a background thread so a step never waits for the disk
+        self.transition_queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run, name="TrajectoryWriter", daemon=True)
+        self.thread.start()
+
+    def chunk_path(self, chunk: int, column: str) -> str:
+        '''
+        Gets the path of a column file
+
+        Parameters:
+            chunk: Number of the chunk
+
+            column: Name of the column
+
+        Returns:
+            path: Path of the file
+        '''
+        return "{}/chunk_{:05d}.{}.bin".format(self.directory, chunk, column)
+
+    def resume(self):
+        '''
+        Continues the trajectories already saved in the folder, new transitions start a new chunk and a new game
+        '''
+        metadata_path = "{}/metadata.json".format(self.directory)
+        if not os.path.exists(metadata_path):
+            return
+
+        with open(metadata_path, "r") as metadata_file:
+            metadata = json.load(metadata_file)
+        if not metadata["columns"]:
+            return
+        self.columns = {name: (dtype, shape) for name, (dtype, shape) in metadata["columns"].items()}
+
+        # Chunks are counted from the files as a run that crashed may not have saved its last chunk in the metadata
+        while os.path.exists(self.chunk_path(self.chunk, "episodes")):
+            self.chunk += 1
+
+        for chunk in reversed(range(self.chunk)):
+            episodes = np.fromfile(self.chunk_path(chunk, "episodes"), dtype=self.columns["episodes"][0])
+            if len(episodes):
+                self.episode = int(episodes[-1]) + 1
+                break
+
+    def start_episode(self):
+        '''
+        Marks the start of a new game, called from reset
+        '''
+        if self.episode_step > 0:
+            self.episode += 1
+        self.episode_step = 0
+
+    def record(self, observation: NDArray, action, reward: float, next_observation: NDArray, terminated: bool, truncated: bool,
+               timestamp: float, frame_id: int = -1, invalid_move: bool = False, outcome: int = 0):
+        '''
+        Queues a transition to be written, dropping it if the writer has fallen behind
+
+        Parameters:
+            observation: Observation the action was chosen from
+
+            action: The action taken
+
+            reward: Reward given for the action, including the reward for winning or losing
+
+            next_observation: Observation after the action
+
+            terminated: Whether the game ended
+
+            truncated: Whether the game was cut short
+
+            timestamp: Time the action was made
+
+            frame_id: Id of the frame the next observation was read from, used to find the frame in a recorded session, -1 if unknown
+
+            invalid_move: Whether the action could not be played, stored so RewardEngine.score_batch can score the trajectory again
+
+            outcome: 1 if the game was won on this step, -1 if it was lost and 0 otherwise
+        '''
+        transition = {
+            "observations": np.asarray(observation, dtype=np.float32),
+            "actions": np.asarray(action, dtype=np.int64),
+            "rewards": np.float32(reward),
+            "next_observations": np.asarray(next_observation, dtype=np.float32),
+            "terminated": np.bool_(terminated),
+            "truncated": np.bool_(truncated),
+            "episodes": np.int64(self.episode),
+            "steps": np.int64(self.episode_step),
+            "timestamps": np.float64(timestamp),
+            "frame_ids": np.int64(frame_id),
+            "invalid_moves": np.bool_(invalid_move),
+            "outcomes": np.int8(outcome),
+        }
+        self.episode_step += 1
+
+        # Columns of an earlier run can not be mixed with different ones in the same folder
+        if self.columns is not None and set(self.columns) != set(transition):
+            raise ValueError("The trajectories in {} were saved with different columns, use a new folder".format(self.directory))
+
+        try:
+            self.transition_queue.put_nowait(transition)
+        except queue.Full:
+            self.dropped_transitions += 1
+            tracer.count("dropped_transitions")
+
+    def run(self):
+        '''
+        Writes queued transitions until a None is queued
+        '''
+        while True:
+            transition = self.transition_queue.get()
+            if transition is None:
+                break
+            self.write_transition(transition)
+
+            # Rows are flushed whenever the queue is empty so readers can see them while the game is still running
+            if self.transition_queue.empty():
+                for column_file in self.column_files.values():
+                    column_file.flush()
+
+        self.finish_chunk()
+
+    def write_transition(self, transition: dict[str, NDArray]):
+        '''
+        Appends a transition to every column of the current chunk
+
+        Parameters:
+            transition: Dictionary where key is the column name and value is the row
+        '''
+        if self.columns is None:
+            self.columns = {name: (value.dtype.str, list(value.shape)) for name, value in transition.items()}
+
+        if not self.column_files:
+            self.column_files = {name: open(self.chunk_path(self.chunk, name), "ab") for name in self.columns}
+            self.save_metadata()
+
+        for name, column_file in self.column_files.items():
+            column_file.write(np.ascontiguousarray(transition[name], dtype=self.columns[name][0]).tobytes())
+        self.chunk_rows += 1
+        self.written_transitions += 1
+
+        if self.chunk_rows >= self.chunk_size:
+            self.finish_chunk()
+
+    def finish_chunk(self):
+        '''
+        Closes the files of the current chunk and starts the next one
+        '''
+        if not self.column_files:
+            return
+
+        for column_file in self.column_files.values():
+            column_file.close()
+        self.column_files = {}
+        self.chunk += 1
+        self.chunk_rows = 0
+        self.save_metadata()
+
+    def save_metadata(self):
+        '''
+        Saves the layout of the columns so readers know how to map the files
+        '''
+        metadata = {"columns": self.columns, "chunk_size": self.chunk_size, "chunks": self.chunk + (1 if self.column_files else 0)}
+        with open("{}/metadata.json".format(self.directory), "w") as metadata_file:
+            metadata_file.write(json.dumps(metadata, indent=4))
+
+    def close(self):
+        '''
+        Writes every queued transition and finishes the current chunk
+        '''
+        self.transition_queue.put(None)
+        self.thread.join()
+
+class TrajectoryDataset:
+    '''
+    Reads stored trajectories by memory mapping every column so minibatches only touch the rows they use
+    '''
+
+    def __init__(self, directory: str):
+        '''
+        Parameters:
+            directory: Folder the trajectories were saved in
+        '''
+        self.directory = directory
+
+        with open("{}/metadata.json".format(directory), "r") as metadata_file:
+            self.metadata = json.load(metadata_file)
+        self.columns = {name: (np.dtype(dtype), tuple(shape)) for name, (dtype, shape) in (self.metadata["columns"] or {}).items()}
+
+        # Memory map of each column in each chunk, chunks still being written are read up to their last complete row
+        self.chunks: list[dict[str, np.memmap]] = []
+        chunk_lengths = []
+        chunk = 0
+        while self.columns and os.path.exists(self.column_path(chunk, "rewards")):
+            rows = min(os.path.getsize(self.column_path(chunk, name)) // (dtype.itemsize * int(np.prod(shape)))
+                       for name, (dtype, shape) in self.columns.items())
+            if rows > 0:
+                self.chunks.append({name: np.memmap(self.column_path(chunk, name), dtype=dtype, mode="r", shape=(rows,) + shape)
+                                    for name, (dtype, shape) in self.columns.items()})
+                chunk_lengths.append(rows)
+            chunk += 1
+
+        # Position of the first row of each chunk in the whole dataset
+        self.chunk_starts = np.concatenate([[0], np.cumsum(chunk_lengths)]).astype(np.int64)
+
+    def column_path(self, chunk: int, column: str) -> str:
+        '''
+        Gets the path of a column file
+
+        Parameters:
+            chunk: Number of the chunk
+
+            column: Name of the column
+
+        Returns:
+            path: Path of the file
+        '''
+        return "{}/chunk_{:05d}.{}.bin".format(self.directory, chunk, column)
+
+    def __len__(self) -> int:
+        return int(self.chunk_starts[-1])
+
+    def get(self, positions: NDArray) -> dict[str, NDArray]:
+        '''
+        Gathers transitions from any chunks
+
+        Parameters:
+            positions: Positions of the transitions in the whole dataset
+
+        Returns:
+            batch: Dictionary where key is the column name and value holds the rows in the order given
+        '''
+        positions = np.asarray(positions, dtype=np.int64)
+        chunks = np.searchsorted(self.chunk_starts, positions, side="right") - 1
+        rows = positions - self.chunk_starts[chunks]
+
+        batch = {name: np.empty((len(positions),) + shape, dtype=dtype) for name, (dtype, shape) in self.columns.items()}
+        for chunk in np.unique(chunks):
+            in_chunk = chunks == chunk
+            for name, column in self.chunks[chunk].items():
+                batch[name][in_chunk] = column[rows[in_chunk]]
+
+        return batch
+
+    def sample(self, batch_size: int, rng: np.random.Generator | None = None) -> dict[str, NDArray]:
+        '''
+        Samples a random minibatch of transitions
+
+        Parameters:
+            batch_size: Number of transitions
+
+            rng: Random number generator, if None then a new unseeded one is used
+
+        Returns:
+            batch: Dictionary where key is the column name and value holds the sampled rows
+        '''
+        if rng is None:
+            rng = np.random.default_rng()
+
+        return self.get(rng.integers(0, len(self), batch_size))
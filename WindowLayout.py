@@ -0,0 +1,74 @@
+# Screen region (left, top, right, bottom) of the game window that every location in Screen and AI was measured in
+REFERENCE_WINDOW = (690, 0, 1365, 1200)
+
+class WindowLayout:
+    '''
+    Moves locations measured in the reference game window to where they are in any game window, scaling them when the window is a different size
+    '''
+
+    def __init__(self, region: tuple[int, int, int, int] | None = None):
+        '''
+        Parameters:
+            region: The screen region (left, top, right, bottom) of the game window, if None then the reference window is used
+        '''
+        if region is None:
+            region = REFERENCE_WINDOW
+        self.region = region
+
+        # Size of the game window compared to the reference window, side by side windows are usually smaller
+        self.scale_x = (region[2] - region[0]) / (REFERENCE_WINDOW[2] - REFERENCE_WINDOW[0])
+        self.scale_y = (region[3] - region[1]) / (REFERENCE_WINDOW[3] - REFERENCE_WINDOW[1])
+
+    def window_point(self, x: float, y: float) -> tuple[int, int]:
+        '''
+        Scales a point relative to the top left of the reference window to the game window
+
+        Parameters:
+            x: X coordinate relative to the reference window
+
+            y: Y coordinate relative to the reference window
+
+        Returns:
+            point: The point relative to the top left of the game window, which is also its position in a frame
+        '''
+        return (round(x * self.scale_x), round(y * self.scale_y))
+
+    def screen_point(self, x: float, y: float) -> list[int]:
+        '''
+        Moves a point relative to the top left of the reference window to where it is on the screen
+
+        Parameters:
+            x: X coordinate relative to the reference window
+
+            y: Y coordinate relative to the reference window
+
+        Returns:
+            point: The point in absolute screen coordinates, a list so it can be clicked directly
+        '''
+        window_x, window_y = self.window_point(x, y)
+
+        return [window_x + self.region[0], window_y + self.region[1]]
+
+    def window_region(self, window_region: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        '''
+        Scales a region relative to the top left of the reference window to the game window
+
+        Parameters:
+            window_region: The region (left, top, right, bottom) relative to the reference window
+
+        Returns:
+            region: The region relative to the top left of the game window, which is also its position in a frame
+        '''
+        return self.window_point(window_region[0], window_region[1]) + self.window_point(window_region[2], window_region[3])
+
+    def screen_region(self, window_region: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        '''
+        Moves a region relative to the top left of the reference window to where it is on the screen
+
+        Parameters:
+            window_region: The region (left, top, right, bottom) relative to the reference window
+
+        Returns:
+            screen_region: The region in absolute screen coordinates
+        '''
+        return tuple(self.screen_point(window_region[0], window_region[1]) + self.screen_point(window_region[2], window_region[3]))
@@ -6,6 +6,13 @@ from Cards import Cards
 from AI import AI
 from LoggingCallback import LoggingCallback
 from ClashRoyaleEnv import ClashRoyaleEnv
+from Recorder import SessionRecorder
+from Tracker import TroopTracker
+from Metrics import tracer
+from Startup import startup_report
+from DeckCache import DeckCache
+from TrajectoryStore import TrajectoryWriter
+import time
 
 def activate_game_window():
     # Maximize the window and activate it to bring it to the front
@@ -41,63 +48,108 @@ activate_game_window()
 
 # Initialise all classes
 game_window_region = (game_window.left, game_window.top, (game_window.left + game_window.width), (game_window.top + game_window.height))
-screen = Screen(game_window_region)
-cards = Cards()
-ai = AI()
-env = ClashRoyaleEnv(ai, cards, screen)
-callback = LoggingCallback(check_freq=5000)
-
-user_input = input("Are you training or testing? (train/test) \n")
 
-if user_input == "train":
-    # Code for training the AI
-    log_dir = './logs/'
-    train_from = input("Are you training from scratch or a save state? (scratch/save) \n")
+# Optionally record every frame and action so perception can be worked on without the game
+recorder = None
+if input("Do you want to record this session? (yes/no) \n") == "yes":
+    recorder = SessionRecorder("./recordings/{}".format(int(time.time())), game_window_region)
 
-    if train_from == "scratch":
-        # Start training from scratch
+cards = Cards()
+# Tracking troops between frames lets the detector skip frames but adds velocity and age to the observation, so older models can not use it
+tracker = None
+if input("Do you want to track troops between frames? (yes/no) \n") == "yes":
+    tracker = TroopTracker(cards.get_troop_speeds())
+screen = Screen(game_window_region, recorder=recorder, tracker=tracker)
+ai = AI(game_window_region)
+# The deck found in earlier runs is reused unless it is detected again
+deck_cache = DeckCache()
+if deck_cache.decks:
+    deck_cache.refresh = input("Do you want to detect your deck again? (yes/no) \n") == "yes"
+# Without confirmation the deck is checked on the collection screen in case it was changed since the last run
+last_deck = deck_cache.decks.get(deck_cache.last_fingerprint)
+if not deck_cache.refresh and last_deck is not None:
+    deck_cache.trust_last = input("Are you still using the deck {}? (yes/no) \n".format(", ".join(last_deck))) == "yes"
+# Optionally keep every real game transition for offline training and debugging
+trajectory_writer = None
+if input("Do you want to store the trajectories of this session? (yes/no) \n") == "yes":
+    trajectory_writer = TrajectoryWriter("./trajectories/{}".format(int(time.time())))
+env = ClashRoyaleEnv(ai, cards, screen, deck_cache=deck_cache, trajectory_writer=trajectory_writer)
+startup_report.milestone("environment ready")
+
+try:
+    callback = LoggingCallback(check_freq=5000)
+
+    user_input = input("Are you training or testing? (train/test) \n")
+
+    # Masking lets the model skip cards that are not in hand or cost too much elixir instead of learning it from invalid moves
+    model_class = PPO
+    use_masking = input("Do you want to mask invalid actions? (yes/no) \n") == "yes"
+    if use_masking:
+        from sb3_contrib import MaskablePPO
+        model_class = MaskablePPO
+
+    if user_input == "train":
+        # Code for training the AI
+        log_dir = './logs/'
+        train_from = input("Are you training from scratch or a save state? (scratch/save) \n")
+
+        if train_from == "scratch":
+            # Start training from scratch
+            activate_game_window()
+            model = model_class("MlpPolicy", env, verbose=1, tensorboard_log=log_dir)
+
+        elif train_from == "save":
+            # Start training from desired save state
+            model_start = int(input("What model number do you want to train from? \n best_model_"))
+            activate_game_window()
+            model = model_class.load("./train/best_model_{}".format(model_start), env=env)
+            model.learn(total_timesteps=100000, callback=callback)
+
+        # Save the most recent timings to open in chrome://tracing
+        tracer.export_chrome_trace(log_dir + "trace.json")
+
+    elif user_input == "test":
+        # Code for testing the AI
+        model_test = int(input("What model number do you want to test from? \n best_model_"))
+        model = model_class.load("./train/best_model_{}".format(model_test), env=env)
         activate_game_window()
-        model = PPO("MlpPolicy", env, verbose=1, tensorboard_log=log_dir)
 
-    elif train_from == "save":
-        # Start training from desired save state
-        model_start = int(input("What model number do you want to train from? \n best_model_"))
-        activate_game_window()
-        model = PPO.load("./train/best_model_{}".format(model_start), env=env)
-        model.learn(total_timesteps=100000, callback=callback)
-
-elif user_input == "test":
-    # Code for testing the AI
-    model_test = int(input("What model number do you want to test from? \n best_model_"))
-    model = PPO.load("./train/best_model_{}".format(model_test), env=env)
-    activate_game_window()
-
-    games_played = 0
-    games_won = 0
-
-    # Run Trained AI Matches
-    for i in range(100):
-        obs, _ = env.reset()
-        terminated = False
-        while not terminated:
-            action, _states = model.predict(obs)
-            # action = model.action_space.sample()
-            obs, reward, terminated, truncated, info = env.step(action)
-            print(f"Action: {action}, Reward: {reward}")
-
-        # Check which player won
-        winner = screen.game_winner_check()
-        if winner:
-            print("Player won the game")
-            games_won += 1
+        games_played = 0
+        games_won = 0
+
+        # Run Trained AI Matches
+        for i in range(100):
+            obs, _ = env.reset()
+            terminated = False
+            while not terminated:
+                if use_masking:
+                    action, _states = model.predict(obs, action_masks=env.action_masks())
+                else:
+                    action, _states = model.predict(obs)
+                # action = model.action_space.sample()
+                obs, reward, terminated, truncated, info = env.step(action)
+                print(f"Action: {action}, Reward: {reward}")
+
+            # Check which player won
+            winner = screen.game_winner_check()
+            if winner:
+                print("Player won the game")
+                games_won += 1
         
-        else:
-            print("Player lost the game")
+            else:
+                print("Player lost the game")
             
-        games_played += 1
-        print("Games won: {}".format(games_won))
-        print("Games played: {}".format(games_played))
+            games_played += 1
+            print("Games won: {}".format(games_won))
+            print("Games played: {}".format(games_played))
+
+    win_percentage = (games_won / games_played) * 100
+
+    print("Win percentage was: {}%".format(win_percentage))
 
-win_percentage = (games_won / games_played) * 100
+    # Save the most recent timings to open in chrome://tracing
+    tracer.export_chrome_trace("./logs/test_trace.json")
 
-print("Win percentage was: {}%".format(win_percentage))
\ No newline at end of file
+finally:
+    # Stop capturing and finish writing the recording and stored trajectories even if the session crashed
+    env.close()